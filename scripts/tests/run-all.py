@@ -219,6 +219,19 @@ def main():
         ("Autonomous Optimizer", str(TESTS_DIR / "unit" / "test-autonomous-optimizer.py")),
         ("Proactive Engine", str(TESTS_DIR / "unit" / "test-proactive-engine.py")),
         ("Knowledge Store", str(TESTS_DIR / "unit" / "test-knowledge-store.py")),
+        ("Chunk Store", str(TESTS_DIR / "unit" / "test-chunk-store.py")),
+        ("Ingest Queue", str(TESTS_DIR / "unit" / "test-ingest-queue.py")),
+        ("Execution Engine", str(TESTS_DIR / "unit" / "test-execution-engine.py")),
+        ("Step Memo", str(TESTS_DIR / "unit" / "test-step-memo.py")),
+        ("Response Cache", str(TESTS_DIR / "unit" / "test-response-cache.py")),
+        ("Ollama Scheduler", str(TESTS_DIR / "unit" / "test-ollama-scheduler.py")),
+        ("Session Store", str(TESTS_DIR / "unit" / "test-session-store.py")),
+        ("Message Classifier", str(TESTS_DIR / "unit" / "test-message-classifier.py")),
+        ("Singleflight", str(TESTS_DIR / "unit" / "test-singleflight.py")),
+        ("Sandbox Pool", str(TESTS_DIR / "unit" / "test-sandbox-pool.py")),
+        ("LLM Stream", str(TESTS_DIR / "unit" / "test-llm-stream.py")),
+        ("Conversation Manager", str(TESTS_DIR / "unit" / "test-conversation-manager.py")),
+        ("Autonomous Retrieval", str(TESTS_DIR / "unit" / "test-autonomous-retrieval.py")),
     ]
     
     integration_tests = [
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тест Autonomous Retrieval (web-ui)
+Проверяет, что запрос к RAG в /api/autonomous уходит до классификации
+сообщения и выполняется параллельно с ней
+"""
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "services" / "web-ui"))
+
+from test_utils import TestRunner
+import main
+from conversation_manager import conversation_manager
+
+DELAY = 0.1
+MESSAGE = "что ты умеешь?"
+
+
+def run_with_fakes(rag_documents=None):
+    """Запускает _run_autonomous с медленными RAG и классификацией, возвращает отметки времени"""
+    marks = {}
+    original_rag_query = main._rag_query
+    original_detect_intent = conversation_manager.detect_intent
+
+    async def fake_rag_query(query, top_k, **kwargs):
+        marks["rag_start"] = time.perf_counter()
+        await asyncio.sleep(DELAY)
+        marks["rag_end"] = time.perf_counter()
+        return {"documents": rag_documents or []}
+
+    def slow_detect_intent(message):
+        marks["classify_start"] = time.perf_counter()
+        time.sleep(DELAY)  # CPU-работа держит цикл событий
+        return original_detect_intent(message)
+
+    main._rag_query = fake_rag_query
+    conversation_manager.detect_intent = slow_detect_intent
+    try:
+        started = time.perf_counter()
+        response = asyncio.run(main._run_autonomous(MESSAGE, None, "false", "normal", "false"))
+        marks["total"] = time.perf_counter() - started
+    finally:
+        main._rag_query = original_rag_query
+        conversation_manager.detect_intent = original_detect_intent
+    return response, marks
+
+
+def test_retrieval_starts_before_classification():
+    response, marks = run_with_fakes()
+    return marks["rag_start"] < marks["classify_start"] and "retrieval" in response["phase_ms"]
+
+
+def test_retrieval_overlaps_classification():
+    response, marks = run_with_fakes()
+    # Последовательно было бы не меньше 2 * DELAY
+    return marks["total"] < 1.7 * DELAY and response["phase_ms"]["classify"] >= DELAY * 1000 * 0.9
+
+
+if __name__ == "__main__":
+    runner = TestRunner("Autonomous Retrieval")
+    runner.start()
+    runner.test("RAG запрос уходит до классификации", test_retrieval_starts_before_classification)
+    runner.test("RAG выполняется параллельно с классификацией", test_retrieval_overlaps_classification)
+    sys.exit(0 if runner.finish() else 1)
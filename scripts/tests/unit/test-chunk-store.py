@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тест Chunk Store (rag-api)
+Проверяет запись/чтение, восстановление индекса после перезапуска,
+перезапись id при повторной индексации, удаление устаревших чанков,
+учёт мёртвых байтов с компактацией и статистику во время записи
+"""
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "services" / "rag-api"))
+
+from test_utils import TestRunner
+from chunk_store import ChunkStore
+
+
+def open_store(path: str, hot_capacity: int = 2000, **kwargs) -> ChunkStore:
+    store = ChunkStore(path, hot_capacity=hot_capacity, **kwargs)
+    store.open()
+    return store
+
+
+def test_round_trip():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = open_store(tmp)
+        texts = [f"chunk text {i} " * 20 for i in range(5)]
+        store.put_many([f"doc_{i}" for i in range(5)], texts)
+        ok = store.get_many([f"doc_{i}" for i in range(5)]) == texts and store.get("missing") is None
+        store.close()
+        return ok
+
+
+def test_cold_read_after_restart():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = open_store(tmp)
+        store.put_many(["a", "b"], ["первый чанк", "second chunk"])
+        store.close()
+
+        # Новый процесс: индекс из заголовков, текст читается из сегмента
+        store = open_store(tmp, hot_capacity=1)
+        ok = store.get("a") == "первый чанк" and store.get("b") == "second chunk" \
+            and store.get_stats()["cold_reads"] == 2
+        store.close()
+        return ok
+
+
+def test_reingest_replaces_text():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = open_store(tmp)
+        store.put_many(["file.md_0", "file.md_1"], ["old 0", "old 1"])
+        store.put_many(["file.md_0"], ["new 0"])
+        ok = store.get("file.md_0") == "new 0"
+        store.close()
+
+        # Последняя запись побеждает и после перестроения индекса
+        store = open_store(tmp, hot_capacity=1)
+        ok = ok and store.get("file.md_0") == "new 0" and store.get("file.md_1") == "old 1"
+        store.close()
+        return ok
+
+
+def test_delete_survives_restart():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = open_store(tmp)
+        store.put_many(["x_0", "x_1", "x_2"], ["zero", "one", "two"])
+        store.delete_many(["x_1", "x_2", "never_stored"])
+        ok = store.get("x_1") is None and store.get("x_0") == "zero"
+        store.close()
+
+        store = open_store(tmp)
+        ok = ok and store.get_stats()["chunks"] == 1 and store.get("x_2") is None
+
+        # Удалённый id можно записать снова
+        store.put_many(["x_1"], ["one again"])
+        store.close()
+        store = open_store(tmp)
+        ok = ok and store.get("x_1") == "one again"
+        store.close()
+        return ok
+
+
+def test_clear():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = open_store(tmp)
+        store.put_many(["a"], ["text"])
+        store.clear()
+        ok = store.get("a") is None and store.get_stats()["segment_bytes"] == 0
+        store.close()
+        return ok
+
+
+def test_dead_bytes_and_compaction():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = open_store(tmp, compact_min_bytes=1 << 30)  # без автокомпактации
+        store.put_many(["a", "b", "c"], ["alpha " * 50, "beta " * 50, "gamma " * 50])
+        clean = store.get_stats()["dead_bytes"] == 0
+        store.put_many(["a"], ["alpha v2 " * 50])
+        store.delete_many(["b"])
+        before = store.get_stats()
+        store.compact()
+        after = store.get_stats()
+        ok = clean and before["dead_bytes"] > 0 and after["dead_bytes"] == 0 \
+            and after["segment_bytes"] < before["segment_bytes"] and after["compactions"] == 1 \
+            and store.get("a") == "alpha v2 " * 50 and store.get("b") is None
+        store.close()
+
+        # Сжатый сегмент читается после перезапуска
+        store = open_store(tmp, hot_capacity=1)
+        ok = ok and store.get("a") == "alpha v2 " * 50 and store.get("c") == "gamma " * 50 \
+            and store.get("b") is None and store.get_stats()["dead_bytes"] == 0
+        store.close()
+        return ok
+
+
+def test_auto_compaction_bounds_segment():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = open_store(tmp, compact_ratio=0.5, compact_min_bytes=1024)
+        for version in range(50):
+            store.put_many([f"doc_{i}" for i in range(10)], [f"v{version} text {i} " * 20 for i in range(10)])
+        stats = store.get_stats()
+        ok = stats["compactions"] > 0 and stats["dead_bytes"] <= stats["segment_bytes"] * 0.5 \
+            and store.get("doc_3") == "v49 text 3 " * 20
+        store.close()
+        return ok
+
+
+def test_stats_during_concurrent_writes():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = open_store(tmp, hot_capacity=50, compact_min_bytes=4096)
+        errors = []
+
+        def writer():
+            for n in range(200):
+                store.put_many([f"w{n % 30}"], [f"text {n} " * 10])
+                if n % 7 == 0:
+                    store.delete_many([f"w{(n + 3) % 30}"])
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        while thread.is_alive():
+            try:
+                stats = store.get_stats()
+                assert stats["hot_bytes"] >= 0 and stats["dead_bytes"] >= 0
+            except Exception as e:
+                errors.append(e)
+        thread.join()
+        hot_bytes = store.get_stats()["hot_bytes"]
+        expected = sum(len(text) for text in store._hot.values())
+        store.close()
+        return not errors and hot_bytes == expected
+
+
+if __name__ == "__main__":
+    runner = TestRunner("Chunk Store")
+    runner.start()
+    runner.test("Запись и чтение", test_round_trip)
+    runner.test("Чтение из сегмента после перезапуска", test_cold_read_after_restart)
+    runner.test("Повторная индексация заменяет текст", test_reingest_replaces_text)
+    runner.test("Удаление сохраняется после перезапуска", test_delete_survives_restart)
+    runner.test("Очистка", test_clear)
+    runner.test("Мёртвые байты и компактация", test_dead_bytes_and_compaction)
+    runner.test("Автокомпактация ограничивает сегмент", test_auto_compaction_bounds_segment)
+    runner.test("Статистика во время записи", test_stats_during_concurrent_writes)
+    sys.exit(0 if runner.finish() else 1)
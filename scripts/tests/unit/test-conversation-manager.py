@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тест Conversation Manager (web-ui)
+Проверяет сборку промпта /api/chat: шаблон, контекст RAG, история
+и сводка ранних сообщений
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "services" / "web-ui"))
+
+from test_utils import TestRunner
+from conversation_manager import ConversationSession, conversation_manager
+
+
+def test_build_prompt_without_history():
+    session = ConversationSession("s1")
+    prompt = conversation_manager.build_prompt(session, "What is Docker?")
+    return prompt.startswith("You are an autonomous AI system") \
+        and "User: What is Docker?" in prompt and prompt.rstrip().endswith("Assistant:")
+
+
+def test_build_prompt_with_context_and_history():
+    session = ConversationSession("s2")
+    session.add_message("user", "Привет")
+    session.add_message("assistant", "Здравствуйте")
+    prompt = conversation_manager.build_prompt(
+        session, "Как перезапустить сервис?",
+        rag_context=[{"content": "docker compose restart web-ui"}]
+    )
+    return "Context: docker compose restart web-ui" in prompt and "History:" in prompt \
+        and "Привет" in prompt and "Здравствуйте" in prompt \
+        and prompt.index("Здравствуйте") < prompt.index("User: Как перезапустить сервис?")
+
+
+def test_build_prompt_includes_summary():
+    session = ConversationSession("s3")
+    session.fold(0, "обсуждали настройку Redis")
+    session.add_message("user", "А дальше?")
+    prompt = conversation_manager.build_prompt(session, "Что с кэшем?")
+    return "Summary of earlier conversation: обсуждали настройку Redis" in prompt
+
+
+if __name__ == "__main__":
+    runner = TestRunner("Conversation Manager")
+    runner.start()
+    runner.test("Промпт без истории", test_build_prompt_without_history)
+    runner.test("Промпт с контекстом и историей", test_build_prompt_with_context_and_history)
+    runner.test("Промпт со сводкой", test_build_prompt_includes_summary)
+    sys.exit(0 if runner.finish() else 1)
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тест Execution Engine (web-ui)
+Проверяет граф зависимостей шагов, параллельное выполнение,
+таймауты обработчиков и повторы только идемпотентных шагов
+"""
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "services" / "web-ui"))
+
+import httpx
+
+from test_utils import TestRunner
+from execution_engine import ExecutionEngine
+from http_clients import UPSTREAMS
+from step_registry import StepRegistry
+from task_executor import Task, TaskExecutor
+
+SERVICES = {"rag": "http://rag", "arch": "http://arch", "ollama": "http://ollama"}
+
+
+def make_engine() -> ExecutionEngine:
+    return ExecutionEngine(httpx.AsyncClient(), SERVICES)
+
+
+def make_test_engine() -> ExecutionEngine:
+    """Engine with an empty handler table and short limits"""
+    engine = make_engine()
+    engine.registry = StepRegistry()
+    engine.STEP_TIMEOUT = 0.05
+    engine.RETRY_BASE_DELAY = 0.001
+    engine.RETRY_MAX_DELAY = 0.001
+    return engine
+
+
+def sleeper(seconds: float):
+    async def handler(step, step_lower, context, result):
+        await asyncio.sleep(seconds)
+        result["status"] = "success"
+        return True
+    return handler
+
+
+def flaky(failures: int, error: str, calls: list):
+    async def handler(step, step_lower, context, result):
+        calls.append(step)
+        if len(calls) <= failures:
+            raise ConnectionError(error)
+        result["status"] = "success"
+        return True
+    return handler
+
+
+def test_step_dag():
+    engine = make_engine()
+    steps = [
+        "Generate code using AI",
+        "Validate code safety",
+        "Create file safely",
+        "Verify file exists",
+        "Check system health"
+    ]
+    # validate читает код, сохранение ждёт проверки, verify - файла; health независим
+    return engine.build_step_dag(steps) == [set(), {0}, {0, 1}, {0, 2}, set()]
+
+
+def test_independent_steps_run_concurrently():
+    engine = make_test_engine()
+    engine.registry.register("slow", sleeper(0.1), ["slow"], timeout=1.0)
+
+    async def scenario():
+        started = time.perf_counter()
+        results = await engine.execute_task(["slow one", "slow two", "slow three"], {})
+        return results, time.perf_counter() - started
+
+    results, elapsed = asyncio.run(scenario())
+    return all(r["status"] == "success" for r in results) and elapsed < 0.25
+
+
+def test_handler_timeout_overrides_default():
+    engine = make_test_engine()
+    engine.registry.register("llm", sleeper(0.1), ["llm"], timeout=0.5)
+    engine.registry.register("quick", sleeper(0.1), ["quick"])
+
+    async def scenario():
+        deadline = asyncio.get_running_loop().time() + 5
+        long_step = await engine.execute_step_with_retries("llm step", {}, deadline)
+        short_step = await engine.execute_step_with_retries("quick step", {}, deadline)
+        return long_step, short_step
+
+    long_step, short_step = asyncio.run(scenario())
+    return long_step["status"] == "success" and short_step["status"] == "failed" \
+        and "timeout" in short_step["error"].lower()
+
+
+def test_transient_failures_are_retried():
+    engine = make_test_engine()
+    calls = []
+    engine.registry.register("read", flaky(2, "connection reset", calls), ["read"])
+
+    async def scenario():
+        deadline = asyncio.get_running_loop().time() + 5
+        return await engine.execute_step_with_retries("read status", {}, deadline)
+
+    result = asyncio.run(scenario())
+    return result["status"] == "success" and result["attempts"] == 3 and len(calls) == 3
+
+
+def test_non_idempotent_step_is_not_retried():
+    engine = make_test_engine()
+    calls = []
+    engine.registry.register("apply", flaky(1, "connection reset", calls), ["apply"], retry=False)
+
+    async def scenario():
+        deadline = asyncio.get_running_loop().time() + 5
+        return await engine.execute_step_with_retries("apply changes", {}, deadline)
+
+    result = asyncio.run(scenario())
+    return result["status"] == "failed" and result["attempts"] == 1 and len(calls) == 1
+
+
+def test_task_budget_bounds_retries():
+    engine = make_test_engine()
+    engine.registry.register("hang", sleeper(1.0), ["hang"], timeout=1.0)
+
+    async def scenario():
+        started = time.perf_counter()
+        results = await engine.execute_task(["hang forever"], {}, time_budget=0.1)
+        return results, time.perf_counter() - started
+
+    results, elapsed = asyncio.run(scenario())
+    return results[0]["status"] == "failed" and elapsed < 0.5
+
+
+def test_production_handler_table():
+    engine = make_engine()
+    resolve = engine.registry.resolve
+    client_timeout = UPSTREAMS["ollama"]["timeout"].read
+    return resolve("generate code using ai").timeout >= client_timeout \
+        and resolve("generate python script").timeout >= client_timeout \
+        and not resolve("apply configuration").retryable \
+        and not resolve("generate configuration").retryable \
+        and resolve("check system health").retryable \
+        and resolve("check system health").timeout is None
+
+
+def test_budget_fires_before_worker_timeout():
+    engine = make_test_engine()
+    engine.registry.register("hang", sleeper(5.0), ["hang"], timeout=5.0)
+    engine.registry.register("quick", sleeper(0.0), ["quick"])
+    limits = (Task.MAX_EXECUTION_TIME, Task.FINALIZE_MARGIN)
+    Task.MAX_EXECUTION_TIME, Task.FINALIZE_MARGIN = 0.4, 0.2
+
+    async def scenario():
+        executor = TaskExecutor()
+        executor.start_workers()
+        task = executor.create_task("hang")
+
+        async def job(t: Task):
+            results = await engine.execute_task(["quick step", "hang forever"], {}, time_budget=t.step_budget())
+            return {"results": results}
+
+        executor.submit(task, job)
+        await executor.wait(task.task_id)
+        await executor.stop_workers()
+        return task
+
+    try:
+        task = asyncio.run(scenario())
+    finally:
+        Task.MAX_EXECUTION_TIME, Task.FINALIZE_MARGIN = limits
+
+    # Задача завершилась сама, записи о шагах (попытки, длительность) сохранены
+    results = task.job_result["results"] if task.job_result else []
+    return task.status == "completed" and len(results) == 2 \
+        and results[0]["status"] == "success" and results[1]["status"] == "failed" \
+        and "attempts" in results[1] and "duration_ms" in results[1]
+
+
+def test_engine_budget_derived_from_worker_limit():
+    return ExecutionEngine.TASK_TIME_BUDGET == Task.MAX_EXECUTION_TIME - Task.FINALIZE_MARGIN \
+        and ExecutionEngine.TASK_TIME_BUDGET > ExecutionEngine.LLM_STEP_TIMEOUT
+
+
+if __name__ == "__main__":
+    runner = TestRunner("Execution Engine")
+    runner.start()
+    runner.test("Граф зависимостей шагов", test_step_dag)
+    runner.test("Независимые шаги выполняются параллельно", test_independent_steps_run_concurrently)
+    runner.test("Таймаут обработчика вместо STEP_TIMEOUT", test_handler_timeout_overrides_default)
+    runner.test("Повтор временных ошибок", test_transient_failures_are_retried)
+    runner.test("Неидемпотентный шаг не повторяется", test_non_idempotent_step_is_not_retried)
+    runner.test("Бюджет задачи ограничивает шаг", test_task_budget_bounds_retries)
+    runner.test("Таблица обработчиков: таймауты LLM и повторы", test_production_handler_table)
+    runner.test("Бюджет шагов срабатывает раньше таймаута воркера", test_budget_fires_before_worker_timeout)
+    runner.test("Бюджет задачи выводится из лимита воркера", test_engine_budget_derived_from_worker_limit)
+    sys.exit(0 if runner.finish() else 1)
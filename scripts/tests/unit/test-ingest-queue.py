@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тест Ingest Queue (rag-api)
+Проверяет объединение записей в пакеты, сброс очереди при остановке
+и изоляцию ошибок отдельных документов
+"""
+import asyncio
+import sys
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "services" / "rag-api"))
+
+from test_utils import TestRunner
+from ingest_queue import IngestQueue
+
+
+class RecordingWriter:
+    """Writer that records each call; ids starting with "bad" make it fail"""
+
+    def __init__(self, delay: float = 0.0):
+        self.calls = []
+        self.delay = delay
+        self.started = threading.Event()
+
+    def __call__(self, texts, metadatas, ids):
+        self.started.set()
+        if self.delay:
+            threading.Event().wait(self.delay)
+        if any(chunk_id.startswith("bad") for chunk_id in ids):
+            raise ValueError("bad document")
+        self.calls.append(list(ids))
+
+
+def doc(chunk_id: str):
+    return [f"text {chunk_id}"], [{"source": chunk_id}], [chunk_id]
+
+
+def test_concurrent_writes_are_batched():
+    async def scenario():
+        writer = RecordingWriter()
+        queue = IngestQueue(writer, flush_interval_ms=50, max_chunks=256)
+        queue.start()
+        await asyncio.gather(*[queue.submit(*doc(f"doc{i}")) for i in range(10)])
+        await queue.stop()
+        return writer.calls
+
+    calls = asyncio.run(scenario())
+    return len(calls) == 1 and sorted(calls[0]) == sorted(f"doc{i}" for i in range(10))
+
+
+def test_max_chunks_splits_batches():
+    async def scenario():
+        writer = RecordingWriter()
+        queue = IngestQueue(writer, flush_interval_ms=1000, max_chunks=4)
+        queue.start()
+        await asyncio.gather(*[queue.submit(*doc(f"doc{i}")) for i in range(8)])
+        await queue.stop()
+        return writer.calls
+
+    calls = asyncio.run(scenario())
+    return [len(batch) for batch in calls] == [4, 4]
+
+
+def test_stop_flushes_pending_writes():
+    async def scenario():
+        writer = RecordingWriter()
+        queue = IngestQueue(writer, flush_interval_ms=10_000, max_chunks=256)
+        queue.start()
+        submits = [asyncio.create_task(queue.submit(*doc(f"doc{i}"))) for i in range(5)]
+        await asyncio.sleep(0.01)  # items are dequeued into the in-progress batch
+        await queue.stop()
+        await asyncio.wait_for(asyncio.gather(*submits), 1.0)
+        return writer.calls, queue.get_stats()
+
+    calls, stats = asyncio.run(scenario())
+    return sum(len(batch) for batch in calls) == 5 and not stats["running"]
+
+
+def test_stop_waits_for_running_write():
+    async def scenario():
+        writer = RecordingWriter(delay=0.1)
+        queue = IngestQueue(writer, flush_interval_ms=1, max_chunks=1)
+        queue.start()
+        first = asyncio.create_task(queue.submit(*doc("first")))
+        await asyncio.to_thread(writer.started.wait, 1.0)
+        second = asyncio.create_task(queue.submit(*doc("second")))
+        await asyncio.sleep(0)
+        await queue.stop()
+        await asyncio.wait_for(asyncio.gather(first, second), 1.0)
+        return writer.calls
+
+    return asyncio.run(scenario()) == [["first"], ["second"]]
+
+
+def test_submit_after_stop_is_rejected():
+    async def scenario():
+        queue = IngestQueue(RecordingWriter())
+        queue.start()
+        await queue.stop()
+        try:
+            await queue.submit(*doc("late"))
+        except RuntimeError:
+            return True
+        return False
+
+    return asyncio.run(scenario())
+
+
+def test_failing_document_only_fails_its_caller():
+    async def scenario():
+        writer = RecordingWriter()
+        queue = IngestQueue(writer, flush_interval_ms=50, max_chunks=256)
+        queue.start()
+        outcomes = await asyncio.gather(
+            queue.submit(*doc("good1")), queue.submit(*doc("bad")), queue.submit(*doc("good2")),
+            return_exceptions=True
+        )
+        await queue.stop()
+        return outcomes, writer.calls, queue.get_stats()
+
+    outcomes, calls, stats = asyncio.run(scenario())
+    return outcomes[0] is None and outcomes[2] is None and isinstance(outcomes[1], ValueError) \
+        and sorted(sum(calls, [])) == ["good1", "good2"] \
+        and stats["write_errors"] == 1 and stats["batch_retries"] == 1
+
+
+if __name__ == "__main__":
+    runner = TestRunner("Ingest Queue")
+    runner.start()
+    runner.test("Одновременные записи объединяются в пакет", test_concurrent_writes_are_batched)
+    runner.test("max_chunks ограничивает пакет", test_max_chunks_splits_batches)
+    runner.test("stop() записывает накопленный пакет", test_stop_flushes_pending_writes)
+    runner.test("stop() дожидается текущей записи", test_stop_waits_for_running_write)
+    runner.test("Запись после stop() отклоняется", test_submit_after_stop_is_rejected)
+    runner.test("Ошибка документа не задевает соседей по пакету", test_failing_document_only_fails_its_caller)
+    sys.exit(0 if runner.finish() else 1)
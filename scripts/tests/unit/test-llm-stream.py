@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тест LLM Stream (web-ui)
+Проверяет сборку ответа из потока токенов и освобождение слота
+ollama_scheduler при ошибке в on_token и при отмене
+"""
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "services" / "web-ui"))
+
+import httpx
+
+from test_utils import TestRunner
+from llm_stream import complete
+from ollama_scheduler import ollama_scheduler
+
+
+class SlowStream(httpx.AsyncByteStream):
+    """NDJSON-поток Ollama с паузой между токенами"""
+
+    def __init__(self, tokens, delay: float = 0.0):
+        self.tokens = tokens
+        self.delay = delay
+
+    async def __aiter__(self):
+        for token in self.tokens:
+            await asyncio.sleep(self.delay)
+            yield (json.dumps({"response": token, "done": False}) + "\n").encode()
+        yield (json.dumps({"response": "", "done": True, "eval_count": len(self.tokens)}) + "\n").encode()
+
+
+def make_client(tokens, delay: float = 0.0) -> httpx.AsyncClient:
+    def handler(request):
+        return httpx.Response(200, stream=SlowStream(tokens, delay))
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def test_complete_joins_tokens():
+    async def scenario():
+        seen = []
+        async with make_client(["Hel", "lo"]) as client:
+            final = await complete(client, "http://ollama", "m", "p", on_token=seen.append)
+        return final, seen, ollama_scheduler.in_flight
+
+    final, seen, in_flight = asyncio.run(scenario())
+    return final["response"] == "Hello" and final["done"] and seen == ["Hel", "lo"] and in_flight == 0
+
+
+def test_on_token_error_releases_slot():
+    def on_token(token):
+        raise ValueError("consumer failed")
+
+    async def scenario():
+        async with make_client(["a", "b", "c"]) as client:
+            try:
+                await complete(client, "http://ollama", "m", "p", on_token=on_token)
+            except ValueError:
+                pass
+            # Слот свободен сразу, без ожидания сборщика мусора
+            return ollama_scheduler.in_flight
+
+    return asyncio.run(scenario()) == 0
+
+
+def test_cancel_releases_slot():
+    async def scenario():
+        async with make_client(["a"] * 100, delay=0.01) as client:
+            task = asyncio.create_task(complete(client, "http://ollama", "m", "p"))
+            await asyncio.sleep(0.05)
+            held = ollama_scheduler.in_flight
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            return held, ollama_scheduler.in_flight
+
+    held, after = asyncio.run(scenario())
+    return held == 1 and after == 0
+
+
+if __name__ == "__main__":
+    runner = TestRunner("LLM Stream")
+    runner.start()
+    runner.test("complete собирает токены", test_complete_joins_tokens)
+    runner.test("Ошибка в on_token освобождает слот", test_on_token_error_releases_slot)
+    runner.test("Отмена освобождает слот", test_cancel_releases_slot)
+    sys.exit(0 if runner.finish() else 1)
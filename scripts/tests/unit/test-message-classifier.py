@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тест Message Classifier (web-ui)
+Сверяет однопроходный классификатор с прежними эвристиками
+(`word in message_lower`) на заданных и случайных сообщениях
+"""
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "services" / "web-ui"))
+
+from test_utils import TestRunner
+from message_classifier import KEYWORD_TABLES, MessageClassifier, message_classifier
+
+
+# Прежние реализации (до перехода на MessageClassifier) - эталон для сравнения
+
+def legacy_intent(message: str) -> str:
+    message_lower = message.lower()
+    creation_keywords = ["create", "generate", "write", "build", "make",
+                         "создать", "создай", "сгенерировать", "написать", "напиши", "сделать", "сделай"]
+    creative_targets = ["code", "program", "script", "game", "app", "calculator",
+                        "function", "class", "tic-tac-toe", "file", "project", "python",
+                        "код", "программ", "скрипт", "игр", "приложение", "калькулятор",
+                        "функци", "класс", "файл", "проект", "питон"]
+    safe_zones = ["playground/", "generated/", "experiments/", "tic-tac-toe/", "demos/", "examples/"]
+
+    has_creation = any(verb in message_lower for verb in creation_keywords)
+    has_creative_target = any(target in message_lower for target in creative_targets)
+    has_safe_zone = any(zone in message_lower for zone in safe_zones)
+    has_save_to_safe = "save" in message_lower and has_safe_zone
+    if (has_creation and (has_creative_target or has_safe_zone)) or has_save_to_safe:
+        return "create"
+
+    action_verbs = ["check", "test", "run", "execute", "perform", "start", "stop",
+                    "restart", "deploy", "rollback", "apply", "fix", "debug", "play",
+                    "проверь", "тест", "запусти", "выполни", "исполни", "старт", "стоп",
+                    "перезапусти", "примени", "исправь", "отладь", "играть"]
+    if any(verb in message_lower for verb in action_verbs):
+        if "play" in message_lower and has_creation:
+            return "create"
+        return "execute"
+
+    modification_verbs = ["add", "setup", "configure", "install",
+                          "update", "modify", "change", "remove", "delete"]
+    if any(verb in message_lower for verb in modification_verbs):
+        return "modify"
+
+    analysis_verbs = ["analyze", "inspect", "review", "investigate", "examine",
+                      "diagnose", "profile", "measure"]
+    if any(verb in message_lower for verb in analysis_verbs):
+        return "analyze"
+    return "query"
+
+
+def legacy_entities(message: str) -> dict:
+    message_lower = message.lower()
+    tables = {
+        "services": ["rag", "ollama", "arch", "redis", "postgres", "mongodb", "nginx"],
+        "actions": ["optimize", "scale", "monitor", "backup", "restore", "migrate"],
+        "metrics": ["latency", "throughput", "memory", "cpu", "disk", "network"],
+        "technologies": ["docker", "kubernetes", "python", "fastapi", "flask"]
+    }
+    return {name: [w for w in words if w in message_lower] for name, words in tables.items()}
+
+
+def legacy_risk(message: str) -> dict:
+    message_lower = message.lower()
+    return {
+        "high_risk": any(r in message_lower for r in ["delete", "drop", "remove", "modify_production"]),
+        "safe_zone": any(z in message_lower for z in
+                         ["playground/", "generated/", "experiments/", "tic-tac-toe/", "demos/", "examples/"]),
+        "code_creation": any(k in message_lower for k in
+                             ["script", "code", "program", "game", "app", "function",
+                              "скрипт", "код", "программ", "игр", "приложение", "функци"]),
+        "dangerous_target": any(t in message_lower for t in
+                                ["production", "system", "config", "/etc/", "/var/", "docker-compose",
+                                 "продакшн", "система", "конфиг"])
+    }
+
+
+def legacy_pattern(task: str) -> str:
+    task_lower = task.lower()
+    if "health" in task_lower or "check" in task_lower:
+        return "health_check"
+    elif "add" in task_lower or "create" in task_lower:
+        if "redis" in task_lower or "cache" in task_lower:
+            return "add_service"
+        elif "service" in task_lower:
+            return "add_service"
+        return "create_resource"
+    elif "update" in task_lower or "modify" in task_lower:
+        if "production" in task_lower or "database" in task_lower or "schema" in task_lower:
+            return "modify_production"
+        return "modify_config"
+    elif "optimize" in task_lower or "improve" in task_lower:
+        return "optimization"
+    elif "analyze" in task_lower:
+        return "analysis"
+    elif "fix" in task_lower or "debug" in task_lower:
+        return "debugging"
+    return "generic"
+
+
+def legacy_step_template(description: str) -> str:
+    desc_lower = description.lower()
+    if any(w in desc_lower for w in ['create', 'generate', 'write', 'build']) and \
+       any(w in desc_lower for w in ['code', 'program', 'script', 'game', 'calculator', 'app', 'tic-tac-toe']):
+        return "code_creation"
+    if "health" in desc_lower or "status" in desc_lower:
+        return "health"
+    elif "optimize" in desc_lower or "improve" in desc_lower:
+        if "latency" in desc_lower or "performance" in desc_lower:
+            return "optimize_latency"
+        return "optimize_generic"
+    elif "add" in desc_lower or "create" in desc_lower:
+        if "service" in desc_lower:
+            return "add_service"
+        elif "redis" in desc_lower or "cache" in desc_lower:
+            return "add_cache"
+        return "add_generic"
+    elif "fix" in desc_lower or "debug" in desc_lower:
+        return "debug"
+    elif "analyze" in desc_lower or "investigate" in desc_lower:
+        return "analysis"
+    elif "deploy" in desc_lower or "rollout" in desc_lower:
+        return "deploy"
+    return "generic"
+
+
+SAMPLES = [
+    "Create a tic-tac-toe game in Python",
+    "Напиши калькулятор на питоне",
+    "save it to playground/demo.py",
+    "Check system health",
+    "Make a game and let me play",
+    "Проверь статус сервисов",
+    "Add Redis cache to the RAG service",
+    "Update the production database schema",
+    "Optimize latency of the ollama service",
+    "Analyze memory and cpu usage on docker",
+    "Delete old backups from /var/log",
+    "Fix the bug in config loader",
+    "Deploy the new rollout to kubernetes",
+    "How does the architecture work?",
+    "Investigate network throughput drops",
+    "Сгенерировать скрипт для миграции",
+    "Rollback the last change",
+    "scaffold an app",           # "app" внутри более длинного слова тоже совпадение
+    "restart nginx",
+    "",
+    "PLAYGROUND/Generated/ code CREATE"
+]
+
+
+def random_messages(count: int, seed: int = 47):
+    words = sorted({w for table in KEYWORD_TABLES.values() for w in table})
+    filler = ["the", "please", "a", "on", "it", "и", "для", "now", " ", "/", "-", "x"]
+    rng = random.Random(seed)
+    for _ in range(count):
+        parts = [rng.choice(words if rng.random() < 0.6 else filler) for _ in range(rng.randint(0, 8))]
+        # Без пробела слова склеиваются - проверяются пересекающиеся совпадения
+        yield rng.choice([" ", "", "_"]).join(parts) if rng.random() < 0.5 else " ".join(parts).upper()
+
+
+def mismatches(messages):
+    classifier = MessageClassifier(KEYWORD_TABLES)
+    failed = []
+    for message in messages:
+        checks = (
+            (classifier.intent(message), legacy_intent(message)),
+            (classifier.entities(message), legacy_entities(message)),
+            (classifier.risk(message), legacy_risk(message)),
+            (classifier.pattern(message), legacy_pattern(message)),
+            (classifier.step_template(message), legacy_step_template(message)),
+        )
+        if any(new != old for new, old in checks):
+            failed.append(message)
+    if failed:
+        print(f"  mismatches: {failed[:5]}")
+    return failed
+
+
+def test_parity_on_samples():
+    return not mismatches(SAMPLES)
+
+
+def test_parity_on_random_messages():
+    return not mismatches(random_messages(5000))
+
+
+def test_shared_scan_is_cached():
+    classifier = MessageClassifier(KEYWORD_TABLES)
+    message = "Create a Redis cache service"
+    classifier.classify(message)
+    classifier.classify(message)
+    stats = classifier.get_stats()
+    return stats["cache_misses"] == 1 and stats["cache_hits"] >= 9
+
+
+def test_global_classifier_matches_tables():
+    return message_classifier.intent("Напиши игру") == "create" \
+        and message_classifier.get_stats()["keywords"] == sum(len(t) for t in KEYWORD_TABLES.values())
+
+
+if __name__ == "__main__":
+    runner = TestRunner("Message Classifier")
+    runner.start()
+    runner.test("Совпадение с прежними эвристиками (примеры)", test_parity_on_samples)
+    runner.test("Совпадение с прежними эвристиками (5000 случайных)", test_parity_on_random_messages)
+    runner.test("Один скан на сообщение (LRU)", test_shared_scan_is_cached)
+    runner.test("Глобальный классификатор", test_global_classifier_matches_tables)
+    sys.exit(0 if runner.finish() else 1)
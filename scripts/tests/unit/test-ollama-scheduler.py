@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тест Ollama Scheduler (web-ui)
+Проверяет порядок обслуживания по классам приоритета,
+сброс нагрузки по дедлайну и переполнению очереди
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "services" / "web-ui"))
+
+from test_utils import TestRunner
+from ollama_scheduler import OllamaOverloadedError, OllamaScheduler
+
+
+def make_scheduler(**kwargs) -> OllamaScheduler:
+    deadlines = {"interactive": 1.0, "codegen": 1.0, "background": 1.0}
+    deadlines.update(kwargs.pop("deadlines", {}))
+    return OllamaScheduler(deadlines=deadlines, **kwargs)
+
+
+def test_priority_order():
+    async def scenario():
+        scheduler = make_scheduler(max_in_flight=1)
+        order = []
+
+        async def worker(name: str, priority: str):
+            async with scheduler.slot(priority):
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+        await scheduler.acquire("codegen")  # слот занят - остальные ждут
+        tasks = [
+            asyncio.create_task(worker("bg", "background")),
+            asyncio.create_task(worker("code1", "codegen")),
+            asyncio.create_task(worker("chat", "interactive")),
+            asyncio.create_task(worker("code2", "codegen")),
+        ]
+        await asyncio.sleep(0.01)
+        scheduler.release()
+        await asyncio.gather(*tasks)
+        return order, scheduler.in_flight
+
+    order, in_flight = asyncio.run(scenario())
+    return order == ["chat", "code1", "code2", "bg"] and in_flight == 0
+
+
+def test_max_in_flight_bound():
+    async def scenario():
+        scheduler = make_scheduler(max_in_flight=2)
+        running, peak = 0, 0
+
+        async def worker():
+            nonlocal running, peak
+            async with scheduler.slot("codegen"):
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        await asyncio.gather(*[worker() for _ in range(6)])
+        return peak, scheduler.get_stats()
+
+    peak, stats = asyncio.run(scenario())
+    return peak == 2 and stats["in_flight"] == 0 and stats["classes"]["codegen"]["admitted"] == 6
+
+
+def test_deadline_sheds_waiter():
+    async def scenario():
+        scheduler = make_scheduler(deadlines={"background": 0.05})
+        await scheduler.acquire("interactive")
+        try:
+            await scheduler.acquire("background")
+        except OllamaOverloadedError:
+            stats = scheduler.get_stats()
+            scheduler.release()
+            return stats
+        return None
+
+    stats = asyncio.run(scenario())
+    return stats is not None and stats["classes"]["background"]["shed"] == 1 \
+        and stats["queue_depth"] == 0 and stats["in_flight"] == 1
+
+
+def test_full_queue_sheds_immediately():
+    async def scenario():
+        scheduler = make_scheduler(max_queue=2)
+        await scheduler.acquire("interactive")
+        waiters = [asyncio.create_task(scheduler.acquire("codegen")) for _ in range(2)]
+        await asyncio.sleep(0)
+        try:
+            await scheduler.acquire("interactive")
+            shed = False
+        except OllamaOverloadedError:
+            shed = True
+        for _ in range(3):
+            scheduler.release()
+        await asyncio.gather(*waiters)
+        return shed, scheduler.get_stats()
+
+    shed, stats = asyncio.run(scenario())
+    return shed and stats["classes"]["interactive"]["shed"] == 1 and stats["in_flight"] == 0
+
+
+def test_cancelled_waiter_keeps_slot_accounting():
+    async def scenario():
+        scheduler = make_scheduler()
+        await scheduler.acquire("interactive")
+        waiter = asyncio.create_task(scheduler.acquire("codegen"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        scheduler.release()
+        # Слот снова свободен - следующий запрос проходит без ожидания
+        await asyncio.wait_for(scheduler.acquire("background"), 0.1)
+        scheduler.release()
+        return scheduler.in_flight, scheduler.queue_depth()
+
+    return asyncio.run(scenario()) == (0, 0)
+
+
+def test_unknown_priority_is_background():
+    async def scenario():
+        scheduler = make_scheduler()
+        async with scheduler.slot("batch"):
+            pass
+        return scheduler.get_stats()["classes"]["background"]["admitted"]
+
+    return asyncio.run(scenario()) == 1
+
+
+if __name__ == "__main__":
+    runner = TestRunner("Ollama Scheduler")
+    runner.start()
+    runner.test("Порядок по классам приоритета", test_priority_order)
+    runner.test("Ограничение max_in_flight", test_max_in_flight_bound)
+    runner.test("Сброс по дедлайну класса", test_deadline_sheds_waiter)
+    runner.test("Сброс при переполнении очереди", test_full_queue_sheds_immediately)
+    runner.test("Отмена ожидания не теряет слот", test_cancelled_waiter_keeps_slot_accounting)
+    runner.test("Неизвестный приоритет - background", test_unknown_priority_is_background)
+    sys.exit(0 if runner.finish() else 1)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тест Response Cache (web-ui)
+Проверяет LRU по размеру, TTL, sqlite-уровень для детерминированных ответов
+и ключ кэша по модели, которая фактически ответила
+"""
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "services" / "web-ui"))
+
+from test_utils import TestRunner
+from model_router import ModelRouter
+from response_cache import ResponseCache
+
+
+def value(text: str):
+    return {"success": True, "content": text}
+
+
+def test_lru_evicts_least_recent():
+    entry_size = len('{"success": true, "content": "aaaa"}')
+    cache = ResponseCache(max_bytes=entry_size * 2)
+    cache.put("a", value("aaaa"))
+    cache.put("b", value("bbbb"))
+    cache.get("a")  # "b" становится самым старым
+    cache.put("c", value("cccc"))
+    return cache.get("a") is not None and cache.get("b") is None and cache.get("c") is not None \
+        and cache.get_stats()["evictions"] == 1 and cache.get_stats()["bytes"] <= cache.max_bytes
+
+
+def test_oversized_value_is_skipped():
+    cache = ResponseCache(max_bytes=16)
+    cache.put("big", value("x" * 100))
+    return cache.get("big") is None and len(cache) == 0
+
+
+def test_ttl_expiry():
+    cache = ResponseCache(default_ttl=0.05)
+    cache.put("short", value("s"))
+    cache.put("long", value("l"), ttl=10)
+    time.sleep(0.06)
+    return cache.get("short") is None and cache.get("long") is not None \
+        and cache.get_stats()["expired"] == 1
+
+
+def test_persisted_entries_survive_restart():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = str(Path(tmp) / "responses.db")
+        cache = ResponseCache(db_path=db_path)
+        cache.put("kept", value("kept"), persist=True)
+        cache.put("memory", value("memory"))
+
+        reopened = ResponseCache(db_path=db_path)
+        return reopened.get("kept") == value("kept") and reopened.get("memory") is None \
+            and reopened.get_stats()["disk_hits"] == 1
+
+
+def test_get_any_counts_one_miss():
+    cache = ResponseCache()
+    cache.put("second", value("2"))
+    found = cache.get_any(["first", "second"])
+    missing = cache.get_any(["x", "y", "z"])
+    stats = cache.get_stats()
+    return found == value("2") and missing is None and stats["hits"] == 1 and stats["misses"] == 1
+
+
+def make_router(answers: dict) -> ModelRouter:
+    """Router with the cascade on and a stub local backend: model -> answer"""
+    router = ModelRouter()
+    router.cascade_enabled = True
+    router.calls = []
+
+    async def fake_local(prompt, http_client, on_token=None, options=None, priority="codegen",
+                         model=None, context=None):
+        model = model or router.LOCAL_MODEL
+        router.calls.append(model)
+        return {"success": True, "content": answers[model], "model": "local_ollama", "model_name": model}
+
+    router._generate_local = fake_local
+    return router
+
+
+def test_cache_keyed_on_answering_model():
+    accepted = "def add(a, b):\n    return a + b\n"
+    router = make_router({"qwen2.5-coder:1.5b": accepted, ModelRouter.LOCAL_MODEL: "large"})
+
+    async def scenario():
+        first = await router.generate("add two numbers", context={"kind": "code"})
+        second = await router.generate("add two numbers", context={"kind": "code"})
+        router.cascade_enabled = False  # без каскада ответ малой модели не подходит
+        third = await router.generate("add two numbers", context={"kind": "code"})
+        return first, second, third
+
+    first, second, third = asyncio.run(scenario())
+    small_key = ResponseCache.make_key(router.cascade_small_model, None, "add two numbers")
+    return first["content"] == accepted and second["content"] == accepted \
+        and third["content"] == "large" and router.calls == [router.cascade_small_model, router.LOCAL_MODEL] \
+        and router.response_cache.get(small_key)["model_name"] == router.cascade_small_model
+
+
+def test_escalated_answer_cached_under_large_model():
+    router = make_router({"qwen2.5-coder:1.5b": "Sorry", ModelRouter.LOCAL_MODEL: "a long enough answer from 7b"})
+
+    async def scenario():
+        await router.generate("explain the system", context={"kind": "chat"})
+        return await router.generate("explain the system", context={"kind": "chat"})
+
+    cached = asyncio.run(scenario())
+    small_key = ResponseCache.make_key(router.cascade_small_model, None, "explain the system")
+    return cached["content"] == "a long enough answer from 7b" \
+        and router.calls == [router.cascade_small_model, router.LOCAL_MODEL] \
+        and router.response_cache.get(small_key) is None
+
+
+def test_sampling_not_persisted_unless_deterministic():
+    with tempfile.TemporaryDirectory() as tmp:
+        router = make_router({ModelRouter.LOCAL_MODEL: "answer"})
+        router.cascade_enabled = False
+        router.response_cache = ResponseCache(db_path=str(Path(tmp) / "responses.db"))
+
+        async def scenario():
+            await router.generate("sampled", options={"temperature": 0.7})
+            await router.generate("greedy", context={"deterministic": True})
+
+        asyncio.run(scenario())
+        return router.response_cache.get_stats()["persisted_entries"] == 1
+
+
+if __name__ == "__main__":
+    runner = TestRunner("Response Cache")
+    runner.start()
+    runner.test("LRU вытесняет давно неиспользованные", test_lru_evicts_least_recent)
+    runner.test("Слишком большой ответ не кэшируется", test_oversized_value_is_skipped)
+    runner.test("Истечение TTL", test_ttl_expiry)
+    runner.test("Детерминированные ответы переживают перезапуск", test_persisted_entries_survive_restart)
+    runner.test("get_any считает один промах", test_get_any_counts_one_miss)
+    runner.test("Ключ по модели, которая ответила", test_cache_keyed_on_answering_model)
+    runner.test("Эскалация кэшируется под 7B", test_escalated_answer_cached_under_large_model)
+    runner.test("Сэмплированный ответ не сохраняется в sqlite", test_sampling_not_persisted_unless_deterministic)
+    sys.exit(0 if runner.finish() else 1)
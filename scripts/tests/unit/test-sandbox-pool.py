@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тест Sandbox Pool (web-ui)
+Проверяет выполнение кода в заранее запущенных воркерах, замену воркеров
+после max_runs и по таймауту, ограничения rlimit и запрет сети
+"""
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "services" / "web-ui"))
+
+from test_utils import TestRunner
+from sandbox_pool import SandboxPool
+
+
+def with_pool(check, **kwargs):
+    pool = SandboxPool(**{"size": 1, "timeout": 5.0, **kwargs})
+    pool.start()
+    try:
+        return check(pool)
+    finally:
+        pool.shutdown()
+
+
+def test_runs_code():
+    def check(pool):
+        ok = pool.run("print(sum(range(10)))")
+        failed = pool.run("raise SystemExit(3)")
+        return ok["success"] and ok["stdout"].strip() == "45" \
+            and not failed["success"] and failed["returncode"] == 3
+    return with_pool(check)
+
+
+def test_worker_recycled_after_max_runs():
+    def check(pool):
+        for _ in range(5):
+            if not pool.run("print('x')")["success"]:
+                return False
+        stats = pool.get_stats()
+        # Воркер заменяется на каждом втором возврате: после 2-го и 4-го запуска
+        return stats["workers_recycled"] == 2 and stats["workers_spawned"] == 3 and stats["idle"] == 1
+    return with_pool(check, max_runs=2)
+
+
+def test_cpu_timeout_kills_and_recycles():
+    def check(pool):
+        result = pool.run("while True:\n    pass", timeout=1.0)
+        after = pool.run("print('alive')")
+        stats = pool.get_stats()
+        return not result["success"] and "timeout" in result["error"].lower() \
+            and after["success"] and stats["timeouts"] == 1 and stats["workers_recycled"] == 1
+    return with_pool(check)
+
+
+def test_wall_clock_timeout():
+    def check(pool):
+        result = pool.run("import time\ntime.sleep(30)", timeout=0.5)
+        return not result["success"] and "timeout" in result["error"].lower() \
+            and pool.run("print(1)")["success"]
+    return with_pool(check)
+
+
+def test_memory_limit():
+    def check(pool):
+        result = pool.run("data = bytearray(512 * 1024 * 1024)\nprint('allocated')")
+        return not result["success"] and "MemoryError" in result["stderr"] and "allocated" not in result["stdout"]
+    return with_pool(check, memory_mb=128)
+
+
+def test_file_size_limit():
+    with tempfile.TemporaryDirectory() as tmp:
+        target = Path(tmp) / "big.bin"
+
+        def check(pool):
+            result = pool.run(f"with open({str(target)!r}, 'wb') as f:\n    f.write(b'x' * 4096)")
+            return not result["success"] and target.stat().st_size <= 1024
+        return with_pool(check, max_file_bytes=1024)
+
+
+def test_descriptor_limit():
+    def check(pool):
+        result = pool.run("files = [open('/dev/null') for _ in range(200)]")
+        return not result["success"] and "Too many open files" in result["stderr"]
+    return with_pool(check)
+
+
+def test_network_blocked_in_interpreter():
+    def check(pool):
+        result = pool.run("import socket\nsocket.socket()")
+        return not result["success"] and "PermissionError" in result["stderr"]
+    return with_pool(check)
+
+
+def test_network_blocked_for_child_processes():
+    code = (
+        "import subprocess, sys\n"
+        "r = subprocess.run([sys.executable, '-c', 'import socket; socket.socket()'], capture_output=True)\n"
+        "print(r.returncode, r.stderr.decode().strip().splitlines()[-1])"
+    )
+
+    def check(pool):
+        result = pool.run(code)
+        if pool.get_stats()["network_isolation"] != "seccomp":
+            print("  seccomp недоступен - изоляция только внутри интерпретатора")
+            return True
+        return result["success"] and "Operation not permitted" in result["stdout"]
+    return with_pool(check, memory_mb=512)
+
+
+if __name__ == "__main__":
+    runner = TestRunner("Sandbox Pool")
+    runner.start()
+    runner.test("Выполнение кода", test_runs_code)
+    runner.test("Замена воркера после max_runs", test_worker_recycled_after_max_runs)
+    runner.test("Таймаут CPU: kill и замена воркера", test_cpu_timeout_kills_and_recycles)
+    runner.test("Таймаут по времени", test_wall_clock_timeout)
+    runner.test("Лимит памяти", test_memory_limit)
+    runner.test("Лимит размера файла", test_file_size_limit)
+    runner.test("Лимит дескрипторов", test_descriptor_limit)
+    runner.test("Сеть закрыта в интерпретаторе", test_network_blocked_in_interpreter)
+    runner.test("Сеть закрыта для дочерних процессов (seccomp)", test_network_blocked_for_child_processes)
+    sys.exit(0 if runner.finish() else 1)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тест Session Store (web-ui)
+Проверяет LRU-вытеснение с записью в sqlite, вытеснение по простою,
+ленивую загрузку, удаление сессий старше срока хранения
+и очистку blob-ов, на которые не ссылается ни одна сессия
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "services" / "web-ui"))
+
+from test_utils import TestRunner
+from blob_store import BlobStore, find_blob_refs
+from conversation_manager import ConversationSession
+from session_store import SessionStore
+
+
+class FakeSession:
+    def __init__(self, session_id: str, messages=None):
+        self.session_id = session_id
+        self.created_at = "2026-01-01T00:00:00"
+        self.messages = list(messages or [])
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(state["session_id"], state["messages"])
+
+    def to_state(self):
+        return {"session_id": self.session_id, "messages": self.messages}
+
+    def total_messages(self):
+        return len(self.messages)
+
+    def to_dict(self):
+        return {"session_id": self.session_id, "message_count": len(self.messages)}
+
+
+def make_store(tmp: str = None, **kwargs) -> SessionStore:
+    db_path = str(Path(tmp) / "sessions.db") if tmp else None
+    return SessionStore(FakeSession.from_state, db_path=db_path, **kwargs)
+
+
+def test_lru_eviction_writes_back():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = make_store(tmp, max_sessions=2)
+        for sid in ("a", "b"):
+            store.add(sid, FakeSession(sid, [sid]))
+        store.get("a")  # "b" становится самой старой
+        store.add("c", FakeSession("c"))
+
+        resident = {s.session_id for s in store.resident()}
+        reloaded = store.get("b")
+        stats = store.get_stats()
+        return resident == {"a", "c"} and reloaded is not None and reloaded.messages == ["b"] \
+            and stats["evictions"]["lru"] >= 1 and stats["disk_loads"] == 1
+
+
+def test_lazy_load_after_restart():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = make_store(tmp)
+        session = FakeSession("s1", ["hello"])
+        store.add("s1", session)
+        session.messages.append("world")
+        store.save(session)
+
+        restarted = make_store(tmp)
+        before = restarted.get_stats()["resident"]
+        loaded = restarted.get("s1")
+        return before == 0 and loaded.messages == ["hello", "world"] \
+            and restarted.get("s1") is loaded and restarted.get_stats()["hits"] == 1
+
+
+def test_idle_eviction():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = make_store(tmp, idle_ttl=0.05)
+        store.add("idle", FakeSession("idle", ["x"]))
+        time.sleep(0.06)
+        store.add("active", FakeSession("active"))
+        evicted = store.evict_idle()
+        return evicted == 1 and [s.session_id for s in store.resident()] == ["active"] \
+            and store.get("idle").messages == ["x"]
+
+
+def test_retention_deletes_old_rows():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = make_store(tmp, idle_ttl=0.0, retention=0.05)
+        store.add("old", FakeSession("old"))
+        store.evict_idle()  # записана в sqlite и выгружена из памяти
+        time.sleep(0.06)
+        store.evict_idle()
+        return store.get("old") is None and store.count() == 0
+
+
+def test_memory_mode_loses_evicted():
+    store = make_store(max_sessions=1)
+    store.add("a", FakeSession("a"))
+    store.add("b", FakeSession("b"))
+    return store.get("a") is None and store.get("b") is not None and not store.get_stats()["persistent"]
+
+
+def test_flush_persists_unsaved_changes():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = make_store(tmp)
+        session = FakeSession("s")
+        store.add("s", session)
+        session.messages.append("unsaved")
+        store.flush()
+        return make_store(tmp).get("s").messages == ["unsaved"]
+
+
+def test_blob_sweep_memory_mode():
+    blobs = BlobStore()
+    kept = blobs.put({"plan": "kept"})
+    dropped = blobs.put({"plan": "dropped"})
+    fresh_before = blobs.sweep(set(), grace=60.0)  # моложе grace - не трогаем
+    removed = blobs.sweep({kept}, grace=0.0)
+    return fresh_before == 0 and removed == 1 and blobs.get(kept) == {"plan": "kept"} \
+        and blobs.get(dropped) is None and blobs.get_stats()["swept"] == 1
+
+
+def test_blob_sweep_sqlite_and_reput():
+    with tempfile.TemporaryDirectory() as tmp:
+        blobs = BlobStore(str(Path(tmp) / "blobs.db"))
+        old = blobs.put({"result": 1})
+        time.sleep(0.06)
+        blobs.put({"result": 1})  # повторная запись продлевает жизнь blob-а
+        young = blobs.sweep(set(), grace=0.05)
+        time.sleep(0.06)
+        removed = blobs.sweep(set(), grace=0.05)
+        return young == 0 and removed == 1 and blobs.get(old) is None and blobs.get_stats()["blobs"] == 0
+
+
+def test_session_state_exposes_blob_refs():
+    session = ConversationSession("s")
+    message = session.add_message("assistant", "done", {
+        "execution_plan": {"steps": ["Check system health"]},
+        "task_result": {"task_id": "t1", "result": [{"step": "a", "status": "success"}]}
+    })
+    store = make_store()
+    store.add("s", session)
+    refs = {ref for _, state in store.iter_states() for ref in find_blob_refs(state)}
+    return refs == {message.metadata["execution_plan_ref"], message.metadata["task_result_ref"]}
+
+
+if __name__ == "__main__":
+    runner = TestRunner("Session Store")
+    runner.start()
+    runner.test("LRU-вытеснение с записью в sqlite", test_lru_eviction_writes_back)
+    runner.test("Ленивая загрузка после перезапуска", test_lazy_load_after_restart)
+    runner.test("Вытеснение по простою", test_idle_eviction)
+    runner.test("Удаление старше срока хранения", test_retention_deletes_old_rows)
+    runner.test("Без sqlite вытесненная сессия теряется", test_memory_mode_loses_evicted)
+    runner.test("flush() сохраняет несохранённые изменения", test_flush_persists_unsaved_changes)
+    runner.test("Очистка blob-ов в памяти", test_blob_sweep_memory_mode)
+    runner.test("Очистка blob-ов в sqlite и продление при записи", test_blob_sweep_sqlite_and_reput)
+    runner.test("Ссылки на blob-ы в состоянии сессии", test_session_state_exposes_blob_refs)
+    sys.exit(0 if runner.finish() else 1)
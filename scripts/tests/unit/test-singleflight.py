@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тест Singleflight (web-ui)
+Проверяет объединение одинаковых одновременных вызовов, передачу ошибок
+всем ожидающим, раздельные ключи для разных параметров и отмену
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "services" / "web-ui"))
+
+from test_utils import TestRunner
+from singleflight import SingleFlight
+
+
+def upstream(calls: list, delay: float = 0.02, error: Exception = None):
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        if error:
+            raise error
+        return {"documents": ["doc"]}
+    return call
+
+
+def test_identical_calls_coalesce():
+    async def scenario():
+        flight, calls = SingleFlight(), []
+        results = await asyncio.gather(*[
+            flight.do("rag", "/query", {"query": "q", "top_k": 3}, upstream(calls)) for _ in range(5)
+        ])
+        return results, calls, flight.get_stats()["rag"]
+
+    results, calls, stats = asyncio.run(scenario())
+    return len(calls) == 1 and [c for _, c in results].count(False) == 1 \
+        and all(r == {"documents": ["doc"]} for r, _ in results) \
+        and stats["calls"] == 1 and stats["coalesced"] == 4 and stats["in_flight"] == 0
+
+
+def test_error_reaches_every_waiter():
+    async def scenario():
+        flight, calls = SingleFlight(), []
+        outcomes = await asyncio.gather(*[
+            flight.do("rag", "/query", {"query": "q"}, upstream(calls, error=ConnectionError("down")))
+            for _ in range(3)
+        ], return_exceptions=True)
+        # После ошибки ключ свободен - следующий вызов идёт в upstream заново
+        await flight.do("rag", "/query", {"query": "q"}, upstream(calls))
+        return outcomes, calls
+
+    outcomes, calls = asyncio.run(scenario())
+    return all(isinstance(o, ConnectionError) for o in outcomes) and len(calls) == 2
+
+
+def test_payload_normalization_and_distinct_keys():
+    key = SingleFlight.make_key
+    same = key("rag", "/query", {"a": 1, "b": 2}) == key("rag", "/query", {"b": 2, "a": 1})
+    other_timeout = key("rag", "/query", {"query": "q", "request": {"timeout": 5.0}}) != \
+        key("rag", "/query", {"query": "q", "request": {}})
+    other_endpoint = key("rag", "/query", None) != key("rag", "/health", None)
+    return same and other_timeout and other_endpoint
+
+
+def test_different_payloads_do_not_coalesce():
+    async def scenario():
+        flight, calls = SingleFlight(), []
+        await asyncio.gather(
+            flight.do("rag", "/query", {"query": "q", "request": {"timeout": 5.0}}, upstream(calls)),
+            flight.do("rag", "/query", {"query": "q", "request": {}}, upstream(calls))
+        )
+        return calls
+
+    return len(asyncio.run(scenario())) == 2
+
+
+def test_leader_cancel_keeps_flight_for_others():
+    async def scenario():
+        flight, calls = SingleFlight(), []
+        leader = asyncio.create_task(flight.do("rag", "/query", {"q": 1}, upstream(calls, delay=0.05)))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("rag", "/query", {"q": 1}, upstream(calls)))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        result, coalesced = await follower
+        return result, coalesced, calls, flight.get_stats()["rag"]["abandoned"]
+
+    result, coalesced, calls, abandoned = asyncio.run(scenario())
+    return result == {"documents": ["doc"]} and coalesced and len(calls) == 1 and abandoned == 0
+
+
+def test_last_waiter_cancel_abandons_flight():
+    async def scenario():
+        flight, calls = SingleFlight(), []
+        cancelled = []
+
+        async def slow():
+            calls.append(1)
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled.append(1)
+                raise
+
+        caller = asyncio.create_task(flight.do("rag", "/query", {"q": 1}, slow))
+        await asyncio.sleep(0.01)
+        caller.cancel()
+        await asyncio.gather(caller, return_exceptions=True)
+        await asyncio.sleep(0)
+        return cancelled, flight.get_stats()["rag"]
+
+    cancelled, stats = asyncio.run(scenario())
+    return cancelled == [1] and stats["abandoned"] == 1 and stats["in_flight"] == 0
+
+
+if __name__ == "__main__":
+    runner = TestRunner("Singleflight")
+    runner.start()
+    runner.test("Одинаковые вызовы объединяются", test_identical_calls_coalesce)
+    runner.test("Ошибка доходит до всех ожидающих", test_error_reaches_every_waiter)
+    runner.test("Нормализация и различие ключей", test_payload_normalization_and_distinct_keys)
+    runner.test("Разные параметры не объединяются", test_different_payloads_do_not_coalesce)
+    runner.test("Отмена первого не отменяет запрос", test_leader_cancel_keeps_flight_for_others)
+    runner.test("Отмена последнего отменяет запрос", test_last_waiter_cancel_abandons_flight)
+    sys.exit(0 if runner.finish() else 1)
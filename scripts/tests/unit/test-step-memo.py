@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тест Step Memo (web-ui)
+Проверяет TTL, изоляцию копий, инвалидацию по записываемым ключам
+и сброс кэша проверок здоровья после применения изменений
+"""
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "services" / "web-ui"))
+
+import httpx
+
+from test_utils import TestRunner
+from execution_engine import ExecutionEngine
+from step_registry import StepMemo, StepRegistry
+
+SERVICES = {"rag": "http://rag", "arch": "http://arch", "ollama": "http://ollama"}
+
+
+async def _noop(step, step_lower, context, result):
+    return True
+
+
+def make_handlers():
+    registry = StepRegistry()
+    health = registry.register("health", _noop, ["health"], reads=["system_state"], memo_ttl=60.0)
+    search = registry.register("search", _noop, ["search"], memo_ttl=0.05, memo_context=["query"])
+    return health, search
+
+
+def test_hit_returns_copy():
+    memo = StepMemo()
+    health, _ = make_handlers()
+    key = StepMemo.key(health, "check system health")
+    memo.put(health, key, {"status": "success", "data": {"rag": "healthy"}})
+
+    first = memo.get(health, key)
+    first["data"]["rag"] = "mutated"
+    return memo.get(health, key)["data"]["rag"] == "healthy" and memo.get_stats()["hits"] == 2
+
+
+def test_ttl_expiry():
+    memo = StepMemo()
+    _, search = make_handlers()
+    key = StepMemo.key(search, "search docs", {"query": "redis"})
+    memo.put(search, key, {"status": "success", "data": 1})
+    fresh = memo.get(search, key) is not None
+    time.sleep(0.06)
+    return fresh and memo.get(search, key) is None
+
+
+def test_memo_context_in_key():
+    _, search = make_handlers()
+    return StepMemo.key(search, "search docs", {"query": "redis"}) != \
+        StepMemo.key(search, "search docs", {"query": "postgres"})
+
+
+def test_invalidate_by_written_keys():
+    memo = StepMemo()
+    health, search = make_handlers()
+    health_key = StepMemo.key(health, "check system health")
+    search_key = StepMemo.key(search, "search docs", {"query": "x"})
+    memo.put(health, health_key, {"status": "success"})
+    memo.put(search, search_key, {"status": "success"})
+
+    memo.invalidate(["workspace"])  # никто не читает - ничего не сбрасывается
+    untouched = memo.get(health, health_key) is not None
+    memo.invalidate(["system_state"])
+    return untouched and memo.get(health, health_key) is None \
+        and memo.get(search, search_key) is not None and memo.get_stats()["invalidations"] == 1
+
+
+def test_capacity_bound():
+    memo = StepMemo(max_entries=3)
+    health, _ = make_handlers()
+    for i in range(10):
+        memo.put(health, StepMemo.key(health, f"health {i}"), {"status": "success"})
+    return memo.get_stats()["entries"] <= 3
+
+
+def test_apply_invalidates_memoized_health():
+    health_calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path in ("/health", "/api/tags"):
+            health_calls.append(request.url.host)
+            return httpx.Response(200, json={"status": "healthy", "models": []})
+        if request.url.path == "/arch/apply":
+            return httpx.Response(200, json={"applied": True})
+        return httpx.Response(404)
+
+    engine = ExecutionEngine(httpx.AsyncClient(transport=httpx.MockTransport(handler)), SERVICES)
+
+    async def scenario():
+        context = {"change_id": "c1"}
+        first = await engine.execute_step("Check system health", context)
+        second = await engine.execute_step("Check system health", context)
+        calls_before_apply = len(health_calls)
+        await engine.execute_step("Apply configuration", context)
+        third = await engine.execute_step("Check system health", context)
+        return first, second, third, calls_before_apply
+
+    first, second, third, calls_before_apply = asyncio.run(scenario())
+    return not first.get("cached") and second.get("cached") and not third.get("cached") \
+        and calls_before_apply == len(SERVICES) and len(health_calls) == 2 * len(SERVICES)
+
+
+if __name__ == "__main__":
+    runner = TestRunner("Step Memo")
+    runner.start()
+    runner.test("Попадание возвращает копию", test_hit_returns_copy)
+    runner.test("Истечение TTL", test_ttl_expiry)
+    runner.test("memo_context входит в ключ", test_memo_context_in_key)
+    runner.test("Инвалидация по записываемым ключам", test_invalidate_by_written_keys)
+    runner.test("Ограничение размера", test_capacity_bound)
+    runner.test("Apply сбрасывает кэш проверки здоровья", test_apply_invalidates_memoized_health)
+    sys.exit(0 if runner.finish() else 1)
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Микробенчмарк диспетчеризации шагов ExecutionEngine
+Сравнивает кэшированный resolve() с полным перебором матчеров (scan())
+"""
+
+import sys
+import timeit
+from pathlib import Path
+
+WEB_UI = Path(__file__).resolve().parents[3] / "services" / "web-ui"
+sys.path.insert(0, str(WEB_UI))
+
+import httpx  # noqa: E402
+
+from execution_engine import ExecutionEngine  # noqa: E402
+from step_registry import StepRegistry  # noqa: E402
+from task_executor import STEP_TEMPLATES  # noqa: E402
+
+
+def build_registry() -> StepRegistry:
+    """Таблица обработчиков настоящего ExecutionEngine (обработчики не вызываются)"""
+    engine = ExecutionEngine(httpx.AsyncClient(), services={})
+    return engine.registry
+
+
+def main():
+    steps = [step.lower() for steps in STEP_TEMPLATES.values() for step in steps]
+    registry = build_registry()
+    registry.warm(steps)
+    number = 2000
+
+    print(f"Шагов в шаблонах: {len(steps)}, обработчиков: {len(registry.handlers)}")
+    for label, fn in (
+        ("resolve (кэш)", lambda: [registry.resolve(s) for s in steps]),
+        ("scan (перебор)", lambda: [registry.scan(s) for s in steps]),
+    ):
+        best = min(timeit.repeat(fn, number=number, repeat=5))
+        per_step_us = best / (number * len(steps)) * 1e6
+        print(f"  {label:16} {per_step_us:8.3f} мкс/шаг")
+
+
+if __name__ == "__main__":
+    main()
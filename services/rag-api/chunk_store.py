@@ -0,0 +1,279 @@
+"""
+Chunk Store - Tiered storage for chunk text (hot LRU + cold zstd segment)
+"""
+import mmap
+import os
+import struct
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+import structlog
+import zstandard
+
+logger = structlog.get_logger()
+
+# Record layout: id length (u16), payload length (u32), id bytes, zstd payload.
+# A record with an empty payload is a tombstone (zstd frames are never empty).
+_HEADER = struct.Struct("<HI")
+
+
+class ChunkStore:
+    """
+    Chunk text addressed by chunk id.
+
+    Every chunk is appended once to a zstd-compressed segment file which is
+    read through mmap; recently written or read chunks are also kept
+    uncompressed in a bounded LRU. The index is rebuilt on startup by
+    walking record headers, so no payload is decompressed until requested.
+
+    Writing an existing id appends a new record that supersedes the old
+    one; deletes append tombstones. Once dead records (superseded ones and
+    tombstones) make up compact_ratio of a segment of at least
+    compact_min_bytes, compact() rewrites it with the live records only.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        hot_capacity: int = 2000,
+        compression_level: int = 3,
+        compact_ratio: float = 0.5,
+        compact_min_bytes: int = 4 * 1024 * 1024
+    ):
+        self.path = Path(path)
+        self.segment_path = self.path / "chunks.seg"
+        self.hot_capacity = hot_capacity
+        self.compact_ratio = compact_ratio
+        self.compact_min_bytes = compact_min_bytes
+
+        self._compressor = zstandard.ZstdCompressor(level=compression_level)
+        self._decompressor = zstandard.ZstdDecompressor()
+        self._hot: "OrderedDict[str, str]" = OrderedDict()
+        self._index: Dict[str, tuple] = {}  # chunk_id -> (payload offset, payload length)
+        self._file = None
+        self._mmap: Optional[mmap.mmap] = None
+        self._mapped_size = 0
+        self._segment_bytes = 0
+        self._live_bytes = 0   # records the index points at
+        self._hot_bytes = 0
+        self._lock = threading.Lock()
+
+        self.hot_hits = 0
+        self.cold_reads = 0
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+        self.compactions = 0
+
+    def open(self):
+        """Open (or create) the segment file and rebuild the index"""
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.segment_path, "a+b")
+        self._rebuild_index()
+        logger.info("chunk_store_opened", path=str(self.segment_path), chunks=len(self._index))
+
+    @staticmethod
+    def _record_size(chunk_id: str, payload_len: int) -> int:
+        return _HEADER.size + len(chunk_id.encode("utf-8")) + payload_len
+
+    def _rebuild_index(self):
+        self._index.clear()
+        size = os.path.getsize(self.segment_path)
+        self._segment_bytes = size
+        offset = 0
+        with open(self.segment_path, "rb") as f:
+            while offset + _HEADER.size <= size:
+                f.seek(offset)
+                id_len, payload_len = _HEADER.unpack(f.read(_HEADER.size))
+                record_end = offset + _HEADER.size + id_len + payload_len
+                if record_end > size:
+                    # Torn write at the tail - ignore the partial record
+                    logger.warning("chunk_store_truncated_record", offset=offset)
+                    break
+                chunk_id = f.read(id_len).decode("utf-8")
+                if payload_len:
+                    self._index[chunk_id] = (offset + _HEADER.size + id_len, payload_len)
+                else:
+                    self._index.pop(chunk_id, None)
+                offset = record_end
+        self._live_bytes = sum(self._record_size(cid, length) for cid, (_, length) in self._index.items())
+
+    def _remap(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        size = os.path.getsize(self.segment_path)
+        if size:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._mapped_size = size
+
+    def _remember(self, chunk_id: str, text: str):
+        self._forget_hot(chunk_id)
+        self._hot[chunk_id] = text
+        self._hot_bytes += len(text)
+        while len(self._hot) > self.hot_capacity:
+            _, evicted = self._hot.popitem(last=False)
+            self._hot_bytes -= len(evicted)
+
+    def _forget_hot(self, chunk_id: str):
+        text = self._hot.pop(chunk_id, None)
+        if text is not None:
+            self._hot_bytes -= len(text)
+
+    def _drop_live(self, chunk_id: str) -> bool:
+        location = self._index.pop(chunk_id, None)
+        if location is None:
+            return False
+        self._live_bytes -= self._record_size(chunk_id, location[1])
+        return True
+
+    def put_many(self, ids: List[str], texts: List[str]):
+        """Append chunks to the segment and keep them hot"""
+        with self._lock:
+            self._file.seek(0, os.SEEK_END)
+            offset = self._file.tell()
+            buffer = bytearray()
+            for chunk_id, text in zip(ids, texts):
+                raw = text.encode("utf-8")
+                id_bytes = chunk_id.encode("utf-8")
+                payload = self._compressor.compress(raw)
+                buffer += _HEADER.pack(len(id_bytes), len(payload))
+                buffer += id_bytes
+                payload_offset = offset + len(buffer)
+                buffer += payload
+                self._drop_live(chunk_id)
+                self._index[chunk_id] = (payload_offset, len(payload))
+                self._live_bytes += self._record_size(chunk_id, len(payload))
+                self.raw_bytes += len(raw)
+                self.compressed_bytes += len(payload)
+                self._remember(chunk_id, text)
+            self._file.write(buffer)
+            self._file.flush()
+            self._segment_bytes += len(buffer)
+            self._maybe_compact()
+
+    def delete_many(self, ids: List[str]):
+        """Forget chunks (tombstones keep them deleted across restarts)"""
+        with self._lock:
+            buffer = bytearray()
+            for chunk_id in ids:
+                if not self._drop_live(chunk_id):
+                    continue
+                self._forget_hot(chunk_id)
+                id_bytes = chunk_id.encode("utf-8")
+                buffer += _HEADER.pack(len(id_bytes), 0)
+                buffer += id_bytes
+            if buffer:
+                self._file.seek(0, os.SEEK_END)
+                self._file.write(buffer)
+                self._file.flush()
+                self._segment_bytes += len(buffer)
+                self._maybe_compact()
+
+    def _maybe_compact(self):
+        dead = self._segment_bytes - self._live_bytes
+        if self._segment_bytes >= self.compact_min_bytes and dead >= self._segment_bytes * self.compact_ratio:
+            self._compact()
+
+    def compact(self):
+        """Rewrite the segment with live records only"""
+        with self._lock:
+            self._compact()
+
+    def _compact(self):
+        before = self._segment_bytes
+        tmp_path = self.segment_path.with_suffix(".seg.tmp")
+        index: Dict[str, tuple] = {}
+        with open(self.segment_path, "rb") as src, open(tmp_path, "wb") as dst:
+            offset = 0
+            for chunk_id, (payload_offset, length) in sorted(self._index.items(), key=lambda kv: kv[1][0]):
+                src.seek(payload_offset)
+                payload = src.read(length)
+                id_bytes = chunk_id.encode("utf-8")
+                dst.write(_HEADER.pack(len(id_bytes), length))
+                dst.write(id_bytes)
+                index[chunk_id] = (offset + _HEADER.size + len(id_bytes), length)
+                dst.write(payload)
+                offset += _HEADER.size + len(id_bytes) + length
+            dst.flush()
+            os.fsync(dst.fileno())
+
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._mapped_size = 0
+        self._file.close()
+        os.replace(tmp_path, self.segment_path)
+        self._file = open(self.segment_path, "a+b")
+        self._index = index
+        self._segment_bytes = self._live_bytes = offset
+        self.compactions += 1
+        logger.info("chunk_store_compacted", before_bytes=before, after_bytes=offset, chunks=len(index))
+
+    def get(self, chunk_id: str) -> Optional[str]:
+        """Fetch chunk text, decompressing from the cold segment on a miss"""
+        with self._lock:
+            text = self._hot.get(chunk_id)
+            if text is not None:
+                self._hot.move_to_end(chunk_id)
+                self.hot_hits += 1
+                return text
+
+            location = self._index.get(chunk_id)
+            if location is None:
+                return None
+
+            offset, length = location
+            if offset + length > self._mapped_size:
+                self._remap()
+
+            text = self._decompressor.decompress(self._mmap[offset:offset + length]).decode("utf-8")
+            self.cold_reads += 1
+            self._remember(chunk_id, text)
+            return text
+
+    def get_many(self, ids: List[str]) -> List[Optional[str]]:
+        return [self.get(chunk_id) for chunk_id in ids]
+
+    def clear(self):
+        """Drop every chunk and truncate the segment"""
+        with self._lock:
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+            self._mapped_size = 0
+            self._file.truncate(0)
+            self._file.flush()
+            self._index.clear()
+            self._hot.clear()
+            self._segment_bytes = self._live_bytes = self._hot_bytes = 0
+            self.raw_bytes = 0
+            self.compressed_bytes = 0
+
+    def close(self):
+        with self._lock:
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Storage statistics"""
+        with self._lock:
+            reads = self.hot_hits + self.cold_reads
+            return {
+                "chunks": len(self._index),
+                "hot_chunks": len(self._hot),
+                "hot_capacity": self.hot_capacity,
+                "hot_bytes": self._hot_bytes,
+                "segment_bytes": self._segment_bytes,
+                "dead_bytes": self._segment_bytes - self._live_bytes,
+                "compactions": self.compactions,
+                "compression_ratio": round(self.raw_bytes / self.compressed_bytes, 2) if self.compressed_bytes else None,
+                "hot_hits": self.hot_hits,
+                "cold_reads": self.cold_reads,
+                "hot_hit_rate": round(self.hot_hits / reads * 100, 1) if reads else 0.0
+            }
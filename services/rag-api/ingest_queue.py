@@ -0,0 +1,177 @@
+"""
+Ingest Queue - Single-writer queue that coalesces collection writes
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+import structlog
+
+logger = structlog.get_logger()
+
+# Queued by stop(): the writer flushes what it holds and exits
+_STOP = object()
+
+
+@dataclass
+class PendingWrite:
+    texts: List[str]
+    metadatas: List[Dict[str, Any]]
+    ids: List[str]
+    future: asyncio.Future
+
+
+class IngestQueue:
+    """
+    Funnel every write through one background task.
+
+    Pending chunks from all callers are merged and handed to ``writer`` in a
+    single call once ``max_chunks`` have accumulated or ``flush_interval_ms``
+    has elapsed since the first pending write. Each caller awaits its own
+    future, so per-document IDs and errors still reach the right request:
+    when a merged write fails, its documents are retried one by one and
+    only the failing ones see the error.
+    """
+
+    def __init__(
+        self,
+        writer: Callable[[List[str], List[Dict[str, Any]], List[str]], None],
+        flush_interval_ms: int = 50,
+        max_chunks: int = 256
+    ):
+        self.writer = writer
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_chunks = max_chunks
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        self.batches_written = 0
+        self.documents_written = 0
+        self.chunks_written = 0
+        self.write_errors = 0
+        self.batch_retries = 0
+        self.total_write_time = 0.0
+
+    def start(self):
+        """Start the writer task on the running event loop"""
+        if self._task is None:
+            self._stopping = False
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+            logger.info("ingest_queue_started", flush_interval_ms=self.flush_interval * 1000,
+                        max_chunks=self.max_chunks)
+
+    async def stop(self):
+        """Flush whatever is pending and stop the writer task"""
+        if self._task is None:
+            return
+        self._stopping = True
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    async def submit(self, texts: List[str], metadatas: List[Dict[str, Any]], ids: List[str]):
+        """Queue chunks for the next batch and wait until they are written"""
+        if not texts:
+            return
+        if self._task is None or self._stopping:
+            raise RuntimeError("Ingest queue is not running")
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(PendingWrite(texts, metadatas, ids, future))
+        await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            chunks = len(item.ids)
+            deadline = loop.time() + self.flush_interval
+
+            while chunks < self.max_chunks:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+                chunks += len(item.ids)
+
+            await self._flush(batch)
+
+        # Writes queued before stop() are still owed to their callers
+        pending = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not _STOP:
+                pending.append(item)
+        if pending:
+            await self._flush(pending)
+        logger.info("ingest_queue_stopped")
+
+    async def _flush(self, batch: List[PendingWrite]):
+        texts, metadatas, ids = [], [], []
+        for item in batch:
+            texts.extend(item.texts)
+            metadatas.extend(item.metadatas)
+            ids.extend(item.ids)
+
+        start_time = time.time()
+        try:
+            # Embedding and the Chroma write are blocking; keep them off the loop
+            await asyncio.to_thread(self.writer, texts, metadatas, ids)
+        except Exception as e:
+            if len(batch) > 1:
+                # One bad document must not fail everyone merged with it
+                self.batch_retries += 1
+                logger.warning("ingest_batch_retry_per_document", documents=len(batch), error=str(e))
+                for item in batch:
+                    await self._flush([item])
+                return
+            self.write_errors += 1
+            logger.error("ingest_batch_failed", documents=len(batch), chunks=len(ids), error=str(e))
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            return
+
+        duration = time.time() - start_time
+        self.batches_written += 1
+        self.documents_written += len(batch)
+        self.chunks_written += len(ids)
+        self.total_write_time += duration
+        logger.info("ingest_batch_written", documents=len(batch), chunks=len(ids),
+                    duration_ms=round(duration * 1000, 1))
+
+        for item in batch:
+            if not item.future.done():
+                item.future.set_result(None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Writer statistics"""
+        batches = self.batches_written
+        return {
+            "running": self._task is not None,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "flush_interval_ms": self.flush_interval * 1000,
+            "max_chunks": self.max_chunks,
+            "batches_written": batches,
+            "documents_written": self.documents_written,
+            "chunks_written": self.chunks_written,
+            "write_errors": self.write_errors,
+            "batch_retries": self.batch_retries,
+            "avg_documents_per_batch": round(self.documents_written / batches, 2) if batches else 0,
+            "avg_write_ms": round(self.total_write_time / batches * 1000, 1) if batches else 0
+        }
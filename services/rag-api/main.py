@@ -47,6 +47,13 @@ async def startup_event():
     logger.info("RAG API service ready")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flush queued writes before exit"""
+    await rag_engine.shutdown()
+    logger.info("RAG API service stopped")
+
+
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint"""
@@ -124,6 +131,32 @@ async def add_document(request: AddDocumentRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+class BatchAddRequest(BaseModel):
+    documents: List[AddDocumentRequest] = Field(..., min_length=1, description="Documents to add")
+
+
+@app.post("/add/batch")
+async def add_documents_batch(request: BatchAddRequest):
+    """
+    Add several documents in one call; IDs are returned in request order
+    """
+    try:
+        logger.info("add_batch_started", documents=len(request.documents))
+        
+        result = await rag_engine.add_documents([
+            {"content": doc.content, "metadata": doc.metadata}
+            for doc in request.documents
+        ])
+        
+        logger.info("add_batch_completed", documents_added=result["documents_added"],
+                    chunks_created=result["chunks_created"])
+        return result
+        
+    except Exception as e:
+        logger.error("add_batch_failed", error=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/ingest/upload")
 async def ingest_upload(file: UploadFile = File(...)):
     """
@@ -164,6 +197,24 @@ async def inspect():
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/cache/stats")
+async def cache_stats():
+    """
+    Semantic query cache statistics
+    """
+    return rag_engine.get_cache_stats()
+
+
+@app.delete("/cache")
+async def clear_cache():
+    """
+    Drop all semantic cache entries
+    """
+    rag_engine.semantic_cache.clear()
+    logger.info("semantic_cache_cleared")
+    return {"success": True, "message": "Semantic cache cleared"}
+
+
 @app.delete("/clear")
 async def clear_database():
     """
@@ -22,6 +22,7 @@ class QueryResponse(BaseModel):
     documents: List[DocumentResult]
     total_results: int
     processing_time_ms: float
+    cache_hit: bool = False
 
 
 class IngestRequest(BaseModel):
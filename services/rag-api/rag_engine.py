@@ -3,11 +3,14 @@ RAG Engine - Core logic for document processing and retrieval
 """
 import os
 import time
+import uuid
+import asyncio
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 import structlog
 import chromadb
 from chromadb.config import Settings
+from chromadb.utils import embedding_functions
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import (
     PyPDFLoader,
@@ -15,6 +18,10 @@ from langchain_community.document_loaders import (
     UnstructuredMarkdownLoader
 )
 
+from semantic_cache import SemanticQueryCache
+from chunk_store import ChunkStore
+from ingest_queue import IngestQueue
+
 logger = structlog.get_logger()
 
 
@@ -25,6 +32,34 @@ class RAGEngine:
         self.chroma_client = None
         self.collection = None
         
+        # Same model Chroma uses by default, held here so query embeddings
+        # can be computed once and shared with the semantic cache
+        self.embedding_function = embedding_functions.DefaultEmbeddingFunction()
+        
+        # Bumped on every write so cached results never outlive the data
+        self.generation = 0
+        self.semantic_cache = SemanticQueryCache(
+            capacity=int(os.getenv("SEMANTIC_CACHE_CAPACITY", "256")),
+            threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+            ttl=float(os.getenv("SEMANTIC_CACHE_TTL", "600"))
+        )
+        self.semantic_cache_enabled = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() in ("true", "1", "yes")
+        
+        # Chunk text lives here (hot LRU + compressed segment), not in Chroma;
+        # it must sit on the same volume as the Chroma data it belongs to
+        self.chunk_store = ChunkStore(
+            path=os.getenv("CHUNK_STORE_PATH", "/chroma/chroma/chunks"),
+            hot_capacity=int(os.getenv("CHUNK_HOT_CAPACITY", "2000")),
+            compact_ratio=float(os.getenv("CHUNK_COMPACT_RATIO", "0.5"))
+        )
+        
+        # Single writer: all callers' chunks are coalesced into one collection.upsert
+        self.write_queue = IngestQueue(
+            writer=self._add_chunks,
+            flush_interval_ms=int(os.getenv("INGEST_FLUSH_INTERVAL_MS", "50")),
+            max_chunks=int(os.getenv("INGEST_MAX_BATCH_CHUNKS", "256"))
+        )
+        
         # Text splitter for semantic chunking
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=512,
@@ -50,10 +85,14 @@ class RAGEngine:
             # Get or create collection
             self.collection = self.chroma_client.get_or_create_collection(
                 name="rag_documents",
-                metadata={"description": "RAG document store"}
+                metadata={"description": "RAG document store"},
+                embedding_function=self.embedding_function
             )
             
             logger.info("chromadb_initialized", collection=self.collection.name)
+            
+            self.chunk_store.open()
+            self.write_queue.start()
         except Exception as e:
             logger.error("chromadb_init_failed", error=str(e))
             raise
@@ -98,29 +137,54 @@ class RAGEngine:
         start_time = time.time()
         
         try:
-            # Use Ollama for embeddings via ChromaDB
+            query_embedding = self.embedding_function([query])[0]
+            
+            if self.semantic_cache_enabled:
+                cached = self.semantic_cache.lookup(query_embedding, self.generation, top_k, filters)
+                if cached:
+                    logger.info("semantic_cache_hit", similarity=round(cached["similarity"], 4))
+                    return {
+                        "query": query,
+                        "documents": cached["documents"],
+                        "total_results": len(cached["documents"]),
+                        "processing_time_ms": (time.time() - start_time) * 1000,
+                        "cache_hit": True
+                    }
+            
+            generation = self.generation
             results = self.collection.query(
-                query_texts=[query],
+                query_embeddings=[query_embedding],
                 n_results=top_k,
-                where=filters
+                where=filters,
+                include=["documents", "metadatas", "distances"]
             )
             
             documents = []
-            if results["documents"] and results["documents"][0]:
-                for i, doc in enumerate(results["documents"][0]):
+            if results["ids"] and results["ids"][0]:
+                # Only the winners are decompressed; chunks written before the
+                # chunk store existed still carry their text in Chroma
+                texts = self.chunk_store.get_many(results["ids"][0])
+                legacy_docs = results["documents"][0] if results["documents"] else None
+                for i, text in enumerate(texts):
+                    if text is None and legacy_docs:
+                        text = legacy_docs[i]
                     documents.append({
-                        "content": doc,
+                        "content": text or "",
                         "metadata": results["metadatas"][0][i] if results["metadatas"] else {},
                         "score": results["distances"][0][i] if results["distances"] else 0.0
                     })
             
+            if self.semantic_cache_enabled:
+                self.semantic_cache.store(query, query_embedding, generation, top_k, filters, documents)
+            
             processing_time = (time.time() - start_time) * 1000
             
             return {
                 "query": query,
                 "documents": documents,
                 "total_results": len(documents),
-                "processing_time_ms": processing_time
+                "processing_time_ms": processing_time,
+                "cache_hit": False
             }
         except Exception as e:
             logger.error("query_failed", error=str(e))
@@ -206,76 +270,156 @@ class RAGEngine:
         ]
         ids = [f"{file_path}_{i}" for i in range(len(chunks))]
         
-        # Add to collection
-        self.collection.add(
-            documents=texts,
-            metadatas=metadatas,
-            ids=ids
-        )
+        # Add to collection (existing ids of a re-ingested file are replaced)
+        await self.write_queue.submit(texts, metadatas, ids)
+        stale = await asyncio.to_thread(self._delete_stale_chunks, file_path, ids)
         
-        logger.info("file_ingested", file=file_path, chunks=len(chunks))
+        logger.info("file_ingested", file=file_path, chunks=len(chunks), stale_removed=stale)
         
         return {
             "success": True,
             "chunks_created": len(chunks)
         }
     
+    def _add_chunks(self, texts: List[str], metadatas: List[Dict[str, Any]], ids: List[str]):
+        """Embed chunks, keep their text in the chunk store and index vectors in Chroma"""
+        if not texts:
+            return
+        
+        embeddings = self.embedding_function(texts)
+        self.chunk_store.put_many(ids, texts)
+        # upsert: re-ingested ids get new vectors, matching the replaced text
+        self.collection.upsert(
+            embeddings=embeddings,
+            metadatas=metadatas,
+            ids=ids
+        )
+        self.generation += 1
+    
+    def _delete_stale_chunks(self, source: str, current_ids: List[str]) -> int:
+        """Drop chunks of an earlier ingest of source that the new one no longer has"""
+        existing = self.collection.get(where={"source": source}, include=[])["ids"]
+        stale = sorted(set(existing) - set(current_ids))
+        if stale:
+            self.collection.delete(ids=stale)
+            self.chunk_store.delete_many(stale)
+            self.generation += 1
+        return len(stale)
+    
     async def get_stats(self) -> Dict[str, Any]:
         """Get database statistics"""
         count = self.collection.count()
         return {
             "total_documents": count,
-            "collection_name": self.collection.name
+            "collection_name": self.collection.name,
+            "generation": self.generation,
+            "semantic_cache": self.get_cache_stats(),
+            "chunk_store": self.chunk_store.get_stats(),
+            "write_queue": self.write_queue.get_stats()
+        }
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Get semantic cache statistics"""
+        return {
+            "enabled": self.semantic_cache_enabled,
+            **self.semantic_cache.get_stats()
+        }
+    
+    def _prepare_document(self, content: str, metadata: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Split a document into chunks with metadata and unique IDs"""
+        if metadata is None:
+            metadata = {}
+        
+        # Split content into chunks
+        chunks = self.text_splitter.split_text(content)
+        
+        # Prepare for ChromaDB
+        metadatas = [
+            {
+                **metadata,
+                "chunk_index": i,
+                "total_chunks": len(chunks)
+            }
+            for i in range(len(chunks))
+        ]
+        
+        # Generate unique IDs
+        base_id = str(uuid.uuid4())
+        ids = [f"{base_id}_{i}" for i in range(len(chunks))]
+        
+        return {
+            "document_id": base_id,
+            "texts": chunks,
+            "metadatas": metadatas,
+            "ids": ids
         }
     
     async def add_document(self, content: str, metadata: Dict[str, Any] = None) -> Dict[str, Any]:
         """Add a single document directly to the vector database"""
         try:
-            if metadata is None:
-                metadata = {}
+            prepared = self._prepare_document(content, metadata)
             
-            # Split content into chunks
-            chunks = self.text_splitter.split_text(content)
+            # Add to collection via the shared writer
+            await self.write_queue.submit(prepared["texts"], prepared["metadatas"], prepared["ids"])
             
-            # Prepare for ChromaDB
-            texts = chunks
-            metadatas = [
-                {
-                    **metadata,
-                    "chunk_index": i,
-                    "total_chunks": len(chunks)
-                }
-                for i in range(len(chunks))
-            ]
-            
-            # Generate unique IDs
-            import uuid
-            base_id = str(uuid.uuid4())
-            ids = [f"{base_id}_{i}" for i in range(len(chunks))]
-            
-            # Add to collection
-            self.collection.add(
-                documents=texts,
-                metadatas=metadatas,
-                ids=ids
-            )
-            
-            logger.info("document_added", chunks=len(chunks), base_id=base_id)
+            logger.info("document_added", chunks=len(prepared["ids"]), base_id=prepared["document_id"])
             
             return {
                 "success": True,
-                "chunks_created": len(chunks),
-                "document_id": base_id
+                "chunks_created": len(prepared["ids"]),
+                "document_id": prepared["document_id"]
             }
         except Exception as e:
             logger.error("add_document_failed", error=str(e))
             raise
     
+    async def add_documents(self, documents: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Add several documents; all of them land in the same queued write"""
+        prepared = [
+            self._prepare_document(doc["content"], doc.get("metadata"))
+            for doc in documents
+        ]
+        
+        outcomes = await asyncio.gather(
+            *[self.write_queue.submit(p["texts"], p["metadatas"], p["ids"]) for p in prepared],
+            return_exceptions=True
+        )
+        
+        results = []
+        for p, outcome in zip(prepared, outcomes):
+            if isinstance(outcome, Exception):
+                results.append({"success": False, "error": str(outcome)})
+            else:
+                results.append({
+                    "success": True,
+                    "chunks_created": len(p["ids"]),
+                    "document_id": p["document_id"]
+                })
+        
+        logger.info("documents_added", documents=len(documents),
+                    chunks=sum(r.get("chunks_created", 0) for r in results))
+        
+        return {
+            "success": all(r["success"] for r in results),
+            "documents_added": sum(1 for r in results if r["success"]),
+            "chunks_created": sum(r.get("chunks_created", 0) for r in results),
+            "results": results
+        }
+    
+    async def shutdown(self):
+        """Flush pending writes and close the chunk store"""
+        await self.write_queue.stop()
+        self.chunk_store.close()
+    
     async def clear(self) -> Dict[str, Any]:
         """Clear all documents"""
         self.chroma_client.delete_collection(self.collection.name)
         self.collection = self.chroma_client.create_collection(
             name="rag_documents",
-            metadata={"description": "RAG document store"}
+            metadata={"description": "RAG document store"},
+            embedding_function=self.embedding_function
         )
+        self.generation += 1
+        self.semantic_cache.clear()
+        self.chunk_store.clear()
         return {"success": True, "message": "Database cleared"}
@@ -0,0 +1,147 @@
+"""
+Semantic Query Cache - reuse results for paraphrased queries
+"""
+import copy
+import json
+import time
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import structlog
+
+logger = structlog.get_logger()
+
+
+class SemanticQueryCache:
+    """
+    Small in-memory cache keyed on query embeddings.
+
+    Embeddings are kept L2-normalised in a fixed-size matrix, so a lookup is
+    one matrix-vector product. An entry is only reused when the collection
+    generation, top_k and filters match the request it was stored for.
+    """
+
+    def __init__(self, capacity: int = 256, threshold: float = 0.95, ttl: float = 600.0):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.ttl = ttl
+
+        self._matrix: Optional[np.ndarray] = None
+        self._entries: List[Optional[Dict[str, Any]]] = [None] * capacity
+        self._next_slot = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    @staticmethod
+    def _scope(top_k: int, filters: Optional[Dict[str, Any]]) -> str:
+        return f"{top_k}:{json.dumps(filters, sort_keys=True, default=str)}"
+
+    def lookup(
+        self,
+        embedding,
+        generation: int,
+        top_k: int,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Return cached documents for the nearest compatible query, if any"""
+        with self._lock:
+            if self._matrix is None:
+                self.misses += 1
+                return None
+
+            vector = self._normalize(embedding)
+            scope = self._scope(top_k, filters)
+            now = time.time()
+
+            similarities = self._matrix @ vector
+            for slot in np.argsort(-similarities):
+                similarity = float(similarities[slot])
+                if similarity < self.threshold:
+                    break
+
+                entry = self._entries[slot]
+                if entry is None or entry["scope"] != scope:
+                    continue
+                if entry["generation"] != generation or now - entry["created_at"] > self.ttl:
+                    # Collection changed since this entry was stored
+                    self.stale += 1
+                    continue
+
+                entry["hits"] += 1
+                self.hits += 1
+                # Copies: callers may annotate or trim what they get back
+                return {
+                    "documents": copy.deepcopy(entry["documents"]),
+                    "similarity": similarity,
+                    "cached_query": entry["query"]
+                }
+
+            self.misses += 1
+            return None
+
+    def store(
+        self,
+        query: str,
+        embedding,
+        generation: int,
+        top_k: int,
+        filters: Optional[Dict[str, Any]],
+        documents: List[Dict[str, Any]]
+    ):
+        """Store results in the next ring slot, evicting the oldest entry"""
+        with self._lock:
+            vector = self._normalize(embedding)
+            if self._matrix is None:
+                self._matrix = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+
+            slot = self._next_slot
+            if self._entries[slot] is not None:
+                self.evictions += 1
+
+            self._matrix[slot] = vector
+            self._entries[slot] = {
+                "query": query,
+                "scope": self._scope(top_k, filters),
+                "generation": generation,
+                "documents": copy.deepcopy(documents),
+                "created_at": time.time(),
+                "hits": 0
+            }
+            self._next_slot = (slot + 1) % self.capacity
+
+    def clear(self):
+        """Drop all cached entries and reset statistics"""
+        with self._lock:
+            self._matrix = None
+            self._entries = [None] * self.capacity
+            self._next_slot = 0
+            self.hits = 0
+            self.misses = 0
+            self.stale = 0
+            self.evictions = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Cache statistics"""
+        total = self.hits + self.misses
+        return {
+            "capacity": self.capacity,
+            "size": sum(1 for e in self._entries if e is not None),
+            "threshold": self.threshold,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_skipped": self.stale,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total * 100, 1) if total else 0.0
+        }
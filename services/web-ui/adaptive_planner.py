@@ -5,6 +5,8 @@ from typing import Dict, List, Any
 from datetime import datetime
 from collections import defaultdict
 
+from message_classifier import message_classifier
+
 class AdaptivePlanner:
     def __init__(self):
         self.execution_history = []
@@ -43,26 +45,7 @@ class AdaptivePlanner:
     
     def _extract_pattern(self, task: str) -> str:
         """Extract task pattern for learning"""
-        task_lower = task.lower()
-        if "health" in task_lower or "check" in task_lower:
-            return "health_check"
-        elif "add" in task_lower or "create" in task_lower:
-            if "redis" in task_lower or "cache" in task_lower:
-                return "add_service"
-            elif "service" in task_lower:
-                return "add_service"
-            return "create_resource"
-        elif "update" in task_lower or "modify" in task_lower:
-            if "production" in task_lower or "database" in task_lower or "schema" in task_lower:
-                return "modify_production"
-            return "modify_config"
-        elif "optimize" in task_lower or "improve" in task_lower:
-            return "optimization"
-        elif "analyze" in task_lower:
-            return "analysis"
-        elif "fix" in task_lower or "debug" in task_lower:
-            return "debugging"
-        return "generic"
+        return message_classifier.pattern(task)
     
     def _classify_step(self, step: str) -> str:
         """Classify step type"""
@@ -0,0 +1,162 @@
+"""
+App Logging - Leveled, structured logging through a non-blocking queue
+"""
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+
+class StructuredFormatter(logging.Formatter):
+    """One line per record: JSON, or "time level logger event key=value" text"""
+
+    def __init__(self, fmt: str = "text"):
+        super().__init__()
+        self.fmt = fmt
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields: Dict[str, Any] = getattr(record, "fields", {})
+        if self.fmt == "json":
+            entry = {
+                "ts": round(record.created, 3),
+                "level": record.levelname.lower(),
+                "logger": record.name,
+                "event": record.getMessage(),
+                **fields
+            }
+            if record.exc_info:
+                entry["exc"] = self.formatException(record.exc_info)
+            return json.dumps(entry, ensure_ascii=False, default=str)
+
+        stamp = time.strftime("%H:%M:%S", time.localtime(record.created))
+        pairs = " ".join(f"{key}={value!r}" for key, value in fields.items())
+        line = f"{stamp} {record.levelname:<7} {record.name}: {record.getMessage()} {pairs}".rstrip()
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a fraction of DEBUG/INFO records per logger; warnings always pass"""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        module = record.name.split(".")[1] if record.name.startswith("webui.") else record.name
+        rate = self.rates.get(module, 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread without blocking the caller.
+
+    Records are enqueued unformatted (formatting happens on the listener
+    thread), and are dropped and counted when the queue is full.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class StructLogger:
+    """logger.debug("event", key=value): fields are only formatted if the level is enabled"""
+
+    def __init__(self, logger: logging.Logger):
+        self._logger = logger
+
+    def is_enabled(self, level: int) -> bool:
+        return self._logger.isEnabledFor(level)
+
+    def _log(self, level: int, event: str, fields: Dict[str, Any], exc_info: bool = False):
+        if self._logger.isEnabledFor(level):
+            self._logger.log(level, event, extra={"fields": fields}, exc_info=exc_info)
+
+    def debug(self, event: str, **fields):
+        self._log(logging.DEBUG, event, fields)
+
+    def info(self, event: str, **fields):
+        self._log(logging.INFO, event, fields)
+
+    def warning(self, event: str, **fields):
+        self._log(logging.WARNING, event, fields)
+
+    def error(self, event: str, exc_info: bool = False, **fields):
+        self._log(logging.ERROR, event, fields, exc_info)
+
+
+_listener: Optional[QueueListener] = None
+_handler: Optional[DroppingQueueHandler] = None
+
+
+def _parse_rates(spec: str) -> Dict[str, float]:
+    """"execution_engine=0.1,main=0.5" -> {"execution_engine": 0.1, "main": 0.5}"""
+    rates = {}
+    for item in spec.split(","):
+        name, _, rate = item.partition("=")
+        if name.strip() and rate.strip():
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+def setup_logging():
+    """Route the "webui" loggers through the queue (idempotent)"""
+    global _listener, _handler
+    if _handler is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(StructuredFormatter(os.getenv("LOG_FORMAT", "text")))
+
+    _handler = DroppingQueueHandler(queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", "10000"))))
+    _handler.addFilter(SamplingFilter(_parse_rates(os.getenv("LOG_SAMPLING", ""))))
+
+    root = logging.getLogger("webui")
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    root.addHandler(_handler)
+    root.propagate = False
+
+    _listener = QueueListener(_handler.queue, stream)
+    _listener.start()
+
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(name: str) -> StructLogger:
+    """Structured logger for a web-ui module ("main", "execution_engine", ...)"""
+    setup_logging()
+    return StructLogger(logging.getLogger(f"webui.{name}"))
+
+
+def get_stats() -> Dict[str, Any]:
+    root = logging.getLogger("webui")
+    return {
+        "level": logging.getLevelName(root.level),
+        "queued": _handler.queue.qsize() if _handler else 0,
+        "dropped": _handler.dropped if _handler else 0
+    }
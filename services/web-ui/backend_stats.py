@@ -0,0 +1,78 @@
+"""
+Backend Stats - Sliding-window latency and error tracking per model backend
+"""
+from collections import deque
+from typing import Dict, Optional
+
+
+class BackendStats:
+    """
+    Recent behaviour of one model backend.
+
+    Keeps an EWMA of latency plus a window of (prompt size, latency) samples
+    and outcomes. Expected latency for a prompt comes from a least-squares
+    line over the window (generation time grows with prompt size), falling
+    back to the EWMA while the samples do not vary in size.
+    """
+
+    def __init__(self, alpha: float = 0.2, window: int = 50):
+        self.alpha = alpha
+        self.ewma_ms: Optional[float] = None
+        self._samples = deque(maxlen=window)   # (prompt_chars, latency_ms) of successes
+        self._outcomes = deque(maxlen=window)  # True for success
+
+    def record(self, prompt_chars: int, latency_ms: float, ok: bool):
+        self._outcomes.append(ok)
+        if not ok:
+            return
+        self._samples.append((prompt_chars, latency_ms))
+        if self.ewma_ms is None:
+            self.ewma_ms = latency_ms
+        else:
+            self.ewma_ms = self.alpha * latency_ms + (1 - self.alpha) * self.ewma_ms
+
+    @property
+    def samples(self) -> int:
+        return len(self._samples)
+
+    def error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return 1 - sum(self._outcomes) / len(self._outcomes)
+
+    def expected_ms(self, prompt_chars: int) -> Optional[float]:
+        """Predicted latency for a prompt of this size (None without samples)"""
+        if not self._samples:
+            return None
+        n = len(self._samples)
+        mean_x = sum(x for x, _ in self._samples) / n
+        mean_y = sum(y for _, y in self._samples) / n
+        var_x = sum((x - mean_x) ** 2 for x, _ in self._samples)
+        if var_x == 0:
+            return self.ewma_ms
+        slope = max(sum((x - mean_x) * (y - mean_y) for x, y in self._samples) / var_x, 0.0)
+        # Anchor the line halfway to the EWMA so a drift in base latency shows up quickly
+        level = 0.5 * mean_y + 0.5 * self.ewma_ms
+        return max(level + slope * (prompt_chars - mean_x), 0.0)
+
+    def cost_ms(self, prompt_chars: int) -> Optional[float]:
+        """Expected time to a successful answer, counting failed attempts"""
+        expected = self.expected_ms(prompt_chars)
+        if expected is None:
+            return None
+        return expected / max(1 - self.error_rate(), 0.05)
+
+    def p95_ms(self) -> Optional[float]:
+        if not self._samples:
+            return None
+        latencies = sorted(y for _, y in self._samples)
+        return latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)]
+
+    def get_stats(self) -> Dict:
+        p95 = self.p95_ms()
+        return {
+            "samples": self.samples,
+            "ewma_ms": round(self.ewma_ms, 1) if self.ewma_ms is not None else None,
+            "p95_ms": round(p95, 1) if p95 is not None else None,
+            "window_error_rate": round(self.error_rate() * 100, 1)
+        }
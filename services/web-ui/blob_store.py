@@ -0,0 +1,134 @@
+"""
+Blob Store - Content-addressed storage for large session payloads
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Set
+
+# Blob ids inside serialized message metadata ("execution_plan_ref": "<sha256>")
+REF_PATTERN = re.compile(r'"[a-z_]+_ref": "([0-9a-f]{64})"')
+
+
+def find_blob_refs(text: str) -> Iterable[str]:
+    """Blob ids referenced from a serialized session or message"""
+    return REF_PATTERN.findall(text)
+
+
+class BlobStore:
+    """
+    JSON payloads keyed by the sha256 of their canonical serialization.
+
+    Identical payloads (the same plan or health report stored by several
+    messages) are kept once. Blobs go to sqlite when a db_path is
+    configured, otherwise to an in-process dict.
+
+    Blobs are not reference-counted: sweep() is given the ids still
+    referenced by live sessions and drops the rest once they have not been
+    stored for a grace period (a message may not reference its blob yet).
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._memory: Dict[str, str] = {}
+        self._touched: Dict[str, float] = {}  # memory mode: blob id -> last put
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            self._open_db(db_path)
+
+        self.puts = 0
+        self.dedup_hits = 0
+        self.gets = 0
+        self.swept = 0
+
+    def _open_db(self, db_path: str):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            "blob_id TEXT PRIMARY KEY, payload TEXT NOT NULL, touched_at REAL NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(blobs)")}
+        if "touched_at" not in columns:
+            # Stores created before sweeping: existing blobs count as just stored
+            self._db.execute("ALTER TABLE blobs ADD COLUMN touched_at REAL NOT NULL DEFAULT 0")
+            self._db.execute("UPDATE blobs SET touched_at = ?", (time.time(),))
+        self._db.commit()
+
+    def put(self, value: Any) -> str:
+        """Store a JSON-serializable value and return its blob id"""
+        payload = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+        blob_id = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        now = time.time()
+        with self._lock:
+            self.puts += 1
+            if self._db is None:
+                if blob_id in self._memory:
+                    self.dedup_hits += 1
+                else:
+                    self._memory[blob_id] = payload
+                self._touched[blob_id] = now
+                return blob_id
+            cursor = self._db.execute("UPDATE blobs SET touched_at = ? WHERE blob_id = ?", (now, blob_id))
+            if cursor.rowcount:
+                self.dedup_hits += 1
+            else:
+                self._db.execute(
+                    "INSERT INTO blobs (blob_id, payload, touched_at) VALUES (?, ?, ?)", (blob_id, payload, now)
+                )
+            self._db.commit()
+        return blob_id
+
+    def get(self, blob_id: str) -> Optional[Any]:
+        with self._lock:
+            self.gets += 1
+            if self._db is None:
+                payload = self._memory.get(blob_id)
+            else:
+                row = self._db.execute("SELECT payload FROM blobs WHERE blob_id = ?", (blob_id,)).fetchone()
+                payload = row[0] if row else None
+        return json.loads(payload) if payload is not None else None
+
+    def sweep(self, live: Set[str], grace: float = 600.0) -> int:
+        """Drop blobs not in live and not stored within the last grace seconds"""
+        cutoff = time.time() - grace
+        with self._lock:
+            if self._db is None:
+                stale = [bid for bid, touched in self._touched.items() if touched < cutoff and bid not in live]
+                for blob_id in stale:
+                    del self._memory[blob_id]
+                    del self._touched[blob_id]
+            else:
+                rows = self._db.execute("SELECT blob_id FROM blobs WHERE touched_at < ?", (cutoff,)).fetchall()
+                stale = [row[0] for row in rows if row[0] not in live]
+                self._db.executemany("DELETE FROM blobs WHERE blob_id = ?", [(bid,) for bid in stale])
+                self._db.commit()
+            self.swept += len(stale)
+        return len(stale)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            if self._db is None:
+                count, size = len(self._memory), sum(len(p) for p in self._memory.values())
+            else:
+                count, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(payload)), 0) FROM blobs").fetchone()
+        return {
+            "blobs": count,
+            "bytes": size,
+            "puts": self.puts,
+            "dedup_hits": self.dedup_hits,
+            "gets": self.gets,
+            "swept": self.swept,
+            "persistent": self._db is not None
+        }
+
+
+# Global blob store for plans and task results referenced from session messages
+blob_store = BlobStore(os.getenv("CHAT_BLOB_DB") or None)
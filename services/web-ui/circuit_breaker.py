@@ -3,7 +3,7 @@ Circuit Breaker pattern for resilient service calls
 """
 import time
 from enum import Enum
-from typing import Dict, Callable, Any
+from typing import Any, Awaitable, Callable, Dict
 from collections import defaultdict
 
 class CircuitState(Enum):
@@ -29,8 +29,8 @@ class CircuitBreaker:
         self.success_counts: Dict[str, int] = defaultdict(int)
         self.last_failure_time: Dict[str, float] = {}
     
-    def call(self, service: str, func: Callable, *args, **kwargs) -> Any:
-        """Execute function with circuit breaker protection"""
+    def _before_call(self, service: str):
+        """Reject the call if the circuit is open"""
         state = self.states[service]
         
         # If circuit is OPEN, check if timeout passed
@@ -42,6 +42,10 @@ class CircuitBreaker:
             else:
                 # Still open, reject immediately
                 raise CircuitBreakerOpenError(f"Circuit breaker open for {service}")
+    
+    def call(self, service: str, func: Callable, *args, **kwargs) -> Any:
+        """Execute function with circuit breaker protection"""
+        self._before_call(service)
         
         # Try to execute
         try:
@@ -52,6 +56,18 @@ class CircuitBreaker:
             self._on_failure(service)
             raise e
     
+    async def call_async(self, service: str, func: Callable[..., Awaitable], *args, **kwargs) -> Any:
+        """Await a coroutine function with circuit breaker protection"""
+        self._before_call(service)
+        
+        try:
+            result = await func(*args, **kwargs)
+            self._on_success(service)
+            return result
+        except Exception as e:
+            self._on_failure(service)
+            raise e
+    
     def _on_success(self, service: str):
         """Handle successful call"""
         state = self.states[service]
@@ -6,8 +6,12 @@ import os
 import subprocess
 import tempfile
 from pathlib import Path
-from typing import Dict, List, Any
-import httpx
+from typing import Dict, List, Any, Optional
+
+from app_logging import get_logger
+from sandbox_pool import SandboxPool
+
+logger = get_logger("code_generator")
 
 class CodeGenerator:
     # Safe zones where code can be created
@@ -33,8 +37,9 @@ class CodeGenerator:
         'subprocess.call',
     ]
     
-    def __init__(self, ollama_url: str = "http://localhost:11434"):
+    def __init__(self, ollama_url: str = "http://localhost:11434", sandbox: Optional[SandboxPool] = None):
         self.ollama_url = ollama_url
+        self.sandbox = sandbox
     
     def is_safe_zone(self, path: str) -> bool:
         """Check if path is in a safe zone"""
@@ -52,10 +57,21 @@ class CodeGenerator:
                 return True
         return False
     
-    async def generate_code(self, prompt: str, language: str = "python", context: Dict = None) -> Dict[str, Any]:
-        """Generate code using Model Router for intelligent model selection"""
+    async def generate_code(
+        self,
+        prompt: str,
+        language: str = "python",
+        context: Dict = None,
+        options: Optional[Dict] = None
+    ) -> Dict[str, Any]:
+        """Generate code using Model Router for intelligent model selection
+
+        options (sampling) are passed through unchanged; the response is
+        persisted across restarts only when the caller asks for deterministic
+        output (context["deterministic"] or temperature 0).
+        """
         try:
-            print(f"DEBUG generate_code: Starting generation for prompt: {prompt[:100]}...")
+            logger.debug("generate_code_started", prompt=prompt[:100])
             
             # Используем Model Router для выбора модели
             from model_router import model_router
@@ -63,41 +79,41 @@ class CodeGenerator:
             # Упрощённый промпт для быстрой генерации
             simple_prompt = f"Write a simple {language} {prompt.split('.')[0]}. Keep it minimal and functional. Return only code, no explanations."
             
-            async with httpx.AsyncClient(timeout=180.0) as client:
-                result = await model_router.generate(
-                    prompt=simple_prompt,
-                    context=context or {},
-                    http_client=client
-                )
+            # Model Router uses the shared pooled clients (http_clients)
+            result = await model_router.generate(
+                prompt=simple_prompt,
+                context={"kind": "code", **(context or {})},
+                options=options
+            )
+            
+            if result.get("success"):
+                code = result.get("content", "")
+                logger.debug("generate_code_completed", model=result.get("model"), length=len(code))
+                
+                # Clean up code (remove markdown if present)
+                if "```" in code:
+                    parts = code.split("```")
+                    if len(parts) >= 2:
+                        code = parts[1]
+                        if code.startswith("python") or code.startswith("py"):
+                            code = "\n".join(code.split("\n")[1:])
                 
-                if result.get("success"):
-                    code = result.get("content", "")
-                    print(f"DEBUG generate_code: Got code from {result.get('model')}, length: {len(code)}")
-                    
-                    # Clean up code (remove markdown if present)
-                    if "```" in code:
-                        parts = code.split("```")
-                        if len(parts) >= 2:
-                            code = parts[1]
-                            if code.startswith("python") or code.startswith("py"):
-                                code = "\n".join(code.split("\n")[1:])
-                    
-                    return {
-                        "success": True,
-                        "code": code.strip(),
-                        "language": language,
-                        "model": result.get("model_name", "unknown")
-                    }
-                else:
-                    error_msg = result.get("error", "Unknown error")
-                    print(f"DEBUG generate_code: ERROR - {error_msg}")
-                    return {
-                        "success": False,
-                        "error": error_msg
-                    }
+                return {
+                    "success": True,
+                    "code": code.strip(),
+                    "language": language,
+                    "model": result.get("model_name", "unknown")
+                }
+            else:
+                error_msg = result.get("error", "Unknown error")
+                logger.warning("generate_code_failed", error=error_msg)
+                return {
+                    "success": False,
+                    "error": error_msg
+                }
         except Exception as e:
             error_msg = str(e)
-            print(f"DEBUG generate_code: EXCEPTION - {error_msg}")
+            logger.error("generate_code_exception", error=error_msg)
             return {
                 "success": False,
                 "error": error_msg
@@ -192,6 +208,10 @@ class CodeGenerator:
                 "error": f"Validation failed: {validation['issues']}"
             }
         
+        # Pre-started sandbox workers skip interpreter start-up
+        if self.sandbox is not None:
+            return self.sandbox.run(code)
+        
         try:
             # Create temporary file
             with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as f:
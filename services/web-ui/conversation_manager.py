@@ -1,10 +1,78 @@
 """
 Conversation Manager - Natural Language Interface
 """
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
+from collections import deque
 from datetime import datetime
+import os
+import sys
 import uuid
 
+from blob_store import blob_store, find_blob_refs
+from message_classifier import message_classifier
+from prompt_builder import prompt_builder
+from session_store import SessionStore
+
+
+def _task_digest(task_result: Dict) -> Dict:
+    """What follow-up questions read from a task result: id, summary, step statuses"""
+    return {
+        "task_id": task_result.get("task_id"),
+        "summary": task_result.get("summary", {}),
+        "result": [
+            {"step": step.get("step"), "status": step.get("status")}
+            for step in task_result.get("result", [])
+        ]
+    }
+
+
+def _compact_metadata(metadata: Dict) -> Dict:
+    """Move plans and task results to blob_store, keeping refs and a digest"""
+    metadata = dict(metadata)
+    if isinstance(metadata.get("intent"), str):
+        metadata["intent"] = sys.intern(metadata["intent"])
+    plan = metadata.pop("execution_plan", None)
+    if plan:
+        metadata["execution_plan_ref"] = blob_store.put(plan)
+    task_result = metadata.pop("task_result", None)
+    if task_result:
+        metadata["task_result_ref"] = blob_store.put(task_result)
+        metadata["task_digest"] = _task_digest(task_result)
+    return metadata
+
+
+class Message:
+    """One session message; large metadata payloads live in blob_store"""
+    
+    __slots__ = ("role", "content", "timestamp", "metadata")
+    
+    def __init__(self, role: str, content: str, timestamp: str, metadata: Dict):
+        self.role = sys.intern(role)
+        self.content = content
+        self.timestamp = timestamp
+        self.metadata = _compact_metadata(metadata)
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Message":
+        return cls(data["role"], data["content"], data["timestamp"], data.get("metadata", {}))
+    
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default) if key in self.__slots__ else default
+    
+    def is_execution(self) -> bool:
+        return self.role == "assistant" and bool(
+            self.metadata.get("execution_plan_ref") or self.metadata.get("task_result_ref")
+        )
+    
+    def to_dict(self) -> Dict:
+        return {"role": self.role, "content": self.content, "timestamp": self.timestamp, "metadata": self.metadata}
+
+
 class ConversationSession:
     def __init__(self, session_id: str):
         self.session_id = session_id
@@ -12,34 +80,121 @@ class ConversationSession:
         self.messages = []
         self.context = {}
         self.last_activity = datetime.now().isoformat()
+        # Ollama context tokens of the last generated turn (see ConversationManager.build_turn)
+        self.kv: Optional[Dict] = None
+        self.history_version = 0
+        # Rolling summary of the turns moved to cold storage (see ConversationSummarizer)
+        self.summary = ""
+        self.archived_count = 0
+        # Assistant messages that carry a plan or task result, newest last
+        self._executions = deque(maxlen=20)
     
-    def add_message(self, role: str, content: str, metadata: Dict = None):
-        message = {
-            "role": role,
-            "content": content,
-            "timestamp": datetime.now().isoformat(),
-            "metadata": metadata or {}
-        }
+    def add_message(self, role: str, content: str, metadata: Dict = None) -> Message:
+        message = Message(role, content, datetime.now().isoformat(), metadata or {})
         self.messages.append(message)
         self.last_activity = datetime.now().isoformat()
+        if message.is_execution():
+            self._executions.append(message)
+        return message
+    
+    def attach_task_result(self, message: Message, task_result: Dict):
+        """Record the result of a task queued from this message"""
+        message.metadata["task_executed"] = True
+        message.metadata["task_result_ref"] = blob_store.put(task_result)
+        message.metadata["task_digest"] = _task_digest(task_result)
+        if message not in self._executions:
+            self._executions.append(message)
+    
+    @classmethod
+    def from_state(cls, state: Dict) -> "ConversationSession":
+        """Rebuild a session saved by to_state (the Ollama context is not kept)"""
+        session = cls(state["session_id"])
+        session.created_at = state["created_at"]
+        session.last_activity = state["last_activity"]
+        session.context = state.get("context", {})
+        session.summary = state.get("summary", "")
+        session.archived_count = state.get("archived_count", 0)
+        session.history_version = state.get("history_version", 0)
+        for data in state.get("messages", []):
+            message = Message.from_dict(data)
+            session.messages.append(message)
+            if message.is_execution():
+                session._executions.append(message)
+        return session
+    
+    def to_state(self) -> Dict:
+        return {
+            "session_id": self.session_id,
+            "created_at": self.created_at,
+            "last_activity": self.last_activity,
+            "context": self.context,
+            "summary": self.summary,
+            "archived_count": self.archived_count,
+            "history_version": self.history_version,
+            "messages": [message.to_dict() for message in self.messages]
+        }
+    
+    def total_messages(self) -> int:
+        return self.archived_count + len(self.messages)
+    
+    def edit_message(self, index: int, content: str):
+        """Replace a message's content; the stored model context no longer matches"""
+        self.messages[index].content = content
+        self.invalidate_kv()
+    
+    def trim_history(self, max_messages: int):
+        """Keep only the last max_messages messages"""
+        if len(self.messages) > max_messages:
+            self.messages = self.messages[-max_messages:] if max_messages else []
+            self.invalidate_kv()
+    
+    def fold(self, count: int, summary: str):
+        """Replace the oldest count messages by a rolling summary"""
+        self.messages = self.messages[count:]
+        self.archived_count += count
+        self.summary = summary
+        self.invalidate_kv()
+    
+    def invalidate_kv(self):
+        self.history_version += 1
+        self.kv = None
+    
+    def remember_kv(self, model: str, context: Optional[List[int]]):
+        """Store the context of a turn whose question and answer were just added"""
+        self.kv = {
+            "model": model,
+            "context": context,
+            "message_count": len(self.messages),
+            "history_version": self.history_version
+        } if context else None
+    
+    def valid_kv(self, max_tokens: int) -> Optional[Dict]:
+        """Stored context, if it still covers exactly the current history"""
+        kv = self.kv
+        if (not kv or kv["history_version"] != self.history_version
+                or kv["message_count"] != len(self.messages)
+                or len(kv["context"]) > max_tokens):
+            return None
+        return kv
     
-    def get_context_window(self, max_messages: int = 10) -> List[Dict]:
+    def get_context_window(self, max_messages: int = 10) -> List[Message]:
         return self.messages[-max_messages:]
     
     def get_recent_executions(self, max_count: int = 5) -> List[Dict]:
         """Get recent task executions from session history"""
         executions = []
-        for msg in reversed(self.messages):
-            if msg.get('role') == 'assistant':
-                metadata = msg.get('metadata', {})
-                if metadata.get('task_executed') and metadata.get('task_result'):
-                    executions.append({
-                        'timestamp': msg.get('timestamp'),
-                        'task_result': metadata.get('task_result'),
-                        'content': msg.get('content')
-                    })
-                    if len(executions) >= max_count:
-                        break
+        # Queued tasks fill task_result in later, so the check happens here
+        for msg in reversed(self._executions):
+            metadata = msg.metadata
+            if metadata.get('task_executed') and metadata.get('task_digest'):
+                executions.append({
+                    'timestamp': msg.timestamp,
+                    'task_result': metadata['task_digest'],
+                    'task_result_ref': metadata.get('task_result_ref'),
+                    'content': msg.content
+                })
+                if len(executions) >= max_count:
+                    break
         return executions
     
     def to_dict(self) -> Dict:
@@ -47,136 +202,129 @@ class ConversationSession:
             "session_id": self.session_id,
             "created_at": self.created_at,
             "last_activity": self.last_activity,
-            "message_count": len(self.messages),
-            "context": self.context
+            "message_count": self.total_messages(),
+            "archived_count": self.archived_count,
+            "summary": self.summary,
+            "context": self.context,
+            "kv_tokens": len(self.kv["context"]) if self.kv else 0
         }
 
 class ConversationManager:
+    # Past this many context tokens the next turn is rebuilt from recent
+    # history instead, so Ollama does not silently truncate the prefix
+    KV_MAX_TOKENS = int(os.getenv("CHAT_KV_MAX_TOKENS", "3072"))
+    
     def __init__(self):
-        self.sessions: Dict[str, ConversationSession] = {}
-        self.intent_patterns = {
-            "query": ["what", "how", "why", "explain", "tell me"],
-            "execute": ["do", "run", "execute", "perform", "create"],
-            "analyze": ["analyze", "check", "inspect", "review"],
-            "modify": ["change", "update", "modify", "add", "remove"]
-        }
+        self.store = SessionStore(
+            ConversationSession.from_state,
+            max_sessions=int(os.getenv("CHAT_MAX_SESSIONS", "500")),
+            idle_ttl=float(os.getenv("CHAT_SESSION_IDLE_TTL", "1800")),
+            retention=float(os.getenv("CHAT_SESSION_RETENTION", str(7 * 86400))),
+            db_path=os.getenv("CHAT_SESSION_DB") or None
+        )
+        self.kv_turns = 0
+        self.full_turns = 0
+        self._prompt_eval_ms = {"kv": deque(maxlen=200), "full": deque(maxlen=200)}
     
     def create_session(self) -> str:
         session_id = str(uuid.uuid4())
-        self.sessions[session_id] = ConversationSession(session_id)
+        self.store.add(session_id, ConversationSession(session_id))
         return session_id
     
     def get_session(self, session_id: str) -> Optional[ConversationSession]:
-        return self.sessions.get(session_id)
+        """Resident session, or one loaded lazily from the store's sqlite tier"""
+        return self.store.get(session_id)
+    
+    def save_session(self, session: ConversationSession):
+        self.store.save(session)
+    
+    def sweep_blobs(self, archive=None) -> int:
+        """Drop blobs no retained session references (live or archived messages)"""
+        live_sessions, refs = set(), set()
+        for session_id, state in self.store.iter_states():
+            live_sessions.add(session_id)
+            refs.update(find_blob_refs(state))
+        if archive is not None:
+            for session_id, message in archive.iter_messages():
+                if session_id in live_sessions:
+                    refs.update(find_blob_refs(message))
+        return blob_store.sweep(refs)
     
     def detect_intent(self, message: str) -> str:
         """Advanced intent detection with context awareness"""
-        message_lower = message.lower()
-        
-        print(f"DEBUG detect_intent: message='{message_lower}'")
-        
-        # Priority 1: Code/Content Creation (NEW - highest priority for creative tasks)
-        creation_keywords = ["create", "generate", "write", "build", "make", 
-                           "создать", "создай", "сгенерировать", "написать", "напиши", "сделать", "сделай"]
-        creative_targets = ["code", "program", "script", "game", "app", "calculator", 
-                          "function", "class", "tic-tac-toe", "file", "project", "python",
-                          "код", "программ", "скрипт", "игр", "приложение", "калькулятор",
-                          "функци", "класс", "файл", "проект", "питон"]
-        safe_zones = ["playground/", "generated/", "experiments/", "tic-tac-toe/", 
-                     "demos/", "examples/"]
-        
-        has_creation = any(verb in message_lower for verb in creation_keywords)
-        has_creative_target = any(target in message_lower for target in creative_targets)
-        has_safe_zone = any(zone in message_lower for zone in safe_zones)
-        has_save_to_safe = "save" in message_lower and has_safe_zone
-        
-        print(f"DEBUG: has_creation={has_creation}, has_creative_target={has_creative_target}, has_safe_zone={has_safe_zone}")
-        
-        # If creating code/game OR saving to safe zone, it's creation
-        if (has_creation and (has_creative_target or has_safe_zone)) or has_save_to_safe:
-            print("DEBUG: Detected intent=CREATE")
-            return "create"
-        
-        # Priority 2: Action verbs (execute)
-        action_verbs = ["check", "test", "run", "execute", "perform", "start", "stop", 
-                       "restart", "deploy", "rollback", "apply", "fix", "debug", "play",
-                       "проверь", "тест", "запусти", "выполни", "исполни", "старт", "стоп",
-                       "перезапусти", "примени", "исправь", "отладь", "играть"]
-        if any(verb in message_lower for verb in action_verbs):
-            # But if it's "play" after creation, still treat as create
-            if "play" in message_lower and has_creation:
-                return "create"
-            return "execute"
-        
-        # Priority 3: Infrastructure Modification (dangerous)
-        modification_verbs = ["add", "setup", "configure", "install",
-                             "update", "modify", "change", "remove", "delete"]
-        if any(verb in message_lower for verb in modification_verbs):
-            return "modify"
-        
-        # Priority 3: Analysis
-        analysis_verbs = ["analyze", "inspect", "review", "investigate", "examine",
-                         "diagnose", "profile", "measure"]
-        if any(verb in message_lower for verb in analysis_verbs):
-            return "analyze"
-        
-        # Priority 4: Information queries
-        query_words = ["what", "how", "why", "when", "where", "who", "explain",
-                      "tell me", "show me", "list", "get", "find"]
-        if any(word in message_lower for word in query_words):
-            print("DEBUG: Detected intent=QUERY")
-            return "query"
-        
-        # Default: treat as query
-        print("DEBUG: Detected intent=QUERY (default)")
-        return "query"
+        return message_classifier.intent(message)
     
     def extract_entities(self, message: str) -> Dict:
         """Extract key entities from message"""
-        message_lower = message.lower()
-        entities = {
-            "services": [],
-            "actions": [],
-            "metrics": [],
-            "technologies": []
-        }
-        
-        # Services
-        services = ["rag", "ollama", "arch", "redis", "postgres", "mongodb", "nginx"]
-        entities["services"] = [s for s in services if s in message_lower]
-        
-        # Actions
-        actions = ["optimize", "scale", "monitor", "backup", "restore", "migrate"]
-        entities["actions"] = [a for a in actions if a in message_lower]
-        
-        # Metrics
-        metrics = ["latency", "throughput", "memory", "cpu", "disk", "network"]
-        entities["metrics"] = [m for m in metrics if m in message_lower]
-        
-        # Technologies
-        tech = ["docker", "kubernetes", "python", "fastapi", "flask"]
-        entities["technologies"] = [t for t in tech if t in message_lower]
-        
-        return entities
+        return message_classifier.entities(message)
+    
+    CHAT_TEMPLATE = """You are an autonomous AI system with 9 capabilities. Be concise and technical.
+
+{context}
+
+{history}User: {question}
+
+Assistant:"""
     
     def build_prompt(self, session: ConversationSession, user_message: str, 
                      rag_context: List[Dict] = None) -> str:
-        system_prompt = """You are an autonomous AI system with 9 capabilities. Be concise and technical."""
-        
-        context_section = ""
-        if rag_context:
-            context_section = "\n\nContext:\n"
-            for doc in rag_context[:2]:
-                context_section += f"{doc.get('content', '')[:200]}...\n"
-        
-        history_section = ""
-        recent = session.get_context_window(max_messages=3)
-        if recent:
-            history_section = "\n\nHistory:\n"
-            for msg in recent[-2:]:
-                history_section += f"{msg['role']}: {msg['content'][:100]}\n"
+        return prompt_builder.build(
+            "chat", self.CHAT_TEMPLATE,
+            documents=rag_context,
+            history=session.get_context_window(max_messages=10),
+            doc_format="Context: {content}",
+            history_header=self._history_header(session),
+            question=user_message
+        )["prompt"]
+
+    def _history_header(self, session: ConversationSession) -> str:
+        if session.summary:
+            return f"Summary of earlier conversation: {session.summary}\n\nHistory:\n"
+        return "History:\n"
+    
+    def build_turn(self, session: ConversationSession, template: str, documents: List[Dict] = None,
+                   doc_format: str = "[Context {n}]: {content}", max_history: int = 10, **fields) -> Dict:
+        """Prompt for the next generated turn of a session
         
-        return f"{system_prompt}{context_section}{history_section}\n\nUser: {user_message}\n\nAssistant:"
+        template is rendered by prompt_builder within the "autonomous"
+        budget. With a valid stored context {history} stays empty and
+        Ollama continues from the cached prefix; otherwise recent history
+        is packed as text. Returns {"prompt", "kv"} where kv goes to
+        model_router.generate_local.
+        """
+        kv = session.valid_kv(self.KV_MAX_TOKENS)
+        built = prompt_builder.build(
+            "autonomous", template,
+            documents=documents,
+            history=None if kv else session.get_context_window(max_messages=max_history),
+            doc_format=doc_format,
+            history_header=self._history_header(session),
+            **fields
+        )
+        return {"prompt": built["prompt"], "kv": kv}
+    
+    def record_turn(self, session: ConversationSession, turn: Dict, result: Dict, answered: bool):
+        """Account a generated turn; keep its context if the answer was saved as generated"""
+        mode = "kv" if turn["kv"] else "full"
+        if mode == "kv":
+            self.kv_turns += 1
+        else:
+            self.full_turns += 1
+        if result.get("prompt_eval_ms") is not None:
+            self._prompt_eval_ms[mode].append(result["prompt_eval_ms"])
+        if answered:
+            session.remember_kv(result.get("model_name"), result.get("context"))
+    
+    def get_kv_stats(self) -> Dict:
+        def avg(values):
+            return round(sum(values) / len(values), 1) if values else 0.0
+        return {
+            "kv_turns": self.kv_turns,
+            "full_turns": self.full_turns,
+            "avg_prompt_eval_ms_kv": avg(self._prompt_eval_ms["kv"]),
+            "avg_prompt_eval_ms_full": avg(self._prompt_eval_ms["full"]),
+            "max_tokens": self.KV_MAX_TOKENS
+        }
 
 # Global conversation manager
 conversation_manager = ConversationManager()
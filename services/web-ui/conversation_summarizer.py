@@ -0,0 +1,174 @@
+"""
+Conversation Summarizer - Rolling per-session summaries with cold storage
+for the folded messages
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from ollama_scheduler import OllamaOverloadedError
+from prompt_builder import prompt_builder
+
+
+class ConversationArchive:
+    """Append-only sqlite store for messages folded out of live sessions"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._memory: Dict[str, List[Dict]] = {}  # used when no db_path is configured
+        if db_path:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS archived_messages ("
+                "session_id TEXT NOT NULL, seq INTEGER NOT NULL, message TEXT NOT NULL, "
+                "PRIMARY KEY (session_id, seq))"
+            )
+            self._db.commit()
+
+    def append(self, session_id: str, first_seq: int, messages: List[Dict]):
+        with self._lock:
+            if self._db is None:
+                self._memory.setdefault(session_id, []).extend(messages)
+                return
+            self._db.executemany(
+                "INSERT OR REPLACE INTO archived_messages (session_id, seq, message) VALUES (?, ?, ?)",
+                [
+                    (session_id, first_seq + i, json.dumps(msg, ensure_ascii=False, default=str))
+                    for i, msg in enumerate(messages)
+                ]
+            )
+            self._db.commit()
+
+    def load(self, session_id: str) -> List[Dict]:
+        with self._lock:
+            if self._db is None:
+                return list(self._memory.get(session_id, []))
+            rows = self._db.execute(
+                "SELECT message FROM archived_messages WHERE session_id = ? ORDER BY seq", (session_id,)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def iter_messages(self) -> Iterator[Tuple[str, str]]:
+        """(session_id, serialized message) for every archived message"""
+        with self._lock:
+            if self._db is None:
+                rows = [(sid, json.dumps(msg, ensure_ascii=False, default=str))
+                        for sid, messages in self._memory.items() for msg in messages]
+            else:
+                rows = self._db.execute("SELECT session_id, message FROM archived_messages").fetchall()
+        yield from rows
+
+
+SUMMARY_PROMPT = """Update the running summary of a conversation between a user and an autonomous AI system.
+Keep facts, decisions, created files and task results; drop greetings and repetition.
+Answer with the summary only, at most 120 words, in the language of the conversation.
+
+Current summary:
+{summary}
+
+New messages:
+{history}
+Updated summary:"""
+
+
+class ConversationSummarizer:
+    """
+    Background folding of old turns into a rolling summary.
+
+    Once a session holds more than trigger messages, everything except the
+    last window messages is summarized together with the previous summary
+    (a "background" generation, shed first under load), appended to the
+    archive and dropped from the live session. Prompts then carry the
+    summary plus a constant-size window, however long the chat gets.
+    """
+
+    SUMMARY_MAX_TOKENS = 200
+
+    def __init__(self, archive: ConversationArchive, window: int = 12, trigger: int = 24, interval: float = 30.0):
+        self.archive = archive
+        self.window = window
+        self.trigger = trigger
+        self.interval = interval
+
+        self.runs = 0
+        self.folded_messages = 0
+        self.shed = 0
+        self.failures = 0
+
+    async def summarize_session(self, session, model_router) -> bool:
+        """Fold one session's old turns; False if it was skipped or failed"""
+        count = len(session.messages) - self.window
+        if count <= 0:
+            return False
+        old = session.messages[:count]
+        version = session.history_version
+
+        history = "".join(f"{msg['role']}: {msg['content']}\n" for msg in old)
+        prompt = SUMMARY_PROMPT.format(
+            summary=session.summary or "(none)",
+            history=prompt_builder.counter.truncate(history, 1536)
+        )
+        try:
+            result = await model_router.generate_local(prompt, priority="background", kind="chat")
+        except OllamaOverloadedError:
+            self.shed += 1
+            return False
+        if not result.get("success") or not result.get("content", "").strip():
+            self.failures += 1
+            return False
+
+        # The history may have been edited or trimmed while the model was busy
+        if session.history_version != version or session.messages[:count] != old:
+            return False
+
+        summary = prompt_builder.counter.truncate(result["content"].strip(), self.SUMMARY_MAX_TOKENS)
+        await asyncio.to_thread(
+            self.archive.append, session.session_id, session.archived_count, [msg.to_dict() for msg in old]
+        )
+        session.fold(count, summary)
+        self.runs += 1
+        self.folded_messages += count
+        return True
+
+    async def continuous_summarize_loop(self, conversation_manager):
+        """Periodically fold every session that crossed the trigger"""
+        from model_router import model_router
+
+        print("📝 Starting conversation summarizer loop...")
+        while True:
+            try:
+                for session in conversation_manager.store.resident():
+                    if len(session.messages) > self.trigger and await self.summarize_session(session, model_router):
+                        await asyncio.to_thread(conversation_manager.save_session, session)
+            except Exception as e:
+                self.failures += 1
+                print(f"✗ Conversation summarizer error: {e}")
+            await asyncio.sleep(self.interval)
+
+    def get_stats(self) -> Dict:
+        return {
+            "window": self.window,
+            "trigger": self.trigger,
+            "runs": self.runs,
+            "folded_messages": self.folded_messages,
+            "shed": self.shed,
+            "failures": self.failures,
+            "archive": self.archive.db_path or "memory"
+        }
+
+
+# Global summarizer (loop started in main.py lifespan)
+conversation_summarizer = ConversationSummarizer(
+    ConversationArchive(os.getenv("CHAT_ARCHIVE_DB") or None),
+    window=int(os.getenv("CHAT_SUMMARY_WINDOW", "12")),
+    trigger=int(os.getenv("CHAT_SUMMARY_TRIGGER", "24")),
+    interval=float(os.getenv("CHAT_SUMMARY_INTERVAL", "30"))
+)
@@ -4,6 +4,8 @@ Decision Engine - Context-aware autonomous decision making
 from typing import Dict, List, Any, Optional
 from datetime import datetime
 
+from message_classifier import KEYWORD_TABLES, message_classifier
+
 class Decision:
     def __init__(self, decision_type: str, action: str, confidence: float, reasoning: List[str]):
         self.decision_type = decision_type
@@ -37,7 +39,7 @@ class DecisionEngine:
                 "high_confidence_threshold": 0.9,
                 "medium_confidence_threshold": 0.7,
                 "low_risk_patterns": ["health_check", "analysis", "metrics"],
-                "high_risk_patterns": ["delete", "drop", "remove", "modify_production"]
+                "high_risk_patterns": KEYWORD_TABLES["high_risk"]
             },
             "safety": {
                 "require_backup": ["add_service", "modify_config", "modify_production", "create_resource"],
@@ -64,26 +66,16 @@ class DecisionEngine:
         
         # Decision 1: Should we auto-execute?
         if intent in ["execute", "modify", "create"]:  # Added "create"
-            # Check risk level
-            is_high_risk = any(risk in message.lower() for risk in self.decision_rules["auto_execute"]["high_risk_patterns"])
+            # Check risk level (one cached keyword scan of the message)
+            risk = message_classifier.risk(message)
+            is_high_risk = risk["high_risk"]
             is_low_risk = pattern in self.decision_rules["auto_execute"]["low_risk_patterns"]
             
             # NEW: Create operations in safe zones are low risk
             if intent == "create":
-                safe_zones = ["playground/", "generated/", "experiments/", "tic-tac-toe/", "demos/", "examples/"]
-                is_in_safe_zone = any(zone in message.lower() for zone in safe_zones)
-                
-                # If creating code/script without specifying dangerous location, assume safe
-                code_creation_keywords = ["script", "code", "program", "game", "app", "function",
-                                         "скрипт", "код", "программ", "игр", "приложение", "функци"]
-                is_code_creation = any(keyword in message.lower() for keyword in code_creation_keywords)
-                
-                # Check if it's NOT modifying production/system files
-                dangerous_targets = ["production", "system", "config", "/etc/", "/var/", "docker-compose",
-                                    "продакшн", "система", "конфиг"]
-                is_dangerous = any(target in message.lower() for target in dangerous_targets)
-                
-                if is_in_safe_zone or (is_code_creation and not is_dangerous):
+                # If creating code/script without specifying a dangerous
+                # (production/system/config) location, assume safe
+                if risk["safe_zone"] or (risk["code_creation"] and not risk["dangerous_target"]):
                     confidence = 0.95
                     reasoning.append("Code creation without dangerous targets - auto-approved")
                     action = "auto_execute"
@@ -1,26 +1,139 @@
 """
 Real Execution Engine - Execute tasks with real service integration
 """
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Callable, FrozenSet, Optional, Set, Tuple
+import asyncio
+import os
+import random
+import re
+import time
 import httpx
 from datetime import datetime
 
+import code_generator as code_generator_module
+from app_logging import get_logger
+from decision_engine import decision_engine
+from http_clients import UPSTREAMS
+from ollama_scheduler import ollama_scheduler
+from metrics import metrics_store
+from step_registry import StepMemo, StepRegistry
+from task_executor import STEP_TEMPLATES, Task
+
+logger = get_logger("execution_engine")
+
+# Target file paths mentioned in prompts ("... save to playground/x.py")
+TARGET_PATH_PATTERN = re.compile(r'(?:save|write|create).*?(?:to|in|at)\s+([^\s&]+\.py)')
+LEGACY_TARGET_PATH_PATTERN = re.compile(r'(?:save|write|create).*?(?:to|in|at)\s+([^\s]+\.py)')
+
 class ExecutionEngine:
     # Anti-loop protection constants
     MAX_STEPS_PER_TASK = 50  # Prevent infinite step execution
     MAX_RETRY_ATTEMPTS = 3   # Prevent infinite retries
-    STEP_TIMEOUT = 30.0      # Maximum time per step (seconds)
+    STEP_TIMEOUT = 30.0      # Default maximum time per step attempt (seconds)
+    # LLM steps wait for a codegen slot in ollama_scheduler, then for the whole completion
+    LLM_STEP_TIMEOUT = ollama_scheduler.deadlines["codegen"] + UPSTREAMS["ollama"]["timeout"].read + 10.0
+    # Maximum wall time for all steps of a task: ends before the TaskExecutor worker timeout
+    TASK_TIME_BUDGET = Task.MAX_EXECUTION_TIME - Task.FINALIZE_MARGIN
+    RETRY_BASE_DELAY = 0.5   # First retry backoff (seconds), doubled per attempt
+    RETRY_MAX_DELAY = 8.0    # Backoff ceiling (seconds)
     
     def __init__(self, http_client: httpx.AsyncClient, services: Dict[str, str]):
         self.http_client = http_client
         self.services = services
         self.execution_history = []
         self.current_step_count = 0  # Track steps to prevent loops
+        self.max_parallel_steps = int(os.getenv("MAX_PARALLEL_STEPS", "4"))
+        self.registry = StepRegistry()
+        self.step_memo = StepMemo(int(os.getenv("STEP_MEMO_MAX_ENTRIES", "512")))
+        self.memo_enabled = os.getenv("STEP_MEMO_ENABLED", "true").lower() == "true"
+        self._register_handlers()
+    
+    def _register_handlers(self):
+        """Build the step handler table (order matters, see StepRegistry)"""
+        r = self.registry
+        
+        # === FILE AND FOLDER CREATION ===
+        r.register("create_folder", self._create_folder, ["create", ("folder", "directory")],
+                   reads=["path"], writes=["workspace"], terminal=False)
+        r.register("create_file", self._create_file, ["create", "file"],
+                   reads=["path", "code", "validated"], writes=["workspace"], terminal=False)
+        
+        # === CODE GENERATION ===
+        r.register("analyze_requirements", self._analyze_requirements, ["analyze", "requirements"])
+        r.register("design_code", self._design_code, ["design", ("code", "structure")])
+        # A timed-out generation would only queue again behind the same backlog
+        r.register("generate_code", self._generate_code, ["generate", ("code", "ai")],
+                   writes=["generated_code", "target_path"], timeout=self.LLM_STEP_TIMEOUT, retry=False)
+        # Also catches "validate safety" steps, so it orders behind config generation
+        r.register("validate_code", self._validate_code, ["validate", ("code", "safety")],
+                   reads=["generated_code", "change_id"], writes=["validated"])
+        r.register("create_file_safe", self._create_file_safe, ["create", "file", "safe"],
+                   reads=["generated_code", "target_path", "validated"], writes=["workspace"], terminal=False)
+        r.register("verify_file", self._verify_file, ["verify", "file"],
+                   reads=["target_path", "workspace"])
+        
+        # === LEGACY CODE GENERATION (fallback) ===
+        r.register("generate_program", self._generate_program, ["generate", ("program", "script", "game")],
+                   writes=["workspace"], terminal=False, timeout=self.LLM_STEP_TIMEOUT, retry=False)
+        r.register("save_code", self._save_code, ["save", ("code", "file")],
+                   reads=["code", "path", "validated"], writes=["workspace"], terminal=False)
+        r.register("execute_code", self._execute_code,
+                   [("execute", "run", "test"), ("code", "program", "script")],
+                   reads=["code", "path", "workspace"], terminal=False)
+        
+        # === SERVICE OPERATIONS ===
+        # Read-only steps are memoized briefly (memo_ttl) across tasks and branches
+        r.register("health_check", self._health_check, ["health"], reads=["system_state"], memo_ttl=5.0)
+        r.register("metrics", self._metrics, [("metrics", "measure")], memo_ttl=2.0)
+        r.register("analysis", self._analysis, ["analyze"], memo_ttl=5.0)
+        # Configuration generation (must be before generic generate)
+        # Not retried: every propose call creates a new change, every apply call applies it again
+        r.register("generate_config", self._generate_config, ["generate", "config"], none_of=["code"],
+                   writes=["change_id"], retry=False)
+        r.register("validate_safety", self._validate_safety, ["validate", "safety"],
+                   reads=["change_id"], writes=["validated"])
+        r.register("apply", self._apply, ["apply"],
+                   reads=["change_id", "validated"], writes=["rollback_id", "system_state"], retry=False)
+        r.register("backup", self._backup, ["backup"], writes=["system_state"])
+        r.register("verify", self._verify, ["verify"], reads=["system_state"])
+        r.register("optimize", self._optimize, [("optimize", "improve")], memo_ttl=5.0)
+        r.register("rag_search", self._rag_search, [("search", "find")],
+                   memo_ttl=30.0, memo_context=["original_message"])
+        r.register("generic", self._generic)
+        
+        # Known plan steps dispatch without scanning matchers
+        known_steps = [step for steps in STEP_TEMPLATES.values() for step in steps]
+        known_steps += ["Create backup point", "Validate changes", "Check system health"]
+        r.warm(known_steps)
+    
+    def get_step_io(self, step: str) -> Tuple[FrozenSet[str], FrozenSet[str]]:
+        """Context keys a step reads and writes, taken from its candidate handlers
+        
+        "workspace", "system_state" and "validated" are pseudo-keys for files
+        on disk, applied infrastructure changes and validation outcomes, so
+        side effects stay ordered behind the checks that precede them.
+        """
+        resolution = self.registry.resolve(step.lower())
+        return resolution.reads, resolution.writes
+    
+    def build_step_dag(self, steps: List[str]) -> List[Set[int]]:
+        """For each step, the indices of earlier steps it must wait for"""
+        io = [self.get_step_io(step) for step in steps]
+        dependencies = []
+        for j, (reads_j, writes_j) in enumerate(io):
+            deps = set()
+            for i in range(j):
+                reads_i, writes_i = io[i]
+                # read-after-write, write-after-read, write-after-write
+                if (reads_j & writes_i) or (writes_j & reads_i) or (writes_j & writes_i):
+                    deps.add(i)
+            dependencies.append(deps)
+        return dependencies
     
     async def execute_step(self, step: str, context: Dict = None) -> Dict[str, Any]:
         """Execute a single step with real service calls"""
         step_lower = step.lower()
-        print(f"DEBUG execute_step: '{step}' -> '{step_lower}'")
+        logger.debug("execute_step", step=step)
         result = {
             "step": step,
             "status": "pending",
@@ -29,354 +142,475 @@ class ExecutionEngine:
             "timestamp": datetime.now().isoformat()
         }
         
+        handler = None
+        started = time.perf_counter()
         try:
-            # === FILE AND FOLDER CREATION ===
-            # Create folder
-            if "create" in step_lower and ("folder" in step_lower or "directory" in step_lower):
-                from code_generator import code_generator
-                if code_generator and context and "path" in context:
-                    folder_result = code_generator.create_folder(context["path"])
-                    result["data"] = folder_result
-                    result["status"] = "success" if folder_result["success"] else "failed"
-                    return result
-            
-            # Create file with content
-            if "create" in step_lower and "file" in step_lower:
-                from code_generator import code_generator
-                if code_generator and context:
-                    if "path" in context and "code" in context:
-                        file_result = code_generator.create_file(context["path"], context["code"])
-                        result["data"] = file_result
-                        result["status"] = "success" if file_result["success"] else "failed"
+            for handler in self.registry.resolve(step_lower).candidates:
+                if handler.idempotent and self.memo_enabled:
+                    memo_key = StepMemo.key(handler, step_lower, context)
+                    cached = self.step_memo.get(handler, memo_key)
+                    if cached is not None:
+                        result.update(data=cached["data"], status=cached["status"], cached=True)
+                        self.execution_history.append(result)
                         return result
+                    if await handler.func(step, step_lower, context, result):
+                        if result["status"] == "success":
+                            self.step_memo.put(handler, memo_key, result)
+                        break
+                elif await handler.func(step, step_lower, context, result):
+                    break
+        except Exception as e:
+            result["status"] = "failed"
+            # httpx timeouts stringify to "", keep the type so retries can classify it
+            result["error"] = str(e) or type(e).__name__
+        
+        if handler is not None:
+            self.registry.record(handler, (time.perf_counter() - started) * 1000, result["status"] == "failed")
+            if handler.writes and result["status"] != "failed":
+                # e.g. applied changes make memoized health results stale
+                self.step_memo.invalidate(handler.writes)
+        
+        # Record in history
+        self.execution_history.append(result)
+        return result
+    
+    # === Step handlers ===
+    # Each handler fills in `result` and returns True, or returns False to
+    # let the next matching handler try the step.
+    
+    async def _create_folder(self, step: str, step_lower: str, context: Dict, result: Dict) -> bool:
+        code_generator = code_generator_module.code_generator
+        if code_generator and context and "path" in context:
+            folder_result = code_generator.create_folder(context["path"])
+            result["data"] = folder_result
+            result["status"] = "success" if folder_result["success"] else "failed"
+            return True
+        return False
+    
+    async def _create_file(self, step: str, step_lower: str, context: Dict, result: Dict) -> bool:
+        code_generator = code_generator_module.code_generator
+        if code_generator and context and "path" in context and "code" in context:
+            file_result = code_generator.create_file(context["path"], context["code"])
+            result["data"] = file_result
+            result["status"] = "success" if file_result["success"] else "failed"
+            return True
+        return False
+    
+    async def _analyze_requirements(self, step: str, step_lower: str, context: Dict, result: Dict) -> bool:
+        result["data"] = {"message": "Requirements analyzed from prompt"}
+        result["status"] = "completed"
+        return True
+    
+    async def _design_code(self, step: str, step_lower: str, context: Dict, result: Dict) -> bool:
+        result["data"] = {"message": "Code structure designed"}
+        result["status"] = "completed"
+        return True
+    
+    async def _generate_code(self, step: str, step_lower: str, context: Dict, result: Dict) -> bool:
+        code_generator = code_generator_module.code_generator
+        if not code_generator:
+            logger.warning("code_generator_missing", step=step)
+            result["status"] = "failed"
+            result["error"] = "Code generator not initialized"
+            return True
+        
+        prompt = context.get("original_message", step) if context else step
+        
+        # Extract file path from prompt if present
+        path_match = TARGET_PATH_PATTERN.search(prompt.lower())
+        target_path = path_match.group(1) if path_match else None
+        logger.debug("generate_code_step", step=step, prompt=prompt, target_path=target_path)
+        
+        # Generate code
+        gen_result = await code_generator.generate_code(prompt)
+        logger.debug("generate_code_step_result", success=gen_result.get("success", False))
+        
+        if gen_result["success"]:
+            # Store code in context for next steps
+            if context:
+                context["generated_code"] = gen_result["code"]
+                context["target_path"] = target_path
             
-            # === CODE GENERATION ===
-            # Step 1: Analyze requirements
-            if "analyze" in step_lower and "requirements" in step_lower:
-                result["data"] = {"message": "Requirements analyzed from prompt"}
-                result["status"] = "completed"
-                return result
-            
-            # Step 2: Design code structure
-            if "design" in step_lower and ("code" in step_lower or "structure" in step_lower):
-                result["data"] = {"message": "Code structure designed"}
-                result["status"] = "completed"
-                return result
-            
-            # Step 3: Generate code using AI
-            if "generate" in step_lower and ("code" in step_lower or "ai" in step_lower):
-                print(f"DEBUG: Generating code for step: {step}")
-                from code_generator import code_generator
-                if code_generator:
-                    print("DEBUG: Code generator found")
-                    prompt = context.get("original_message", step) if context else step
-                    print(f"DEBUG: Prompt: {prompt}")
-                    
-                    # Extract file path from prompt if present
-                    import re
-                    path_match = re.search(r'(?:save|write|create).*?(?:to|in|at)\s+([^\s&]+\.py)', prompt.lower())
-                    target_path = path_match.group(1) if path_match else None
-                    print(f"DEBUG: Target path: {target_path}")
-                    
-                    # Generate code
-                    gen_result = await code_generator.generate_code(prompt)
-                    print(f"DEBUG: Generation result: {gen_result.get('success', False)}")
-                    
-                    if gen_result["success"]:
-                        # Store code in context for next steps
-                        if context:
-                            context["generated_code"] = gen_result["code"]
-                            context["target_path"] = target_path
-                        
-                        result["data"] = {
-                            "success": True,
-                            "code_length": len(gen_result["code"]),
-                            "lines": len(gen_result["code"].split('\n')),
-                            "target_path": target_path
-                        }
-                        result["status"] = "success"
+            result["data"] = {
+                "success": True,
+                "code_length": len(gen_result["code"]),
+                "lines": len(gen_result["code"].split('\n')),
+                "target_path": target_path
+            }
+            result["status"] = "success"
+        else:
+            result["data"] = gen_result
+            result["status"] = "failed"
+        return True
+    
+    async def _validate_code(self, step: str, step_lower: str, context: Dict, result: Dict) -> bool:
+        code_generator = code_generator_module.code_generator
+        if code_generator and context and "generated_code" in context:
+            validation = code_generator.validate_code(context["generated_code"], "python")
+            result["data"] = validation
+            result["status"] = "success" if validation["valid"] else "failed"
+        else:
+            result["data"] = {"valid": True, "message": "No code to validate"}
+            result["status"] = "completed"
+        return True
+    
+    async def _create_file_safe(self, step: str, step_lower: str, context: Dict, result: Dict) -> bool:
+        code_generator = code_generator_module.code_generator
+        if code_generator and context and "generated_code" in context and "target_path" in context:
+            file_result = code_generator.create_file(context["target_path"], context["generated_code"])
+            result["data"] = file_result
+            result["status"] = "success" if file_result["success"] else "failed"
+            return True
+        return False
+    
+    async def _verify_file(self, step: str, step_lower: str, context: Dict, result: Dict) -> bool:
+        if context and "target_path" in context:
+            exists = os.path.exists(context["target_path"])
+            result["data"] = {
+                "file_exists": exists,
+                "path": context["target_path"]
+            }
+            result["status"] = "success" if exists else "failed"
+        else:
+            result["data"] = {"message": "No file to verify"}
+            result["status"] = "completed"
+        return True
+    
+    async def _generate_program(self, step: str, step_lower: str, context: Dict, result: Dict) -> bool:
+        # Full workflow: generate + save
+        code_generator = code_generator_module.code_generator
+        if not code_generator:
+            return False
+        
+        prompt = context.get("original_message", step) if context else step
+        
+        # Extract file path from prompt if present
+        path_match = LEGACY_TARGET_PATH_PATTERN.search(prompt.lower())
+        target_path = path_match.group(1) if path_match else None
+        
+        # Generate code
+        gen_result = await code_generator.generate_code(prompt)
+        
+        if gen_result["success"] and target_path:
+            # Auto-save if path specified
+            code = gen_result["code"]
+            file_result = code_generator.create_file(target_path, code)
+            gen_result["file_created"] = target_path if file_result["success"] else None
+            gen_result["file_result"] = file_result
+        
+        result["data"] = gen_result
+        result["status"] = "success" if gen_result["success"] else "failed"
+        return True
+    
+    async def _save_code(self, step: str, step_lower: str, context: Dict, result: Dict) -> bool:
+        code_generator = code_generator_module.code_generator
+        if code_generator and context and "code" in context and "path" in context:
+            file_result = code_generator.create_file(context["path"], context["code"])
+            result["data"] = file_result
+            result["status"] = "success" if file_result["success"] else "failed"
+            return True
+        return False
+    
+    async def _execute_code(self, step: str, step_lower: str, context: Dict, result: Dict) -> bool:
+        code_generator = code_generator_module.code_generator
+        if not (code_generator and context):
+            return False
+        
+        # Try to get code from context or from file
+        code = context.get("code")
+        if not code and "path" in context and os.path.exists(context["path"]):
+            with open(context["path"], 'r') as f:
+                code = f.read()
+        
+        if not code:
+            return False
+        
+        # Runs up to the sandbox timeout; keep it off the event loop
+        exec_result = await asyncio.to_thread(code_generator.execute_code, code)
+        result["data"] = exec_result
+        result["status"] = "success" if exec_result["success"] else "failed"
+        return True
+    
+    async def _health_check(self, step: str, step_lower: str, context: Dict, result: Dict) -> bool:
+        if "rag" in step_lower:
+            resp = await self.http_client.get(f"{self.services['rag']}/health", timeout=5.0)
+            result["data"] = resp.json()
+        elif "arch" in step_lower:
+            resp = await self.http_client.get(f"{self.services['arch']}/health", timeout=5.0)
+            result["data"] = resp.json()
+        elif "ollama" in step_lower:
+            resp = await self.http_client.get(f"{self.services['ollama']}/api/tags", timeout=5.0)
+            result["data"] = {"status": "healthy", "models": len(resp.json().get("models", []))}
+        else:
+            # Aggregate health
+            health_data = {}
+            for service_name, service_url in self.services.items():
+                try:
+                    if service_name == "ollama":
+                        resp = await self.http_client.get(f"{service_url}/api/tags", timeout=3.0)
+                        health_data[service_name] = "healthy"
                     else:
-                        result["data"] = gen_result
-                        result["status"] = "failed"
-                    return result
-                else:
-                    print("DEBUG: Code generator NOT found!")
-                    result["status"] = "failed"
-                    result["error"] = "Code generator not initialized"
-                    return result
-            
-            # Step 4: Validate code safety
-            if "validate" in step_lower and ("code" in step_lower or "safety" in step_lower):
-                from code_generator import code_generator
-                if code_generator and context and "generated_code" in context:
-                    validation = code_generator.validate_code(context["generated_code"], "python")
-                    result["data"] = validation
-                    result["status"] = "success" if validation["valid"] else "failed"
-                else:
-                    result["data"] = {"valid": True, "message": "No code to validate"}
-                    result["status"] = "completed"
-                return result
-            
-            # Step 5: Create file in safe zone
-            if "create" in step_lower and "file" in step_lower and "safe" in step_lower:
-                from code_generator import code_generator
-                if code_generator and context and "generated_code" in context and "target_path" in context:
-                    file_result = code_generator.create_file(context["target_path"], context["generated_code"])
-                    result["data"] = file_result
-                    result["status"] = "success" if file_result["success"] else "failed"
-                    return result
-            
-            # Step 6: Verify file creation
-            if "verify" in step_lower and "file" in step_lower:
-                import os
-                if context and "target_path" in context:
-                    exists = os.path.exists(context["target_path"])
-                    result["data"] = {
-                        "file_exists": exists,
-                        "path": context["target_path"]
-                    }
-                    result["status"] = "success" if exists else "failed"
-                else:
-                    result["data"] = {"message": "No file to verify"}
-                    result["status"] = "completed"
-                return result
-            
-            # === LEGACY CODE GENERATION (fallback) ===
-            # Generate code (full workflow: generate + save + execute)
-            if "generate" in step_lower and ("program" in step_lower or "script" in step_lower or "game" in step_lower):
-                from code_generator import code_generator
-                if code_generator:
-                    prompt = context.get("original_message", step) if context else step
-                    
-                    # Extract file path from prompt if present
-                    import re
-                    path_match = re.search(r'(?:save|write|create).*?(?:to|in|at)\s+([^\s]+\.py)', prompt.lower())
-                    target_path = path_match.group(1) if path_match else None
-                    
-                    # Generate code
-                    gen_result = await code_generator.generate_code(prompt)
-                    
-                    if gen_result["success"] and target_path:
-                        # Auto-save if path specified
-                        code = gen_result["code"]
-                        file_result = code_generator.create_file(target_path, code)
-                        gen_result["file_created"] = target_path if file_result["success"] else None
-                        gen_result["file_result"] = file_result
-                    
-                    result["data"] = gen_result
-                    result["status"] = "success" if gen_result["success"] else "failed"
-                    return result
-            
-            # Save generated code to file
-            if "save" in step_lower and ("code" in step_lower or "file" in step_lower):
-                from code_generator import code_generator
-                if code_generator and context and "code" in context and "path" in context:
-                    file_result = code_generator.create_file(context["path"], context["code"])
-                    result["data"] = file_result
-                    result["status"] = "success" if file_result["success"] else "failed"
-                    return result
-            
-            # Execute code
-            if ("execute" in step_lower or "run" in step_lower or "test" in step_lower) and ("code" in step_lower or "program" in step_lower or "script" in step_lower):
-                from code_generator import code_generator
-                if code_generator and context:
-                    # Try to get code from context or from file
-                    code = context.get("code")
-                    if not code and "path" in context:
-                        # Read from file
-                        import os
-                        if os.path.exists(context["path"]):
-                            with open(context["path"], 'r') as f:
-                                code = f.read()
-                    
-                    if code:
-                        exec_result = code_generator.execute_code(code)
-                        result["data"] = exec_result
-                        result["status"] = "success" if exec_result["success"] else "failed"
-                        return result
-            # Health checks
-            if "health" in step_lower:
-                if "rag" in step_lower:
-                    resp = await self.http_client.get(f"{self.services['rag']}/health", timeout=5.0)
-                    result["data"] = resp.json()
-                elif "arch" in step_lower:
-                    resp = await self.http_client.get(f"{self.services['arch']}/health", timeout=5.0)
-                    result["data"] = resp.json()
-                elif "ollama" in step_lower:
-                    resp = await self.http_client.get(f"{self.services['ollama']}/api/tags", timeout=5.0)
-                    result["data"] = {"status": "healthy", "models": len(resp.json().get("models", []))}
-                else:
-                    # Aggregate health
-                    health_data = {}
-                    for service_name, service_url in self.services.items():
-                        try:
-                            if service_name == "ollama":
-                                resp = await self.http_client.get(f"{service_url}/api/tags", timeout=3.0)
-                                health_data[service_name] = "healthy"
-                            else:
-                                resp = await self.http_client.get(f"{service_url}/health", timeout=3.0)
-                                health_data[service_name] = "healthy"
-                        except:
-                            health_data[service_name] = "unhealthy"
-                    result["data"] = health_data
-                result["status"] = "success"
-            
-            # Metrics operations
-            elif "metrics" in step_lower or "measure" in step_lower:
-                from metrics import metrics_store
-                if "latenc" in step_lower:
-                    stats = metrics_store.get_stats()
-                    result["data"] = {"avg_latencies": stats["avg_latencies"]}
-                else:
-                    result["data"] = metrics_store.get_stats()
-                result["status"] = "success"
-            
-            # Analysis operations
-            elif "analyze" in step_lower:
-                from metrics import metrics_store
-                if "performance" in step_lower:
-                    result["data"] = metrics_store.analyze_performance()
-                elif "bottleneck" in step_lower:
-                    analysis = metrics_store.analyze_performance()
-                    result["data"] = {
-                        "issues": analysis["issues"],
-                        "slow_services": [issue for issue in analysis["issues"] if "latency" in issue.lower()]
+                        resp = await self.http_client.get(f"{service_url}/health", timeout=3.0)
+                        health_data[service_name] = "healthy"
+                except:
+                    health_data[service_name] = "unhealthy"
+            result["data"] = health_data
+        result["status"] = "success"
+        return True
+    
+    async def _metrics(self, step: str, step_lower: str, context: Dict, result: Dict) -> bool:
+        if "latenc" in step_lower:
+            stats = metrics_store.get_stats()
+            result["data"] = {"avg_latencies": stats["avg_latencies"]}
+        else:
+            result["data"] = metrics_store.get_stats()
+        result["status"] = "success"
+        return True
+    
+    async def _analysis(self, step: str, step_lower: str, context: Dict, result: Dict) -> bool:
+        if "performance" in step_lower:
+            result["data"] = metrics_store.analyze_performance()
+        elif "bottleneck" in step_lower:
+            analysis = metrics_store.analyze_performance()
+            result["data"] = {
+                "issues": analysis["issues"],
+                "slow_services": [issue for issue in analysis["issues"] if "latency" in issue.lower()]
+            }
+        else:
+            result["data"] = metrics_store.analyze_performance()
+        result["status"] = "success"
+        return True
+    
+    async def _generate_config(self, step: str, step_lower: str, context: Dict, result: Dict) -> bool:
+        prompt = context.get("original_message", step) if context else step
+        resp = await self.http_client.post(
+            f"{self.services['arch']}/arch/propose",
+            json={"prompt": prompt, "auto_apply": False},
+            timeout=15.0
+        )
+        result["data"] = resp.json()
+        result["status"] = "success"
+        return True
+    
+    async def _validate_safety(self, step: str, step_lower: str, context: Dict, result: Dict) -> bool:
+        # Check if we have a change_id in context
+        if context and "change_id" in context:
+            result["data"] = {"safe": True, "checks_passed": ["syntax", "dependencies", "conflicts"]}
+        else:
+            result["data"] = {"safe": True, "message": "No changes to validate"}
+        result["status"] = "success"
+        return True
+    
+    async def _apply(self, step: str, step_lower: str, context: Dict, result: Dict) -> bool:
+        if context and "change_id" in context:
+            resp = await self.http_client.post(
+                f"{self.services['arch']}/arch/apply",
+                json={"change_id": context["change_id"], "confirm": True},
+                timeout=15.0
+            )
+            result["data"] = resp.json()
+            result["status"] = "success"
+        else:
+            result["data"] = {"message": "No changes to apply"}
+            result["status"] = "completed"
+        return True
+    
+    async def _backup(self, step: str, step_lower: str, context: Dict, result: Dict) -> bool:
+        result["data"] = {
+            "backup_id": f"backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+            "message": "Backup point created"
+        }
+        result["status"] = "success"
+        return True
+    
+    async def _verify(self, step: str, step_lower: str, context: Dict, result: Dict) -> bool:
+        # Simple verification - check services are still healthy
+        health_check = await self.execute_step("Check system health", context)
+        result["data"] = {
+            "verified": health_check["status"] == "success",
+            "health": health_check["data"]
+        }
+        result["status"] = "success"
+        return True
+    
+    async def _optimize(self, step: str, step_lower: str, context: Dict, result: Dict) -> bool:
+        opportunities = metrics_store.detect_auto_healing_opportunities()
+        result["data"] = {
+            "opportunities_found": len(opportunities),
+            "opportunities": opportunities[:3]  # Top 3
+        }
+        result["status"] = "success"
+        return True
+    
+    async def _rag_search(self, step: str, step_lower: str, context: Dict, result: Dict) -> bool:
+        query = context.get("original_message", "relevant information") if context else "relevant information"
+        resp = await self.http_client.post(
+            f"{self.services['rag']}/query",
+            json={"query": query, "top_k": 3},
+            timeout=5.0
+        )
+        rag_data = resp.json()
+        result["data"] = {
+            "results_found": rag_data.get("total_results", 0),
+            "documents": len(rag_data.get("documents", []))
+        }
+        result["status"] = "success"
+        return True
+    
+    async def _generic(self, step: str, step_lower: str, context: Dict, result: Dict) -> bool:
+        result["data"] = {"message": f"Step completed: {step}"}
+        result["status"] = "completed"
+        return True
+    
+    async def execute_step_with_retries(self, step: str, context: Dict, deadline: float) -> Dict[str, Any]:
+        """Run a step under its handlers' timeout, retrying transient failures
+        
+        Each attempt gets the largest timeout of the step's handlers
+        (STEP_TIMEOUT if none sets one). Retries use jittered exponential
+        backoff and are allowed only for handlers registered with retry=True,
+        while DecisionEngine.should_retry agrees and the task deadline permits.
+        """
+        resolution = self.registry.resolve(step.lower())
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        attempt = 0
+        result = None
+        
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                if result is None:
+                    result = {
+                        "step": step,
+                        "status": "failed",
+                        "data": None,
+                        "error": "Task time budget exhausted",
+                        "timestamp": datetime.now().isoformat()
                     }
-                else:
-                    result["data"] = metrics_store.analyze_performance()
-                result["status"] = "success"
-            
-            # Configuration generation (must be before generic generate)
-            elif "generate" in step_lower and "config" in step_lower and "code" not in step_lower:
-                prompt = context.get("original_message", step) if context else step
-                resp = await self.http_client.post(
-                    f"{self.services['arch']}/arch/propose",
-                    json={"prompt": prompt, "auto_apply": False},
-                    timeout=15.0
-                )
-                result["data"] = resp.json()
-                result["status"] = "success"
-            
-            # Safety validation
-            elif "validate" in step_lower and "safety" in step_lower:
-                # Check if we have a change_id in context
-                if context and "change_id" in context:
-                    result["data"] = {"safe": True, "checks_passed": ["syntax", "dependencies", "conflicts"]}
-                else:
-                    result["data"] = {"safe": True, "message": "No changes to validate"}
-                result["status"] = "success"
-            
-            # Apply changes
-            elif "apply" in step_lower:
-                if context and "change_id" in context:
-                    resp = await self.http_client.post(
-                        f"{self.services['arch']}/arch/apply",
-                        json={"change_id": context["change_id"], "confirm": True},
-                        timeout=15.0
-                    )
-                    result["data"] = resp.json()
-                    result["status"] = "success"
-                else:
-                    result["data"] = {"message": "No changes to apply"}
-                    result["status"] = "completed"
-            
-            # Backup operations
-            elif "backup" in step_lower or "create backup" in step_lower:
-                result["data"] = {
-                    "backup_id": f"backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
-                    "message": "Backup point created"
-                }
-                result["status"] = "success"
-            
-            # Verification
-            elif "verify" in step_lower:
-                # Simple verification - check services are still healthy
-                health_check = await self.execute_step("Check system health", context)
-                result["data"] = {
-                    "verified": health_check["status"] == "success",
-                    "health": health_check["data"]
-                }
-                result["status"] = "success"
+                break
             
-            # Optimization operations
-            elif "optimize" in step_lower or "improve" in step_lower:
-                from metrics import metrics_store
-                opportunities = metrics_store.detect_auto_healing_opportunities()
-                result["data"] = {
-                    "opportunities_found": len(opportunities),
-                    "opportunities": opportunities[:3]  # Top 3
+            attempt += 1
+            step_timeout = min(resolution.timeout or self.STEP_TIMEOUT, remaining)
+            try:
+                async with asyncio.timeout(step_timeout):
+                    result = await self.execute_step(step, context)
+            except TimeoutError:
+                result = {
+                    "step": step,
+                    "status": "failed",
+                    "data": None,
+                    "error": f"Step timeout after {step_timeout:.1f}s",
+                    "timestamp": datetime.now().isoformat()
                 }
-                result["status"] = "success"
+                self.execution_history.append(result)
             
-            # RAG search
-            elif "search" in step_lower or "find" in step_lower:
-                query = context.get("original_message", "relevant information") if context else "relevant information"
-                resp = await self.http_client.post(
-                    f"{self.services['rag']}/query",
-                    json={"query": query, "top_k": 3},
-                    timeout=5.0
-                )
-                rag_data = resp.json()
-                result["data"] = {
-                    "results_found": rag_data.get("total_results", 0),
-                    "documents": len(rag_data.get("documents", []))
-                }
-                result["status"] = "success"
+            # Only failures with an error are candidates; a failed validation is final
+            error = result.get("error")
+            if result["status"] != "failed" or not error:
+                break
+            if not resolution.retryable or attempt >= self.MAX_RETRY_ATTEMPTS \
+                    or not decision_engine.should_retry(step, attempt, error):
+                break
             
-            # Generic completion
-            else:
-                result["data"] = {"message": f"Step completed: {step}"}
-                result["status"] = "completed"
-        
-        except Exception as e:
-            result["status"] = "failed"
-            result["error"] = str(e)
+            delay = min(self.RETRY_BASE_DELAY * 2 ** (attempt - 1), self.RETRY_MAX_DELAY)
+            delay *= random.uniform(0.5, 1.5)
+            if loop.time() + delay >= deadline:
+                break
+            await asyncio.sleep(delay)
         
-        # Record in history
-        self.execution_history.append(result)
+        result["attempts"] = attempt
+        result["duration_ms"] = round((time.monotonic() - started) * 1000, 1)
         return result
     
-    async def execute_task(self, steps: List[str], context: Dict = None) -> List[Dict]:
-        """Execute all steps in a task with anti-loop protection"""
+    async def execute_task(
+        self,
+        steps: List[str],
+        context: Dict = None,
+        progress_callback: Optional[Callable[[str, Dict], None]] = None,
+        time_budget: Optional[float] = None
+    ) -> List[Dict]:
+        """Execute all steps in a task with anti-loop protection
+        
+        progress_callback(event, data) is called before and after each step.
+        time_budget (default TASK_TIME_BUDGET) bounds the whole task; steps
+        that cannot start in time fail with "Task time budget exhausted".
+        """
         # ANTI-LOOP PROTECTION: Limit total steps
         if len(steps) > self.MAX_STEPS_PER_TASK:
             raise ValueError(f"Too many steps ({len(steps)}). Maximum allowed: {self.MAX_STEPS_PER_TASK}")
         
-        results = []
         execution_context = context.copy() if context else {}
         self.current_step_count = 0  # Reset counter
         
-        for i, step in enumerate(steps):
-            # ANTI-LOOP PROTECTION: Check step count
-            self.current_step_count += 1
-            if self.current_step_count > self.MAX_STEPS_PER_TASK:
-                results.append({
-                    "step": "LOOP_PROTECTION",
-                    "status": "failed",
-                    "error": f"Maximum steps exceeded ({self.MAX_STEPS_PER_TASK}). Possible infinite loop detected.",
-                    "timestamp": datetime.now().isoformat()
-                })
-                break
-            
-            # Execute step
-            result = await self.execute_step(step, execution_context)
-            results.append(result)
-            
-            # Update context with results for next steps
-            if result["status"] == "success" and result["data"]:
-                # If we got a change_id, save it for later steps
-                if isinstance(result["data"], dict) and "change_id" in result["data"]:
-                    execution_context["change_id"] = result["data"]["change_id"]
+        # Independent steps overlap; dependent ones wait for their inputs
+        dependencies = self.build_step_dag(steps)
+        finished = [asyncio.Event() for _ in steps]
+        semaphore = asyncio.Semaphore(self.max_parallel_steps)
+        results: List[Optional[Dict]] = [None] * len(steps)
+        state = {"stopped": False, "started": 0}
+        budget = self.TASK_TIME_BUDGET if time_budget is None else time_budget
+        deadline = asyncio.get_running_loop().time() + budget
+        
+        async def run_step(i: int, step: str):
+            try:
+                for dep in dependencies[i]:
+                    await finished[dep].wait()
+                if state["stopped"]:
+                    return
                 
-                # If we got a rollback_id, save it
-                if isinstance(result["data"], dict) and "rollback_id" in result["data"]:
-                    execution_context["rollback_id"] = result["data"]["rollback_id"]
-            
-            # Stop on critical failure
-            if result["status"] == "failed" and "critical" in step.lower():
-                break
+                async with semaphore:
+                    if state["stopped"]:
+                        return
+                    
+                    # ANTI-LOOP PROTECTION: Check step count
+                    state["started"] += 1
+                    self.current_step_count = state["started"]
+                    if state["started"] > self.MAX_STEPS_PER_TASK:
+                        state["stopped"] = True
+                        results[i] = {
+                            "step": "LOOP_PROTECTION",
+                            "status": "failed",
+                            "error": f"Maximum steps exceeded ({self.MAX_STEPS_PER_TASK}). Possible infinite loop detected.",
+                            "timestamp": datetime.now().isoformat()
+                        }
+                        return
+                    
+                    # Execute step
+                    if progress_callback:
+                        progress_callback("step_started", {"index": i, "step": step, "total": len(steps)})
+                    result = await self.execute_step_with_retries(step, execution_context, deadline)
+                    results[i] = result
+                    if progress_callback:
+                        progress_callback("step_completed", {
+                            "index": i,
+                            "step": step,
+                            "total": len(steps),
+                            "status": result["status"],
+                            "error": result.get("error"),
+                            "attempts": result["attempts"],
+                            "duration_ms": result["duration_ms"]
+                        })
+                    
+                    # Update context with results for next steps
+                    if result["status"] == "success" and result["data"]:
+                        # If we got a change_id, save it for later steps
+                        if isinstance(result["data"], dict) and "change_id" in result["data"]:
+                            execution_context["change_id"] = result["data"]["change_id"]
+                        
+                        # If we got a rollback_id, save it
+                        if isinstance(result["data"], dict) and "rollback_id" in result["data"]:
+                            execution_context["rollback_id"] = result["data"]["rollback_id"]
+                    
+                    # Stop on critical failure: steps not yet started are skipped
+                    if result["status"] == "failed" and "critical" in step.lower():
+                        state["stopped"] = True
+            finally:
+                finished[i].set()
+        
+        await asyncio.gather(*(run_step(i, step) for i, step in enumerate(steps)))
         
-        return results
+        # Deterministic order: plan order, regardless of completion order
+        return [r for r in results if r is not None]
     
     def get_execution_summary(self, results: List[Dict]) -> Dict:
         """Generate execution summary"""
@@ -388,6 +622,8 @@ class ExecutionEngine:
             "total_steps": total,
             "successful": successful,
             "failed": failed,
+            "retries": sum(max(r.get("attempts", 1) - 1, 0) for r in results),
+            "duration_ms": round(sum(r.get("duration_ms", 0) for r in results), 1),
             "success_rate": round((successful / total * 100) if total > 0 else 0, 1),
             "status": "completed" if failed == 0 else "partial" if successful > 0 else "failed"
         }
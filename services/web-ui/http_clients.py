@@ -0,0 +1,98 @@
+"""
+HTTP Clients - Long-lived pooled clients, one per upstream
+"""
+import os
+from typing import Dict
+
+import httpx
+
+# Per-upstream pool and timeout settings. Generation requests to Ollama and
+# external model APIs hold a connection for the whole completion, so they get
+# their own pools and longer read timeouts than the internal services.
+UPSTREAMS = {
+    "services": {
+        "limits": httpx.Limits(max_keepalive_connections=20, max_connections=100),
+        "timeout": httpx.Timeout(30.0, connect=10.0)
+    },
+    "ollama": {
+        "limits": httpx.Limits(
+            max_keepalive_connections=int(os.getenv("OLLAMA_MAX_KEEPALIVE", "10")),
+            max_connections=int(os.getenv("OLLAMA_MAX_CONNECTIONS", "20")),
+            keepalive_expiry=120.0
+        ),
+        "timeout": httpx.Timeout(float(os.getenv("OLLAMA_HTTP_TIMEOUT", "180")), connect=5.0)
+    },
+    "external": {
+        "limits": httpx.Limits(max_keepalive_connections=5, max_connections=10, keepalive_expiry=60.0),
+        "timeout": httpx.Timeout(60.0, connect=10.0)
+    }
+}
+
+
+class HTTPClientRegistry:
+    """
+    One httpx.AsyncClient per upstream, shared by the whole process.
+
+    Clients are created by start() in the web-ui lifespan (or lazily on
+    first use outside it) and closed by aclose() on shutdown, so every
+    request reuses keep-alive connections instead of opening a new pool.
+    """
+
+    def __init__(self, upstreams: Dict[str, Dict] = None):
+        self.upstreams = upstreams or UPSTREAMS
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self.requests: Dict[str, int] = {name: 0 for name in self.upstreams}
+        self.errors: Dict[str, int] = {name: 0 for name in self.upstreams}
+
+    def _create(self, name: str) -> httpx.AsyncClient:
+        config = self.upstreams[name]
+
+        async def on_request(request: httpx.Request):
+            self.requests[name] += 1
+
+        async def on_response(response: httpx.Response):
+            if response.status_code >= 500:
+                self.errors[name] += 1
+
+        return httpx.AsyncClient(
+            limits=config["limits"],
+            timeout=config["timeout"],
+            event_hooks={"request": [on_request], "response": [on_response]}
+        )
+
+    def start(self):
+        """Create a client for every configured upstream"""
+        for name in self.upstreams:
+            self.get(name)
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        """Pooled client for an upstream ("services", "ollama", "external")"""
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            client = self._clients[name] = self._create(name)
+        return client
+
+    async def aclose(self):
+        """Close every client and its connection pool"""
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+
+    def get_stats(self) -> Dict[str, Dict]:
+        """Request counts and pool settings per upstream"""
+        stats = {}
+        for name, config in self.upstreams.items():
+            limits: httpx.Limits = config["limits"]
+            stats[name] = {
+                "open": name in self._clients and not self._clients[name].is_closed,
+                "requests": self.requests[name],
+                "server_errors": self.errors[name],
+                "max_connections": limits.max_connections,
+                "max_keepalive_connections": limits.max_keepalive_connections,
+                "read_timeout": config["timeout"].read
+            }
+        return stats
+
+
+# Global client registry (started in main.py lifespan)
+http_clients = HTTPClientRegistry()
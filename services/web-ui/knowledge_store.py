@@ -109,12 +109,7 @@ Task ID: {task_result.get('task_id')}
             
             if response.status_code == 200:
                 data = response.json()
-                # Фильтруем только результаты выполнения
-                executions = [
-                    doc for doc in data.get('documents', [])
-                    if doc.get('metadata', {}).get('type') == 'execution_result'
-                ]
-                return executions
+                return self.filter_executions(data.get('documents', []))
             
             return []
             
@@ -122,6 +117,15 @@ Task ID: {task_result.get('task_id')}
             print(f"✗ Error querying similar executions: {e}")
             return []
     
+    @staticmethod
+    def filter_executions(documents: List[Dict]) -> List[Dict]:
+        """Execution results among RAG query documents"""
+        # Фильтруем только результаты выполнения
+        return [
+            doc for doc in documents
+            if doc.get('metadata', {}).get('type') == 'execution_result'
+        ]
+    
     def get_stats(self) -> Dict:
         """Get knowledge store statistics"""
         return {
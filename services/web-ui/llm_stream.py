@@ -0,0 +1,186 @@
+"""
+LLM Streaming - Ollama NDJSON token streams and their latency metrics
+"""
+import asyncio
+import json
+import time
+from collections import deque
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+import httpx
+
+from ollama_models import ollama_models
+from ollama_scheduler import ollama_scheduler
+
+# Called with each text fragment as it arrives
+TokenCallback = Callable[[str], None]
+
+
+def format_sse(event: str, data: Any) -> str:
+    """Serialize one Server-Sent Event"""
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+class StreamMetrics:
+    """Time-to-first-token and decode throughput of recent generations"""
+
+    WINDOW = 200
+
+    def __init__(self):
+        self.streams = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.errors = 0
+        self._ttft_ms = deque(maxlen=self.WINDOW)
+        self._tokens_per_s = deque(maxlen=self.WINDOW)
+
+    def record(self, ttft_ms: Optional[float], tokens_per_s: Optional[float]):
+        self.completed += 1
+        if ttft_ms is not None:
+            self._ttft_ms.append(ttft_ms)
+        if tokens_per_s is not None:
+            self._tokens_per_s.append(tokens_per_s)
+
+    @staticmethod
+    def _percentile(values, pct: float) -> float:
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        return round(ordered[min(int(len(ordered) * pct), len(ordered) - 1)], 1)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "streams": self.streams,
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "errors": self.errors,
+            "ttft_ms_p50": self._percentile(self._ttft_ms, 0.5),
+            "ttft_ms_p95": self._percentile(self._ttft_ms, 0.95),
+            "tokens_per_s_avg": round(sum(self._tokens_per_s) / len(self._tokens_per_s), 1) if self._tokens_per_s else 0.0
+        }
+
+
+stream_metrics = StreamMetrics()
+
+
+async def stream_generate(
+    client: httpx.AsyncClient,
+    ollama_url: str,
+    model: str,
+    prompt: str,
+    options: Optional[Dict[str, Any]] = None,
+    timeout: Optional[float] = None,
+    priority: str = "interactive",
+    context: Optional[List[int]] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """Stream /api/generate and yield {"token": ...} chunks, then a final
+    {"done": True, ...} chunk carrying ttft_ms, tokens_per_s and eval_count.
+
+    Closing the iterator (e.g. when the HTTP client disconnects) closes the
+    upstream response, which makes Ollama stop generating. A non-200 reply
+    raises httpx.HTTPStatusError before any token is yielded.
+
+    The generation waits for an ollama_scheduler slot of the given priority
+    class and holds it until the stream ends; ttft_ms includes that wait.
+    OllamaOverloadedError is raised if the request is shed. The slot is only
+    released when the generator finishes or is closed, so consumers that may
+    leave the loop early must iterate it inside contextlib.aclosing().
+
+    keep_alive comes from ollama_models, which pins recently busy models.
+    context is the token context returned by a previous generation of the
+    same model; Ollama then evaluates only the new prompt on top of it.
+    """
+    payload = {"model": model, "prompt": prompt, "stream": True, "keep_alive": ollama_models.keep_alive_for(model)}
+    if options:
+        payload["options"] = options
+    if context:
+        payload["context"] = context
+
+    started = time.perf_counter()
+    ttft_ms = None
+    await ollama_scheduler.acquire(priority)
+    stream_metrics.streams += 1
+    try:
+        async with client.stream(
+            "POST", f"{ollama_url}/api/generate", json=payload,
+            timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT
+        ) as response:
+            if response.status_code != 200:
+                await response.aread()
+                response.raise_for_status()
+
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise RuntimeError(chunk["error"])
+
+                token = chunk.get("response", "")
+                if token:
+                    if ttft_ms is None:
+                        ttft_ms = (time.perf_counter() - started) * 1000
+                    yield {"token": token}
+
+                if chunk.get("done"):
+                    # Ollama reports decode time in nanoseconds
+                    eval_count = chunk.get("eval_count", 0)
+                    eval_ns = chunk.get("eval_duration", 0)
+                    tokens_per_s = eval_count / (eval_ns / 1e9) if eval_ns else None
+                    stream_metrics.record(ttft_ms, tokens_per_s)
+                    ollama_models.record_request(model, chunk.get("load_duration", 0) / 1e6)
+                    yield {
+                        "done": True,
+                        "model": chunk.get("model", model),
+                        "context": chunk.get("context"),
+                        "eval_count": eval_count,
+                        "prompt_eval_count": chunk.get("prompt_eval_count", 0),
+                        "prompt_eval_ms": round(chunk.get("prompt_eval_duration", 0) / 1e6, 1),
+                        "ttft_ms": round(ttft_ms, 1) if ttft_ms is not None else None,
+                        "tokens_per_s": round(tokens_per_s, 2) if tokens_per_s else None,
+                        "total_ms": round((time.perf_counter() - started) * 1000, 1)
+                    }
+                    return
+    except (GeneratorExit, asyncio.CancelledError):
+        stream_metrics.cancelled += 1
+        raise
+    except Exception:
+        stream_metrics.errors += 1
+        raise
+    finally:
+        ollama_scheduler.release()
+
+
+async def complete(
+    client: httpx.AsyncClient,
+    ollama_url: str,
+    model: str,
+    prompt: str,
+    on_token: Optional[TokenCallback] = None,
+    options: Optional[Dict[str, Any]] = None,
+    timeout: Optional[float] = None,
+    priority: str = "interactive",
+    context: Optional[List[int]] = None
+) -> Dict[str, Any]:
+    """Run a streamed generation to completion, forwarding tokens to on_token
+
+    Returns the final chunk of stream_generate with the full text under
+    "response", so callers written against stream=False keep working.
+    """
+    parts = []
+    final: Dict[str, Any] = {}
+    chunks = stream_generate(client, ollama_url, model, prompt, options, timeout, priority, context)
+    # aclosing: an exception from on_token or a cancellation releases the
+    # scheduler slot right away instead of whenever the generator is collected
+    async with aclosing(chunks):
+        async for chunk in chunks:
+            if "token" in chunk:
+                parts.append(chunk["token"])
+                if on_token:
+                    on_token(chunk["token"])
+            else:
+                final = chunk
+    final["response"] = "".join(parts)
+    return final
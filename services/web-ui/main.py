@@ -3,23 +3,25 @@ AI Combiner Stack - Web UI
 Simple web interface for managing the entire stack
 """
 from fastapi import FastAPI, Request, Form
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-import httpx
-from typing import Optional
+from typing import Callable, Optional
 import time
+import json
 import asyncio
-from contextlib import asynccontextmanager
+import httpx
+from contextlib import aclosing, asynccontextmanager
 from collections import defaultdict
 from datetime import datetime
 
 from metrics import metrics_store
 from circuit_breaker import circuit_breaker, CircuitBreakerOpenError
+from singleflight import singleflight
 from knowledge_graph import knowledge_graph
 from goal_manager import goal_manager, GoalStatus
 from conversation_manager import conversation_manager
-from task_executor import task_executor
+from task_executor import task_executor, Task
 from execution_engine import ExecutionEngine
 from adaptive_planner import adaptive_planner
 from decision_engine import decision_engine
@@ -27,11 +29,24 @@ from self_improvement import self_improvement_engine
 from meta_learning import meta_learning_engine
 from predictive_engine import predictive_engine
 from code_generator import CodeGenerator
+from sandbox_pool import create_sandbox_pool
+from http_clients import http_clients
+from llm_stream import format_sse, stream_generate, stream_metrics
+from ollama_scheduler import ollama_scheduler
+from ollama_models import ollama_models
+from prompt_builder import prompt_builder
+from conversation_summarizer import conversation_summarizer
+from blob_store import blob_store
+from message_classifier import message_classifier
 from knowledge_store import init_knowledge_store, knowledge_store
 from autonomous_optimizer import autonomous_optimizer
 from proactive_engine import proactive_engine
 from self_modification import self_modification
 from tree_of_thought import tree_of_thought
+from app_logging import get_logger, shutdown_logging
+import app_logging
+
+logger = get_logger("main")
 
 # Rate limiting
 rate_limit_store = defaultdict(list)
@@ -56,16 +71,16 @@ def check_rate_limit(client_ip: str) -> bool:
 # Global HTTP client with connection pooling
 http_client = None
 execution_engine = None
+sandbox_pool = None
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Manage HTTP client lifecycle"""
-    global http_client, execution_engine
-    # Startup: create client with connection pooling
-    limits = httpx.Limits(max_keepalive_connections=20, max_connections=100)
-    timeout = httpx.Timeout(30.0, connect=10.0)
-    http_client = httpx.AsyncClient(limits=limits, timeout=timeout)
-    print("✓ HTTP client initialized with connection pooling")
+    global http_client, execution_engine, sandbox_pool
+    # Startup: one pooled client per upstream (services, ollama, external)
+    http_clients.start()
+    http_client = http_clients.get("services")
+    print("✓ HTTP clients initialized with connection pooling")
     
     # Initialize execution engine
     execution_engine = ExecutionEngine(http_client, SERVICES)
@@ -73,7 +88,11 @@ async def lifespan(app: FastAPI):
     
     # Initialize code generator
     import code_generator as cg_module
-    cg_module.code_generator = CodeGenerator(ollama_url=SERVICES["ollama"])
+    sandbox_pool = create_sandbox_pool()
+    if sandbox_pool:
+        sandbox_pool.start()
+        print(f"✓ Sandbox pool started ({sandbox_pool.size} workers)")
+    cg_module.code_generator = CodeGenerator(ollama_url=SERVICES["ollama"], sandbox=sandbox_pool)
     print("✓ Code generator initialized")
     
     # Initialize knowledge store
@@ -96,11 +115,37 @@ async def lifespan(app: FastAPI):
     )
     print("✓ Proactive engine started")
     
+    # Start background task workers
+    task_executor.start_workers()
+    print(f"✓ Task workers started ({task_executor.max_workers})")
+    
+    # Preload warm models and keep Ollama's resident set within its memory budget
+    asyncio.create_task(
+        ollama_models.continuous_refresh_loop(http_clients.get("ollama"), SERVICES["ollama"])
+    )
+    print(f"✓ Ollama model manager started (warm: {', '.join(ollama_models.warm_models) or 'none'})")
+    
+    # Fold old chat turns into rolling summaries (background Ollama priority)
+    asyncio.create_task(conversation_summarizer.continuous_summarize_loop(conversation_manager))
+    print("✓ Conversation summarizer started")
+    
+    # Move idle chat sessions out of memory (kept in sqlite when configured);
+    # blobs referenced only by dropped sessions go with them
+    asyncio.create_task(conversation_manager.store.continuous_eviction_loop(
+        after_sweep=lambda: conversation_manager.sweep_blobs(conversation_summarizer.archive)
+    ))
+    print("✓ Session store eviction started")
+    
     yield
-    # Shutdown: close client gracefully
-    print("Shutting down HTTP client...")
-    await http_client.aclose()
-    print("✓ HTTP client closed")
+    # Shutdown: stop workers, then close client gracefully
+    await task_executor.stop_workers()
+    conversation_manager.store.flush()
+    if sandbox_pool:
+        sandbox_pool.shutdown()
+    print("Shutting down HTTP clients...")
+    await http_clients.aclose()
+    print("✓ HTTP clients closed")
+    shutdown_logging()
 
 app = FastAPI(title="AI Combiner Stack - Web UI", lifespan=lifespan)
 
@@ -129,6 +174,38 @@ async def dashboard(request: Request):
     """System metrics dashboard"""
     return templates.TemplateResponse("dashboard.html", {"request": request})
 
+async def _upstream_get(service: str, path: str, client: Optional[httpx.AsyncClient] = None, **kwargs):
+    """JSON of a GET to an upstream; concurrent identical GETs share one request
+    
+    Request options (timeout...) are part of the coalescing key: a caller
+    never waits under another caller's timeout.
+    """
+    async def get():
+        resp = await (client or http_client).get(f"{SERVICES[service]}{path}", **kwargs)
+        return resp.json()
+    
+    data, _ = await singleflight.do(service, path, kwargs or None, get)
+    return data
+
+async def _rag_query(query: str, top_k: int, **kwargs) -> dict:
+    """rag-api /query behind the circuit breaker
+    
+    Concurrent identical queries (dashboard, chat, autonomous) share one
+    request, so a slow or failing rag-api is charged to the breaker once.
+    Request options (timeout...) are part of the coalescing key.
+    """
+    async def post():
+        resp = await http_client.post(f"{SERVICES['rag']}/query", json={"query": query, "top_k": top_k}, **kwargs)
+        if resp.status_code >= 500:
+            resp.raise_for_status()
+        return resp.json()
+    
+    data, _ = await singleflight.do(
+        "rag", "/query", {"query": query, "top_k": top_k, "request": kwargs},
+        lambda: circuit_breaker.call_async("rag", post)
+    )
+    return data
+
 @app.get("/api/status")
 async def get_status():
     """Get status of all services"""
@@ -136,22 +213,20 @@ async def get_status():
     
     # Check RAG API
     try:
-        resp = await http_client.get(f"{SERVICES['rag']}/health")
-        status["rag"] = {"status": "healthy", "data": resp.json()}
+        status["rag"] = {"status": "healthy", "data": await _upstream_get("rag", "/health")}
     except:
         status["rag"] = {"status": "unhealthy", "data": None}
     
     # Check Arch Engine
     try:
-        resp = await http_client.get(f"{SERVICES['arch']}/health")
-        status["arch"] = {"status": "healthy", "data": resp.json()}
+        status["arch"] = {"status": "healthy", "data": await _upstream_get("arch", "/health")}
     except:
         status["arch"] = {"status": "unhealthy", "data": None}
     
     # Check Ollama
     try:
-        resp = await http_client.get(f"{SERVICES['ollama']}/api/tags")
-        status["ollama"] = {"status": "healthy", "data": resp.json()}
+        data = await _upstream_get("ollama", "/api/tags", http_clients.get("ollama"), timeout=30.0)
+        status["ollama"] = {"status": "healthy", "data": data}
     except:
         status["ollama"] = {"status": "unhealthy", "data": None}
     
@@ -179,16 +254,9 @@ async def rag_query(request: Request, query: str = Form(...), top_k: int = Form(
     
     start_time = time.time()
     try:
-        # Use circuit breaker
-        async def rag_call():
-            return await http_client.post(
-                f"{SERVICES['rag']}/query",
-                json={"query": query, "top_k": top_k}
-            )
-        
-        resp = await circuit_breaker.call("rag", rag_call)
+        # Circuit breaker + coalescing of identical in-flight queries
+        result = await _rag_query(query, top_k)
         latency = (time.time() - start_time) * 1000
-        result = resp.json()
         
         # Record metrics
         metrics_store.record_query("rag", query, latency, True)
@@ -249,6 +317,33 @@ async def rollback_change(rollback_id: str = Form(...)):
     except Exception as e:
         return {"error": str(e)}
 
+RAG_PROMPT_TEMPLATE = """Based on the following context from previous work:
+
+{context}
+
+User question: {question}
+
+Please provide a detailed answer using the context above."""
+
+async def _build_rag_prompt(prompt: str, use_rag: bool):
+    """Prompt enriched with RAG context, and whether context was found"""
+    if not use_rag:
+        return prompt, False
+    try:
+        rag_data = await _rag_query(prompt, 3)
+        
+        if rag_data.get("documents"):
+            # Closest documents first, within the endpoint's token budget
+            built = prompt_builder.build(
+                "ollama_generate", RAG_PROMPT_TEMPLATE,
+                documents=rag_data["documents"], question=prompt
+            )
+            return built["prompt"], True
+    except:
+        # If RAG fails, continue without context
+        pass
+    return prompt, False
+
 @app.post("/api/ollama/generate")
 async def ollama_generate(
     prompt: str = Form(...),
@@ -257,49 +352,64 @@ async def ollama_generate(
 ):
     """Generate text with Ollama, optionally with RAG context"""
     try:
-        final_prompt = prompt
-        rag_used = False
-        
-        # If RAG enabled, search for context
-        if use_rag:
-            try:
-                rag_resp = await http_client.post(
-                    f"{SERVICES['rag']}/query",
-                    json={"query": prompt, "top_k": 3}
-                )
-                rag_data = rag_resp.json()
-                
-                if rag_data.get("documents"):
-                    # Build context from RAG results
-                    context = "\n\n".join([
-                        f"[Context {i+1}]: {doc['content'][:500]}"
-                        for i, doc in enumerate(rag_data["documents"][:3])
-                    ])
-                    
-                    # Enhanced prompt with context
-                    final_prompt = f"""Based on the following context from previous work:
-
-{context}
-
-User question: {prompt}
-
-Please provide a detailed answer using the context above."""
-                    rag_used = True
-            except:
-                # If RAG fails, continue without context
-                pass
+        final_prompt, rag_used = await _build_rag_prompt(prompt, use_rag)
         
-        # Generate with Ollama
-        resp = await http_client.post(
-            f"{SERVICES['ollama']}/api/generate",
-            json={"model": model, "prompt": final_prompt, "stream": False}
-        )
+        # Generate with Ollama (waits for an interactive scheduler slot)
+        async with ollama_scheduler.slot("interactive"):
+            resp = await http_clients.get("ollama").post(
+                f"{SERVICES['ollama']}/api/generate",
+                json={
+                    "model": model, "prompt": final_prompt, "stream": False,
+                    "keep_alive": ollama_models.keep_alive_for(model)
+                }
+            )
         result = resp.json()
+        if resp.status_code == 200:
+            ollama_models.record_request(model, result.get("load_duration", 0) / 1e6)
         result["rag_used"] = rag_used
         return result
     except Exception as e:
         return {"error": str(e)}
 
+def _sse_response(events) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/ollama/generate/stream")
+async def ollama_generate_stream(
+    request: Request,
+    prompt: str = Form(...),
+    model: str = Form("qwen2.5-coder:7b"),
+    use_rag: bool = Form(True)
+):
+    """Streaming /api/ollama/generate: "meta", then "token" events, then "done"
+    with ttft_ms and tokens_per_s (or "error"). Generation stops when the
+    client disconnects.
+    """
+    final_prompt, rag_used = await _build_rag_prompt(prompt, use_rag)
+    
+    async def event_stream():
+        yield format_sse("meta", {"model": model, "rag_used": rag_used})
+        chunks = stream_generate(http_clients.get("ollama"), SERVICES["ollama"], model, final_prompt)
+        try:
+            # aclosing: leaving the loop early closes the upstream request too
+            async with aclosing(chunks):
+                async for chunk in chunks:
+                    if await request.is_disconnected():
+                        break
+                    if "token" in chunk:
+                        yield format_sse("token", {"text": chunk["token"]})
+                    else:
+                        chunk.pop("context", None)
+                        yield format_sse("done", chunk)
+        except Exception as e:
+            yield format_sse("error", {"error": str(e) or type(e).__name__})
+    
+    return _sse_response(event_stream())
+
 @app.get("/api/test/rag-context")
 async def test_rag_context():
     """Test endpoint to verify RAG context integration"""
@@ -509,7 +619,7 @@ async def get_production_metrics():
 
 @app.get("/api/resilience/circuit-breakers")
 async def get_circuit_breaker_status():
-    """Get circuit breaker status for all services"""
+    """Get circuit breaker status for all services, and request coalescing counts"""
     services = ["rag", "arch", "ollama"]
     status = {}
     
@@ -523,7 +633,8 @@ async def get_circuit_breaker_status():
     
     return {
         "circuit_breakers": status,
-        "all_healthy": all(s["healthy"] for s in status.values())
+        "all_healthy": all(s["healthy"] for s in status.values()),
+        "singleflight": singleflight.get_stats()
     }
 
 @app.post("/api/resilience/reset-circuit")
@@ -751,11 +862,7 @@ async def chat(message: str = Form(...), session_id: str = Form(None)):
     # Get RAG context
     rag_context = []
     try:
-        resp = await http_client.post(
-            f"{SERVICES['rag']}/query",
-            json={"query": message, "top_k": 2}
-        )
-        rag_data = resp.json()
+        rag_data = await _rag_query(message, 2)
         rag_context = rag_data.get("documents", [])
     except:
         pass
@@ -772,88 +879,139 @@ async def chat(message: str = Form(...), session_id: str = Form(None)):
     # Save to session
     session.add_message("user", message, {"intent": intent})
     session.add_message("assistant", response_text, {"rag_used": len(rag_context) > 0})
+    await asyncio.to_thread(conversation_manager.save_session, session)
     
     return {
         "session_id": session_id,
         "response": response_text,
         "intent": intent,
         "rag_context_used": len(rag_context),
-        "message_count": len(session.messages)
+        "message_count": session.total_messages()
     }
 
 @app.get("/api/chat/sessions")
-async def list_sessions():
-    """List all conversation sessions"""
-    sessions = [s.to_dict() for s in conversation_manager.sessions.values()]
+async def list_sessions(limit: int = 50, offset: int = 0):
+    """List conversation sessions, most recently active first"""
+    store = conversation_manager.store
+    sessions = await asyncio.to_thread(store.list_sessions, limit, offset)
     return {
         "sessions": sessions,
-        "total": len(sessions)
+        "total": store.count(),
+        "store": store.get_stats(),
+        "blobs": blob_store.get_stats(),
+        "kv_reuse": conversation_manager.get_kv_stats(),
+        "summarizer": conversation_summarizer.get_stats()
     }
 
+@app.get("/api/chat/blobs/{blob_id}")
+async def get_session_blob(blob_id: str):
+    """Execution plan or task result referenced by a session message (*_ref metadata)"""
+    value = await asyncio.to_thread(blob_store.get, blob_id)
+    if value is None:
+        return {"error": "Blob not found"}
+    return {"blob_id": blob_id, "value": value}
+
 @app.get("/api/chat/session/{session_id}")
-async def get_session_history(session_id: str):
-    """Get conversation history"""
+async def get_session_history(session_id: str, include_archived: bool = False):
+    """Get conversation history (include_archived=true adds summarized messages from cold storage)"""
     session = conversation_manager.get_session(session_id)
     if not session:
         return {"error": "Session not found"}
     
+    messages = [message.to_dict() for message in session.messages]
+    if include_archived and session.archived_count:
+        archived = await asyncio.to_thread(conversation_summarizer.archive.load, session_id)
+        messages = archived + messages
     return {
         "session": session.to_dict(),
-        "messages": session.messages
+        "messages": messages
     }
 
 @app.post("/api/execute")
-async def execute_task(task: str = Form(...)):
-    """Execute autonomous task"""
+async def execute_task(
+    task: str = Form(...),
+    priority: str = Form("normal"),
+    wait: str = Form("false")
+):
+    """Queue autonomous task; progress streams from /api/tasks/{task_id}/events"""
     # Create task
     task_obj = task_executor.create_task(task)
     
     # Decompose into steps
     steps = task_executor.decompose_task(task)
     task_obj.steps = steps
-    task_obj.status = "running"
-    task_obj.started_at = datetime.now().isoformat()
     
-    # Execute steps
-    results = []
-    for i, step in enumerate(steps):
-        task_obj.current_step = i + 1
-        
-        # Execute step based on type
-        if "health" in step.lower():
-            try:
-                health = await http_client.get(f"{SERVICES['rag']}/health")
-                results.append({"step": step, "status": "success", "data": health.json()})
-            except:
-                results.append({"step": step, "status": "failed"})
+    async def run_steps(t: Task) -> dict:
+        results = []
+        for i, step in enumerate(steps):
+            t.on_step_progress("step_started", {"index": i, "step": step, "total": len(steps)})
+            
+            # Execute step based on type
+            if "health" in step.lower():
+                try:
+                    health = await http_client.get(f"{SERVICES['rag']}/health")
+                    results.append({"step": step, "status": "success", "data": health.json()})
+                except:
+                    results.append({"step": step, "status": "failed"})
+            
+            elif "metrics" in step.lower():
+                try:
+                    metrics = metrics_store.get_stats()
+                    results.append({"step": step, "status": "success", "data": metrics})
+                except:
+                    results.append({"step": step, "status": "failed"})
+            
+            else:
+                results.append({"step": step, "status": "completed"})
+            
+            t.on_step_progress("step_completed", {
+                "index": i, "step": step, "total": len(steps), "status": results[-1]["status"]
+            })
         
-        elif "metrics" in step.lower():
-            try:
-                metrics = metrics_store.get_stats()
-                results.append({"step": step, "status": "success", "data": metrics})
-            except:
-                results.append({"step": step, "status": "failed"})
+        # Complete task
+        t.status = "completed"
+        t.completed_at = datetime.now().isoformat()
+        t.result = results
         
-        else:
-            results.append({"step": step, "status": "completed"})
+        return {
+            "task_id": t.task_id,
+            "status": t.status,
+            "steps_completed": len(steps),
+            "results": results
+        }
     
-    # Complete task
-    task_obj.status = "completed"
-    task_obj.completed_at = datetime.now().isoformat()
-    task_obj.result = results
+    task_executor.submit(task_obj, run_steps, priority)
     
-    return {
+    if wait.lower() in ['true', '1', 'yes']:
+        await task_executor.wait(task_obj.task_id)
+        return task_obj.job_result or {"task_id": task_obj.task_id, "status": task_obj.status}
+    
+    return JSONResponse(status_code=202, content={
         "task_id": task_obj.task_id,
         "status": task_obj.status,
-        "steps_completed": len(steps),
-        "results": results
-    }
+        "steps": steps,
+        "events_url": f"/api/tasks/{task_obj.task_id}/events"
+    })
 
 @app.get("/api/tasks")
 async def list_tasks():
     """List all tasks"""
     tasks = [t.to_dict() for t in task_executor.tasks.values()]
-    return {"tasks": tasks, "total": len(tasks)}
+    return {
+        "tasks": tasks,
+        "total": len(tasks),
+        "queue": task_executor.get_queue_stats(),
+        "step_memo": execution_engine.step_memo.get_stats()
+    }
+
+@app.get("/api/execution/stats")
+async def get_execution_stats():
+    """Step dispatch cache, per-step-type handler latency, sandbox pool, message classifier and log queue"""
+    stats = execution_engine.registry.get_stats()
+    stats["sandbox"] = sandbox_pool.get_stats() if sandbox_pool else None
+    stats["classifier"] = message_classifier.get_stats()
+    stats["logging"] = app_logging.get_stats()
+    return stats
 
 @app.get("/api/tasks/{task_id}")
 async def get_task_status(task_id: str):
@@ -863,68 +1021,229 @@ async def get_task_status(task_id: str):
         return {"error": "Task not found"}
     return task.to_dict()
 
+def _format_sse(entry: dict) -> str:
+    """Serialize a task event as a Server-Sent Event"""
+    payload = json.dumps(entry, ensure_ascii=False, default=str)
+    return f"id: {entry['id']}\nevent: {entry['event']}\ndata: {payload}\n\n"
+
+@app.get("/api/tasks/{task_id}/events")
+async def stream_task_events(task_id: str, request: Request):
+    """Stream task progress as Server-Sent Events (replays past events first)"""
+    task = task_executor.get_task(task_id)
+    if not task:
+        return JSONResponse(status_code=404, content={"error": "Task not found"})
+    
+    async def event_stream():
+        queue = task.subscribe()
+        try:
+            last_id = -1
+            for entry in list(task.events):
+                yield _format_sse(entry)
+                last_id = entry["id"]
+            if task.finished:
+                return
+            
+            while not await request.is_disconnected():
+                try:
+                    entry = await asyncio.wait_for(queue.get(), timeout=15.0)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if entry["id"] <= last_id:
+                    continue
+                yield _format_sse(entry)
+                last_id = entry["id"]
+                if entry["event"] in Task.TERMINAL_EVENTS:
+                    break
+        finally:
+            task.unsubscribe(queue)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/api/autonomous")
 async def autonomous_interface(
     message: str = Form(...),
     session_id: str = Form(None),
-    auto_execute: str = Form("false")
+    auto_execute: str = Form("false"),
+    priority: str = Form("normal"),
+    wait: str = Form("false")
+):
+    """Unified autonomous interface - intelligent planning + execution
+    
+    With auto_execute the plan runs on the task worker pool: the response is
+    202 with task_id and progress streams from /api/tasks/{task_id}/events.
+    Pass wait=true to block until the task finishes.
+    """
+    response = await _run_autonomous(message, session_id, auto_execute, priority, wait)
+    if "events_url" in response:
+        return JSONResponse(status_code=202, content=response)
+    return response
+
+@app.post("/api/autonomous/stream")
+async def autonomous_interface_stream(
+    request: Request,
+    message: str = Form(...),
+    session_id: str = Form(None),
+    auto_execute: str = Form("false"),
+    priority: str = Form("normal"),
+    wait: str = Form("false")
 ):
-    """Unified autonomous interface - intelligent planning + execution"""
+    """Streaming /api/autonomous: LLM answers arrive as "token" events, then a
+    "result" event carries the same body /api/autonomous would return.
+    Processing is cancelled when the client disconnects.
+    """
+    tokens: asyncio.Queue = asyncio.Queue()
+    run = asyncio.create_task(
+        _run_autonomous(message, session_id, auto_execute, priority, wait, on_token=tokens.put_nowait)
+    )
+    
+    async def event_stream():
+        try:
+            while True:
+                get_token = asyncio.ensure_future(tokens.get())
+                done, _ = await asyncio.wait({get_token, run}, timeout=15.0,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if get_token in done:
+                    yield format_sse("token", {"text": get_token.result()})
+                    continue
+                get_token.cancel()
+                if run in done:
+                    break
+                if await request.is_disconnected():
+                    return
+                yield ": keep-alive\n\n"
+            
+            while not tokens.empty():
+                yield format_sse("token", {"text": tokens.get_nowait()})
+            try:
+                yield format_sse("result", run.result())
+            except Exception as e:
+                yield format_sse("error", {"error": str(e) or type(e).__name__})
+        finally:
+            # Client went away (or stream closed early): stop the LLM call
+            if not run.done():
+                run.cancel()
+    
+    return _sse_response(event_stream())
+
+AUTONOMOUS_RAG_TOP_K = 3
+AUTONOMOUS_SIMILAR_TOP_K = 2
+
+AUTONOMOUS_RAG_TEMPLATE = """{history}На основе следующего контекста ответь на вопрос пользователя.
+
+Контекст:
+{context}
+
+Вопрос: {question}
+
+Дай краткий и понятный ответ на русском языке. Если в контексте нет релевантной информации, скажи что ты умеешь делать как AI система."""
+
+AUTONOMOUS_CHAT_TEMPLATE = """{history}Ты - автономная AI система. Ответь на вопрос пользователя кратко и по существу на русском языке.
+
+Вопрос: {question}
+
+Ответ:"""
+
+async def _autonomous_retrieval(message: str, phase_ms: dict) -> list:
+    """RAG documents for a message, fetched while the message is classified
+    
+    The same documents also yield similar past executions (see
+    _similar_executions), so one /query call serves both.
+    """
+    phase_start = time.perf_counter()
+    rag_context = []
+    try:
+        rag_data = await _rag_query(message, AUTONOMOUS_RAG_TOP_K, timeout=5.0)
+        rag_context = rag_data.get("documents", [])
+    except Exception:
+        pass
+    phase_ms["retrieval"] = (time.perf_counter() - phase_start) * 1000
+    return rag_context
+
+def _similar_executions(rag_context: list) -> list:
+    """execution_result documents among the top AUTONOMOUS_SIMILAR_TOP_K hits,
+    which are a prefix of the top AUTONOMOUS_RAG_TOP_K"""
+    similar_executions = []
+    try:
+        # Получаем похожие выполнения для обучения
+        from knowledge_store import knowledge_store
+        if knowledge_store:
+            similar_executions = knowledge_store.filter_executions(rag_context[:AUTONOMOUS_SIMILAR_TOP_K])
+            if similar_executions:
+                logger.debug("similar_executions_found", count=len(similar_executions))
+    except Exception:
+        pass
+    return similar_executions
+
+async def _run_autonomous(
+    message: str,
+    session_id: Optional[str],
+    auto_execute: str,
+    priority: str,
+    wait: str,
+    on_token: Optional[Callable[[str], None]] = None
+) -> dict:
+    """Body of /api/autonomous; on_token receives LLM answer fragments"""
     start_time = time.time()
     
     # Parse auto_execute string to boolean
     auto_execute_bool = auto_execute.lower() in ['true', '1', 'yes']
     
-    print(f"DEBUG autonomous: message='{message[:50]}...', auto_execute='{auto_execute}', auto_execute_bool={auto_execute_bool}")
+    logger.debug("autonomous_request", message=message[:50], auto_execute=auto_execute, auto_execute_bool=auto_execute_bool)
     
     # Create/get session
     if not session_id:
         session_id = conversation_manager.create_session()
-    session = conversation_manager.get_session(session_id) or conversation_manager.sessions[conversation_manager.create_session()]
+    session = conversation_manager.get_session(session_id)
+    if not session:
+        session_id = conversation_manager.create_session()
+        session = conversation_manager.get_session(session_id)
+    
+    phase_ms = {}  # wall time per phase, returned and recorded in metrics_store
     
-    # Phase 1: Intent Detection + Entity Extraction
+    # Phase 1: RAG context + similar executions in one round-trip. It only
+    # needs the message, so it is in flight during classification and drafting
+    retrieval = asyncio.create_task(_autonomous_retrieval(message, phase_ms))
+    await asyncio.sleep(0)  # let the request go out before the CPU-bound work
+    
+    # Phase 2: Intent Detection + Entity Extraction
+    phase_start = time.perf_counter()
     intent = conversation_manager.detect_intent(message)
     entities = conversation_manager.extract_entities(message)
-    
-    # Phase 2: Get RAG context + similar executions
-    rag_context = []
-    similar_executions = []
-    try:
-        resp = await http_client.post(
-            f"{SERVICES['rag']}/query",
-            json={"query": message, "top_k": 3},
-            timeout=5.0
-        )
-        rag_data = resp.json()
-        rag_context = rag_data.get("documents", [])
-        
-        # Получаем похожие выполнения для обучения
-        from knowledge_store import knowledge_store
-        if knowledge_store and intent in ["execute", "modify", "create"]:
-            similar_executions = await knowledge_store.query_similar_executions(message, http_client, top_k=2)
-            if similar_executions:
-                print(f"✓ Found {len(similar_executions)} similar past executions")
-    except:
-        pass
+    plan_wanted = intent in ["execute", "modify", "create"]
+    phase_ms["classify"] = (time.perf_counter() - phase_start) * 1000
     
     # Phase 3: Intelligent Planning with Adaptive Learning & Decision Making
     execution_plan = None
     adaptive_suggestions = None
     autonomous_decision = None
     
-    print(f"DEBUG Phase 3: intent='{intent}', checking if in ['execute', 'modify', 'create']")
+    logger.debug("planning", intent=intent)
     
-    if intent in ["execute", "modify", "create"]:
-        print("DEBUG: Creating execution plan...")
+    if plan_wanted:
+        phase_start = time.perf_counter()
         # Create task with intelligent decomposition
         task_obj = task_executor.create_task(message)
         steps = task_executor.decompose_task(message)
         
-        print(f"DEBUG: Steps created: {len(steps)} steps")
+        logger.debug("steps_created", steps=len(steps))
         
         # Get adaptive suggestions
         adaptive_suggestions = adaptive_planner.suggest_improvements(message, steps)
         
+        # Optimize steps based on learning
+        optimized_steps = adaptive_planner.optimize_steps(steps)
+        phase_ms["planning"] = (time.perf_counter() - phase_start) * 1000
+    
+    rag_context = await retrieval
+    similar_executions = _similar_executions(rag_context) if plan_wanted else []
+    
+    if plan_wanted:
+        phase_start = time.perf_counter()
         # Make autonomous decision
         decision_context = {
             "intent": intent,
@@ -936,10 +1255,7 @@ async def autonomous_interface(
         }
         autonomous_decision = decision_engine.make_decision(decision_context)
         
-        print(f"DEBUG: Autonomous decision: {autonomous_decision.action}")
-        
-        # Optimize steps based on learning
-        optimized_steps = adaptive_planner.optimize_steps(steps)
+        logger.debug("autonomous_decision", action=autonomous_decision.action)
         
         # Add safety steps if decision requires them
         if hasattr(autonomous_decision, 'safety_steps') and autonomous_decision.safety_steps:
@@ -963,37 +1279,40 @@ async def autonomous_interface(
             "autonomous_decision": autonomous_decision.to_dict()
         }
         
-        print(f"DEBUG: Execution plan created with {len(optimized_steps)} steps, requires_approval={execution_plan['requires_approval']}")
+        logger.debug("execution_plan", steps=len(optimized_steps), requires_approval=execution_plan["requires_approval"])
         
         # Predict failure points
         failure_predictions = predictive_engine.predict_failure_points(execution_plan)
         execution_plan["predicted_failure_points"] = failure_predictions
+        phase_ms["decision"] = (time.perf_counter() - phase_start) * 1000
     else:
-        print(f"DEBUG: Intent '{intent}' not in execution list, skipping plan creation")
+        logger.debug("plan_skipped", intent=intent)
     
     # Phase 4: Execution (if auto_execute and decision allows)
     task_result = None
     should_execute = auto_execute_bool and execution_plan
     
-    print(f"DEBUG Phase 4: auto_execute_bool={auto_execute_bool}, execution_plan={execution_plan is not None}, should_execute={should_execute}")
-    
     # Check autonomous decision
     if should_execute and autonomous_decision:
-        print(f"DEBUG: autonomous_decision.action={autonomous_decision.action}")
         if autonomous_decision.action == "require_approval":
             should_execute = False
-            print("DEBUG: Execution blocked - requires approval")
         elif autonomous_decision.action == "suggest_execute":
             # Execute but mark as suggested
-            print("DEBUG: Execution suggested")
             pass
     
-    print(f"DEBUG: Final should_execute={should_execute}")
+    logger.debug(
+        "execution_gate",
+        auto_execute=auto_execute_bool,
+        has_plan=execution_plan is not None,
+        decision=autonomous_decision.action if autonomous_decision else None,
+        should_execute=bool(should_execute)
+    )
+    
+    task_queued = False
+    pending_message = {}  # assistant message to update once the task finishes
     
     if should_execute:
-        task_obj.status = "running"
-        task_obj.started_at = datetime.now().isoformat()
-        
+        phase_start = time.perf_counter()
         # Use real execution engine
         execution_context = {
             "original_message": message,
@@ -1001,42 +1320,66 @@ async def autonomous_interface(
             "entities": entities
         }
         
-        results = await execution_engine.execute_task(optimized_steps, execution_context)
-        summary = execution_engine.get_execution_summary(results)
-        
-        # Record execution for adaptive learning
-        adaptive_planner.record_execution(message, optimized_steps, results, summary)
-        
-        # Record meta-learning event
-        learning_context = {
-            "task_type": adaptive_suggestions.get("pattern", "generic"),
-            "has_errors": summary.get("failed", 0) > 0,
-            "has_rag_context": len(rag_context) > 0
-        }
-        recommended_strategy = meta_learning_engine.recommend_learning_strategy(learning_context)
-        meta_learning_engine.record_learning_event(
-            recommended_strategy,
-            learning_context,
-            summary.get("status", "unknown")
-        )
+        async def run_autonomous_task(t: Task) -> dict:
+            results = await execution_engine.execute_task(
+                optimized_steps, execution_context, progress_callback=t.on_step_progress,
+                time_budget=t.step_budget()
+            )
+            summary = execution_engine.get_execution_summary(results)
+            
+            # Record execution for adaptive learning
+            adaptive_planner.record_execution(message, optimized_steps, results, summary)
+            
+            # Record meta-learning event
+            learning_context = {
+                "task_type": adaptive_suggestions.get("pattern", "generic"),
+                "has_errors": summary.get("failed", 0) > 0,
+                "has_rag_context": len(rag_context) > 0
+            }
+            recommended_strategy = meta_learning_engine.recommend_learning_strategy(learning_context)
+            meta_learning_engine.record_learning_event(
+                recommended_strategy,
+                learning_context,
+                summary.get("status", "unknown")
+            )
+            
+            t.status = summary["status"]
+            t.completed_at = datetime.now().isoformat()
+            t.result = results
+            result = {
+                **t.to_dict(),
+                "summary": summary
+            }
+            
+            # Автоматически сохраняем результат в базу знаний
+            from knowledge_store import knowledge_store
+            if knowledge_store and summary.get('success_rate', 0) >= 80:
+                # Сохраняем только успешные выполнения (>= 80%)
+                await knowledge_store.store_execution_result(result, message, http_client)
+                logger.info("execution_result_stored", success_rate=summary.get('success_rate'))
+            
+            # Attach the result to the session message for follow-up questions;
+            # if the reply is not written yet, Phase 6 attaches it
+            pending_message["result"] = result
+            if "message" in pending_message:
+                session.attach_task_result(pending_message["message"], result)
+                await asyncio.to_thread(conversation_manager.save_session, session)
+            
+            return result
         
-        task_obj.status = summary["status"]
-        task_obj.completed_at = datetime.now().isoformat()
-        task_obj.result = results
-        task_result = {
-            **task_obj.to_dict(),
-            "summary": summary
-        }
+        task_executor.submit(task_obj, run_autonomous_task, priority)
         
-        # Автоматически сохраняем результат в базу знаний
-        from knowledge_store import knowledge_store
-        if knowledge_store and summary.get('success_rate', 0) >= 80:
-            # Сохраняем только успешные выполнения (>= 80%)
-            await knowledge_store.store_execution_result(task_result, message, http_client)
-            print(f"✓ Execution result stored in knowledge base")
+        if wait.lower() in ['true', '1', 'yes']:
+            await task_executor.wait(task_obj.task_id)
+            task_result = task_obj.job_result
+        else:
+            task_queued = True
+        phase_ms["execution"] = (time.perf_counter() - phase_start) * 1000
     
     # Phase 5: Generate Response with context awareness
+    phase_start = time.perf_counter()
     response_text = ""
+    llm_turn = None  # (turn, result) of an LLM answer, for session context reuse
     if task_result:
         summary = task_result.get("summary", {})
         successful_steps = summary.get("successful", 0)
@@ -1053,6 +1396,8 @@ async def autonomous_interface(
         if any('create' in step['step'].lower() or 'generate' in step['step'].lower() for step in task_result.get('result', [])):
             response_text += f"\n💾 Результаты сохранены. Task ID: {task_result['task_id']}"
             
+    elif task_queued:
+        response_text = f"⏳ Задача поставлена в очередь: {len(execution_plan['steps'])} шагов. Task ID: {task_obj.task_id}"
     elif execution_plan:
         response_text = f"📋 План готов: {len(execution_plan['steps'])} шагов. Включите Auto-Execute для выполнения."
     else:
@@ -1076,45 +1421,25 @@ async def autonomous_interface(
         elif rag_context:
             # Используем LLM для генерации ответа на основе контекста
             try:
-                # Формируем контекст из найденных документов
-                context_text = "\n\n".join([
-                    f"Документ {i+1}: {doc.get('content', '')[:500]}"
-                    for i, doc in enumerate(rag_context[:3])
-                ])
-                
-                # Генерируем ответ через Ollama
-                prompt = f"""На основе следующего контекста ответь на вопрос пользователя.
-
-Контекст:
-{context_text}
-
-Вопрос: {message}
-
-Дай краткий и понятный ответ на русском языке. Если в контексте нет релевантной информации, скажи что ты умеешь делать как AI система."""
-                
-                ollama_response = await http_client.post(
-                    f"{SERVICES['ollama']}/api/generate",
-                    json={
-                        "model": "qwen2.5-coder:7b",
-                        "prompt": prompt,
-                        "stream": False
-                    },
-                    timeout=30.0
+                # Потоковая генерация: фрагменты уходят в on_token по мере готовности
+                # Каскад model_router: малая модель, при слабом ответе - 7B.
+                # Если сессия хранит контекст Ollama, отправляется только новый ход;
+                # документы укладываются в бюджет токенов, ближайшие первыми
+                from model_router import model_router
+                turn = conversation_manager.build_turn(
+                    session, AUTONOMOUS_RAG_TEMPLATE,
+                    documents=rag_context, doc_format="Документ {n}: {content}", question=message
                 )
+                llm_result = await model_router.generate_local(turn["prompt"], on_token=on_token, kv=turn["kv"])
+                llm_turn = (turn, llm_result)
+                response_text = llm_result.get('content', '').strip() if llm_result.get('success') else ''
                 
-                if ollama_response.status_code == 200:
-                    ollama_data = ollama_response.json()
-                    response_text = ollama_data.get('response', '').strip()
-                    
-                    # Если ответ пустой или слишком короткий, используем fallback
-                    if not response_text or len(response_text) < 20:
-                        response_text = f"На основе базы знаний: {rag_context[0].get('content', '')[:200]}... (Найдено {len(rag_context)} документов)"
-                else:
-                    # Fallback если Ollama недоступен
+                # Если ответ пустой или слишком короткий, используем fallback
+                if not response_text or len(response_text) < 20:
                     response_text = f"На основе базы знаний: {rag_context[0].get('content', '')[:200]}... (Найдено {len(rag_context)} документов)"
                     
             except Exception as e:
-                print(f"Error generating LLM response: {e}")
+                logger.error("llm_response_failed", intent=intent, rag_used=True, error=str(e))
                 # Fallback на простой ответ
                 response_text = f"На основе базы знаний: {rag_context[0].get('content', '')[:200]}... (Найдено {len(rag_context)} документов)"
         else:
@@ -1152,51 +1477,53 @@ async def autonomous_interface(
 Попробуйте задать конкретную задачу!"""
                 else:
                     # Общий вопрос - используем LLM
-                    prompt = f"""Ты - автономная AI система. Ответь на вопрос пользователя кратко и по существу на русском языке.
-
-Вопрос: {message}
-
-Ответ:"""
-                    
-                    ollama_response = await http_client.post(
-                        f"{SERVICES['ollama']}/api/generate",
-                        json={
-                            "model": "qwen2.5-coder:7b",
-                            "prompt": prompt,
-                            "stream": False
-                        },
-                        timeout=30.0
-                    )
+                    from model_router import model_router
+                    turn = conversation_manager.build_turn(session, AUTONOMOUS_CHAT_TEMPLATE, question=message)
+                    llm_result = await model_router.generate_local(turn["prompt"], on_token=on_token, kv=turn["kv"])
+                    llm_turn = (turn, llm_result)
+                    response_text = llm_result.get('content', '').strip() if llm_result.get('success') else ''
                     
-                    if ollama_response.status_code == 200:
-                        ollama_data = ollama_response.json()
-                        response_text = ollama_data.get('response', '').strip()
-                        
-                        if not response_text or len(response_text) < 10:
-                            response_text = f"Понял ваш запрос ({intent}). Система готова к работе с 6 уровнями автономности."
-                    else:
+                    if not response_text or len(response_text) < 10:
                         response_text = f"Понял ваш запрос ({intent}). Система готова к работе с 6 уровнями автономности."
                         
             except Exception as e:
-                print(f"Error generating LLM response: {e}")
+                logger.error("llm_response_failed", intent=intent, rag_used=False, error=str(e))
                 response_text = f"Понял ваш запрос ({intent}). Система готова к работе с 6 уровнями автономности."
     
+    phase_ms["response"] = (time.perf_counter() - phase_start) * 1000
+    
     # Phase 6: Save to session
+    phase_start = time.perf_counter()
     session.add_message("user", message, {
         "intent": intent,
         "entities": entities,
         "rag_context_count": len(rag_context)
     })
-    session.add_message("assistant", response_text, {
+    assistant_message = session.add_message("assistant", response_text, {
         "rag_used": len(rag_context) > 0,
         "task_executed": task_result is not None,
         "execution_plan": execution_plan,
         "task_result": task_result  # Сохраняем результаты выполнения для контекста
     })
+    if llm_turn:
+        turn, llm_result = llm_turn
+        # Контекст годен для следующего хода, только если сохранён сгенерированный ответ
+        answered = llm_result.get("success") and response_text == llm_result.get("content", "").strip()
+        conversation_manager.record_turn(session, turn, llm_result, answered)
+    if task_queued:
+        # До записи сессии: задача, завершившаяся во время сохранения, должна найти сообщение
+        pending_message["message"] = assistant_message
+        if "result" in pending_message:
+            session.attach_task_result(assistant_message, pending_message["result"])
+    await asyncio.to_thread(conversation_manager.save_session, session)
+    phase_ms["session"] = (time.perf_counter() - phase_start) * 1000
+    
+    for phase, ms in phase_ms.items():
+        metrics_store.record_phase("autonomous", phase, ms)
     
     latency = (time.time() - start_time) * 1000
     
-    return {
+    response = {
         "session_id": session_id,
         "response": response_text,
         "intent": intent,
@@ -1205,6 +1532,7 @@ async def autonomous_interface(
         "execution_plan": execution_plan,
         "task_result": task_result,
         "latency_ms": round(latency, 2),
+        "phase_ms": {phase: round(ms, 2) for phase, ms in phase_ms.items()},
         "capabilities": {
             "conversational": True,
             "task_execution": True,
@@ -1213,6 +1541,13 @@ async def autonomous_interface(
             "context_aware": len(rag_context) > 0
         }
     }
+    
+    if task_queued:
+        response["task_id"] = task_obj.task_id
+        response["task_status"] = task_obj.status
+        response["events_url"] = f"/api/tasks/{task_obj.task_id}/events"
+    
+    return response
 
 @app.get("/api/metrics/insights")
 async def get_metrics_insights():
@@ -1235,11 +1570,7 @@ async def combined_query(request: Request, query: str = Form(...), top_k: int =
     
     try:
         # Query RAG
-        rag_resp = await http_client.post(
-            f"{SERVICES['rag']}/query",
-            json={"query": query, "top_k": top_k}
-        )
-        rag_data = rag_resp.json()
+        rag_data = await _rag_query(query, top_k)
         services_used.append("rag")
         
         # If query mentions architecture, also check arch engine
@@ -1308,22 +1639,22 @@ async def execute_auto_action(action_type: str = Form(...), service: str = Form(
             }
         
         elif action_type == "increase_memory":
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                propose_resp = await client.post(
-                    f"{SERVICES['arch']}/arch/propose",
-                    json={"prompt": f"Increase {service} memory to 4G", "auto_apply": False}
-                )
-                propose_data = propose_resp.json()
+            propose_resp = await http_client.post(
+                f"{SERVICES['arch']}/arch/propose",
+                json={"prompt": f"Increase {service} memory to 4G", "auto_apply": False},
+                timeout=10.0
+            )
+            propose_data = propose_resp.json()
             
             if "error" in propose_data or not propose_data.get("safe"):
                 return {"status": "unsafe", "error": "Memory increase failed safety checks"}
             
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                apply_resp = await client.post(
-                    f"{SERVICES['arch']}/arch/apply",
-                    json={"change_id": propose_data["change_id"], "confirm": True}
-                )
-                apply_data = apply_resp.json()
+            apply_resp = await http_client.post(
+                f"{SERVICES['arch']}/arch/apply",
+                json={"change_id": propose_data["change_id"], "confirm": True},
+                timeout=10.0
+            )
+            apply_data = apply_resp.json()
             
             action = {
                 "type": "increase_memory",
@@ -1450,7 +1781,12 @@ async def get_model_stats():
     from model_router import model_router
     return {
         "stats": model_router.get_stats(),
-        "external_configured": bool(model_router.external_qwen_url)
+        "external_configured": bool(model_router.external_qwen_url),
+        "http_pools": http_clients.get_stats(),
+        "streaming": stream_metrics.get_stats(),
+        "scheduler": ollama_scheduler.get_stats(),
+        "ollama_models": ollama_models.get_stats(),
+        "prompts": prompt_builder.get_stats()
     }
 
 @app.post("/api/models/clear-cache")
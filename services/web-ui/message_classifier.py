@@ -0,0 +1,242 @@
+"""
+Message Classifier - One keyword scan per message for intent, entities,
+risk flags, task pattern and step template
+"""
+import re
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List
+
+# Keyword tables (EN + RU). Matching is plain substring matching on the
+# lowercased message, the same semantics as the `word in message_lower`
+# loops these tables replace.
+KEYWORD_TABLES: Dict[str, List[str]] = {
+    # ConversationManager.detect_intent
+    "creation": ["create", "generate", "write", "build", "make",
+                 "создать", "создай", "сгенерировать", "написать", "напиши", "сделать", "сделай"],
+    "creative_target": ["code", "program", "script", "game", "app", "calculator",
+                        "function", "class", "tic-tac-toe", "file", "project", "python",
+                        "код", "программ", "скрипт", "игр", "приложение", "калькулятор",
+                        "функци", "класс", "файл", "проект", "питон"],
+    "safe_zone": ["playground/", "generated/", "experiments/", "tic-tac-toe/", "demos/", "examples/"],
+    "save": ["save"],
+    "action": ["check", "test", "run", "execute", "perform", "start", "stop",
+               "restart", "deploy", "rollback", "apply", "fix", "debug", "play",
+               "проверь", "тест", "запусти", "выполни", "исполни", "старт", "стоп",
+               "перезапусти", "примени", "исправь", "отладь", "играть"],
+    "play": ["play"],
+    "modification": ["add", "setup", "configure", "install",
+                     "update", "modify", "change", "remove", "delete"],
+    "analysis": ["analyze", "inspect", "review", "investigate", "examine",
+                 "diagnose", "profile", "measure"],
+
+    # ConversationManager.extract_entities
+    "services": ["rag", "ollama", "arch", "redis", "postgres", "mongodb", "nginx"],
+    "actions": ["optimize", "scale", "monitor", "backup", "restore", "migrate"],
+    "metrics": ["latency", "throughput", "memory", "cpu", "disk", "network"],
+    "technologies": ["docker", "kubernetes", "python", "fastapi", "flask"],
+
+    # DecisionEngine.make_decision
+    "high_risk": ["delete", "drop", "remove", "modify_production"],
+    "code_creation": ["script", "code", "program", "game", "app", "function",
+                      "скрипт", "код", "программ", "игр", "приложение", "функци"],
+    "dangerous_target": ["production", "system", "config", "/etc/", "/var/", "docker-compose",
+                         "продакшн", "система", "конфиг"],
+
+    # AdaptivePlanner._extract_pattern
+    "p_health": ["health", "check"],
+    "p_add": ["add", "create"],
+    "p_cache": ["redis", "cache"],
+    "p_service": ["service"],
+    "p_modify": ["update", "modify"],
+    "p_production": ["production", "database", "schema"],
+    "p_optimize": ["optimize", "improve"],
+    "p_analyze": ["analyze"],
+    "p_debug": ["fix", "debug"],
+
+    # TaskExecutor.decompose_task
+    "t_code_verb": ["create", "generate", "write", "build"],
+    "t_code_target": ["code", "program", "script", "game", "calculator", "app", "tic-tac-toe"],
+    "t_health": ["health", "status"],
+    "t_latency": ["latency", "performance"],
+    "t_analysis": ["analyze", "investigate"],
+    "t_deploy": ["deploy", "rollout"]
+}
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """Regex alternation factored as a prefix trie ("app", "apply" -> "app(?:ly)?")
+
+    Optional tails are greedy, so at each position the longest keyword wins.
+    """
+    trie: Dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """Every keyword occurring in a text, from one pass of a compiled regex
+
+    A zero-width lookahead tries the trie pattern at each position and
+    yields the longest keyword starting there; the shorter keywords that
+    also start there are exactly its keyword prefixes, precomputed.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        keywords = set(keywords)
+        self._pattern = re.compile(f"(?=({_trie_pattern(keywords)}))")
+        self._prefixes = {
+            keyword: frozenset(other for other in keywords if keyword.startswith(other))
+            for keyword in keywords
+        }
+
+    def find(self, text: str) -> FrozenSet[str]:
+        found = set()
+        for match in self._pattern.finditer(text):
+            if match.group(1):
+                found |= self._prefixes[match.group(1)]
+        return frozenset(found)
+
+
+class MessageClassifier:
+    """
+    Intent, entities, risk flags, task pattern and step template of a
+    message from a single scan of one combined keyword regex.
+
+    The scan result of recent messages is kept in an LRU, so the several
+    callers classifying the same request (intent detection, planning,
+    decision making, decomposition) pay for one scan.
+    """
+
+    def __init__(self, tables: Dict[str, List[str]], cache_size: int = 1024):
+        self.tables = tables
+        self._sets = {name: frozenset(words) for name, words in tables.items()}
+        self._matcher = KeywordMatcher(word for words in tables.values() for word in words)
+        self._scan = lru_cache(maxsize=cache_size)(self._matcher.find)
+
+    def hits(self, message: str) -> FrozenSet[str]:
+        """Every table keyword contained in the lowercased message"""
+        return self._scan(message.lower())
+
+    def _any(self, hits: FrozenSet[str], table: str) -> bool:
+        return not hits.isdisjoint(self._sets[table])
+
+    def _in_order(self, hits: FrozenSet[str], table: str) -> List[str]:
+        return [word for word in self.tables[table] if word in hits]
+
+    def intent(self, message: str) -> str:
+        """create / execute / modify / analyze / query"""
+        hits = self.hits(message)
+        has_creation = self._any(hits, "creation")
+        has_safe_zone = self._any(hits, "safe_zone")
+
+        # Creating code/content, or saving into a safe zone
+        if (has_creation and (self._any(hits, "creative_target") or has_safe_zone)) or \
+                ("save" in hits and has_safe_zone):
+            return "create"
+        if self._any(hits, "action"):
+            # "play" right after creating something is still creation
+            if "play" in hits and has_creation:
+                return "create"
+            return "execute"
+        if self._any(hits, "modification"):
+            return "modify"
+        if self._any(hits, "analysis"):
+            return "analyze"
+        # Questions and everything else
+        return "query"
+
+    def entities(self, message: str) -> Dict[str, List[str]]:
+        hits = self.hits(message)
+        return {table: self._in_order(hits, table) for table in ("services", "actions", "metrics", "technologies")}
+
+    def risk(self, message: str) -> Dict[str, bool]:
+        hits = self.hits(message)
+        return {
+            "high_risk": self._any(hits, "high_risk"),
+            "safe_zone": self._any(hits, "safe_zone"),
+            "code_creation": self._any(hits, "code_creation"),
+            "dangerous_target": self._any(hits, "dangerous_target")
+        }
+
+    def pattern(self, message: str) -> str:
+        """Task pattern AdaptivePlanner learns success rates for"""
+        hits = self.hits(message)
+        if self._any(hits, "p_health"):
+            return "health_check"
+        if self._any(hits, "p_add"):
+            if self._any(hits, "p_cache") or self._any(hits, "p_service"):
+                return "add_service"
+            return "create_resource"
+        if self._any(hits, "p_modify"):
+            if self._any(hits, "p_production"):
+                return "modify_production"
+            return "modify_config"
+        if self._any(hits, "p_optimize"):
+            return "optimization"
+        if self._any(hits, "p_analyze"):
+            return "analysis"
+        if self._any(hits, "p_debug"):
+            return "debugging"
+        return "generic"
+
+    def step_template(self, message: str) -> str:
+        """STEP_TEMPLATES key TaskExecutor.decompose_task uses"""
+        hits = self.hits(message)
+        if self._any(hits, "t_code_verb") and self._any(hits, "t_code_target"):
+            return "code_creation"
+        if self._any(hits, "t_health"):
+            return "health"
+        if self._any(hits, "p_optimize"):
+            return "optimize_latency" if self._any(hits, "t_latency") else "optimize_generic"
+        if self._any(hits, "p_add"):
+            if "service" in hits:
+                return "add_service"
+            if self._any(hits, "p_cache"):
+                return "add_cache"
+            return "add_generic"
+        if self._any(hits, "p_debug"):
+            return "debug"
+        if self._any(hits, "t_analysis"):
+            return "analysis"
+        if self._any(hits, "t_deploy"):
+            return "deploy"
+        return "generic"
+
+    def classify(self, message: str) -> Dict:
+        """Everything at once (one scan)"""
+        return {
+            "intent": self.intent(message),
+            "entities": self.entities(message),
+            "risk": self.risk(message),
+            "pattern": self.pattern(message),
+            "step_template": self.step_template(message)
+        }
+
+    def get_stats(self) -> Dict:
+        info = self._scan.cache_info()
+        lookups = info.hits + info.misses
+        return {
+            "keywords": sum(len(words) for words in self.tables.values()),
+            "cache_size": info.currsize,
+            "cache_max": info.maxsize,
+            "cache_hits": info.hits,
+            "cache_misses": info.misses,
+            "hit_rate": round(info.hits / lookups * 100, 1) if lookups else 0.0
+        }
+
+
+# Global classifier shared by ConversationManager, DecisionEngine,
+# AdaptivePlanner and TaskExecutor
+message_classifier = MessageClassifier(KEYWORD_TABLES)
@@ -13,6 +13,7 @@ class MetricsStore:
     def __init__(self):
         self.queries = []  # All queries
         self.latencies = defaultdict(list)  # Service latencies
+        self.phase_latencies = defaultdict(list)  # "endpoint.phase" -> recent ms
         self.errors = defaultdict(int)  # Error counts
         self.patterns = defaultdict(int)  # Query patterns
         self.suggestions_history = []  # Suggestion outcomes
@@ -58,6 +59,27 @@ class MetricsStore:
             if len(word) > 3:  # Ignore short words
                 self.patterns[word] += 1
     
+    def record_phase(self, endpoint: str, phase: str, latency_ms: float):
+        """Record the wall time of one phase of a request pipeline"""
+        key = f"{endpoint}.{phase}"
+        self.phase_latencies[key].append(latency_ms)
+        if len(self.phase_latencies[key]) > 100:
+            self.phase_latencies[key] = self.phase_latencies[key][-100:]
+    
+    def get_phase_stats(self) -> Dict:
+        """Average, p95 and max of recent phase timings"""
+        stats = {}
+        for key, lats in self.phase_latencies.items():
+            if lats:
+                ordered = sorted(lats)
+                stats[key] = {
+                    "count": len(lats),
+                    "avg_ms": round(sum(lats) / len(lats), 2),
+                    "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+                    "max_ms": round(ordered[-1], 2)
+                }
+        return stats
+    
     def get_stats(self) -> Dict:
         """Get current statistics"""
         total_queries = len(self.queries)
@@ -83,7 +105,8 @@ class MetricsStore:
             "avg_latencies": avg_latencies,
             "errors": dict(self.errors),
             "top_patterns": dict(top_patterns),
-            "recent_queries": recent
+            "recent_queries": recent,
+            "phase_latencies": self.get_phase_stats()
         }
     
     def analyze_performance(self) -> Dict:
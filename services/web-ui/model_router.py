@@ -4,9 +4,36 @@ Model Router - Intelligent routing between local and external models
 import httpx
 from typing import Dict, Optional, List
 from datetime import datetime
+import asyncio
 import os
+import re
+import time
+
+from app_logging import get_logger
+from backend_stats import BackendStats
+from code_generator import CodeGenerator
+from http_clients import http_clients
+from llm_stream import TokenCallback, complete
+from ollama_scheduler import OllamaOverloadedError
+from response_cache import ResponseCache
+from singleflight import singleflight
+
+logger = get_logger("model_router")
 
 class ModelRouter:
+    LOCAL_MODEL = "qwen2.5-coder:7b"
+    EXTERNAL_MODEL = "qwen-coder-plus"
+    MIN_ROUTING_SAMPLES = 5  # Ниже - маршрутизация по эвристикам промпта
+    
+    # Каскад: ответы малой модели, похожие на отказ, не принимаются
+    REFUSAL_PATTERN = re.compile(
+        r"i(?:'m| am) sorry|i can(?:not|'t) (?:help|assist|do)|as an ai|i don't know|"
+        r"не могу (?:помочь|ответить|выполнить)|извините, (?:но )?я не|я не знаю",
+        re.IGNORECASE
+    )
+    CODE_BLOCK_PATTERN = re.compile(r"```(?:python|py)?\s*\n(.*?)```", re.DOTALL)
+    CASCADE_MIN_CHARS = 20
+    
     def __init__(self):
         self.local_ollama_url = os.getenv("OLLAMA_URL", "http://ollama:11434")
         self.external_qwen_url = os.getenv("QWEN_API_URL", "")
@@ -17,88 +44,154 @@ class ModelRouter:
             "local": {"calls": 0, "total_time": 0, "errors": 0},
             "external": {"calls": 0, "total_time": 0, "errors": 0}
         }
+        # Скользящее окно: EWMA латентности, p95 и доля ошибок по бэкендам
+        self.backend_stats = {"local": BackendStats(), "external": BackendStats()}
+        
+        # Хеджирование: если основной бэкенд не ответил за свой p95 - запрос во второй
+        self.hedging_enabled = os.getenv("MODEL_HEDGING", "false").lower() == "true"
+        self.hedges = 0
+        self.hedge_wins = 0
         
-        # Кэш для частых запросов
-        self.cache = {}
-        self.cache_hits = 0
-        self.cache_misses = 0
+        # Каскад: сначала малая локальная модель, 7B - только если ответ не прошёл проверку
+        self.cascade_enabled = os.getenv("MODEL_CASCADE", "false").lower() == "true"
+        self.cascade_small_model = os.getenv("MODEL_CASCADE_SMALL", "qwen2.5-coder:1.5b")
+        self.code_validator = CodeGenerator()  # только validate_code, без сети
+        self.cascade_stats = {
+            "small": {"calls": 0, "accepted": 0, "total_time": 0.0, "rejections": {}},
+            "large": {"calls": 0, "total_time": 0.0},
+            "saved_time": 0.0
+        }
+        
+        # Кэш ответов: LRU по размеру + TTL, детерминированные ответы - ещё и в sqlite
+        self.response_cache = ResponseCache(
+            max_bytes=int(os.getenv("MODEL_CACHE_MAX_BYTES", str(16 * 1024 * 1024))),
+            default_ttl=float(os.getenv("MODEL_CACHE_TTL", "3600")),
+            db_path=os.getenv("MODEL_CACHE_DB") or None
+        )
+        self.persist_ttl = float(os.getenv("MODEL_CACHE_PERSIST_TTL", str(7 * 24 * 3600)))
     
     def should_use_external(self, prompt: str, context: Dict = None) -> bool:
         """Определить, использовать ли внешнюю модель"""
         if not self.external_qwen_url:
             return False
         
-        # Критерии для использования внешней модели:
+        # Критичные операции
+        if context and context.get("priority") == "high":
+            return True
+        
+        # Когда по обоим бэкендам есть статистика - выбираем меньшее ожидаемое
+        # время до успешного ответа для промпта такого размера
+        local, external = self.backend_stats["local"], self.backend_stats["external"]
+        if local.samples >= self.MIN_ROUTING_SAMPLES and external.samples >= self.MIN_ROUTING_SAMPLES:
+            return external.cost_ms(len(prompt)) < local.cost_ms(len(prompt))
+        
+        # Иначе - эвристики:
         
         # 1. Сложные задачи (длинный промпт)
         if len(prompt) > 500:
             return True
         
-        # 2. Критичные операции
-        if context and context.get("priority") == "high":
-            return True
-        
-        # 3. Если локальная модель часто ошибается
-        local_error_rate = self.usage_stats["local"]["errors"] / max(self.usage_stats["local"]["calls"], 1)
-        if local_error_rate > 0.3:  # > 30% ошибок
+        # 2. Если локальная модель часто ошибается (в последнем окне)
+        if local.error_rate() > 0.3:  # > 30% ошибок
             return True
         
-        # 4. Ключевые слова сложности
+        # 3. Ключевые слова сложности
         complex_keywords = ["refactor", "optimize", "architecture", "design pattern", "security"]
         if any(keyword in prompt.lower() for keyword in complex_keywords):
             return True
         
         return False
     
-    async def generate(self, prompt: str, context: Dict = None, http_client: httpx.AsyncClient = None) -> Dict:
-        """Генерация с автоматическим выбором модели"""
-        import time
-        
-        # Проверка кэша
-        cache_key = self._get_cache_key(prompt)
-        if cache_key in self.cache:
-            self.cache_hits += 1
-            print(f"✓ Cache hit for prompt (total hits: {self.cache_hits})")
-            return self.cache[cache_key]
-        
-        self.cache_misses += 1
+    async def generate(
+        self,
+        prompt: str,
+        context: Dict = None,
+        http_client: httpx.AsyncClient = None,
+        on_token: Optional[TokenCallback] = None,
+        options: Optional[Dict] = None,
+        priority: str = "codegen"
+    ) -> Dict:
+        """Генерация с автоматическим выбором модели
         
+        По умолчанию запросы идут через общие пулы http_clients;
+        http_client нужен только для явной подмены клиента.
+        on_token получает фрагменты текста по мере генерации.
+        options передаются в Ollama; при temperature=0 или
+        context["deterministic"] ответ сохраняется и между перезапусками.
+        priority - класс очереди ollama_scheduler (interactive/codegen/background).
+        context["kind"] ("code" или "chat") выбирает проверки каскада.
+        """
+        kind = (context or {}).get("kind", "text")
         # Выбор модели
         use_external = self.should_use_external(prompt, context)
         model_type = "external" if use_external else "local"
+        model_name = self.EXTERNAL_MODEL if use_external else self.LOCAL_MODEL
         
-        print(f"🤖 Using {model_type} model for generation")
+        # Проверка кэша (ключ: ответившая модель + параметры + промпт).
+        # С каскадом ответ могла дать и малая модель - её запись тоже подходит
+        answer_models = [model_name]
+        if not use_external and self.cascade_enabled:
+            answer_models = [self.cascade_small_model, self.LOCAL_MODEL]
+        cache_key = ResponseCache.make_key(model_name, options, prompt)
+        cached = self.response_cache.get_any(
+            [ResponseCache.make_key(m, options, prompt) for m in answer_models]
+        )
+        if cached is not None:
+            logger.debug("cache_hit", model=cached.get("model_name", model_name))
+            if on_token:
+                on_token(cached.get("content", ""))
+            return cached
         
-        start_time = time.time()
+        logger.debug("generate_routed", backend=model_type, model=model_name)
         
-        try:
-            if use_external:
-                result = await self._generate_external(prompt, http_client)
+        async def call() -> Dict:
+            # Хеджирование несовместимо с потоковой выдачей: токены двух моделей смешались бы
+            if self.hedging_enabled and self.external_qwen_url and not on_token \
+                    and self.backend_stats[model_type].samples >= self.MIN_ROUTING_SAMPLES:
+                result = await self._generate_hedged(model_type, prompt, http_client, options, priority, kind)
             else:
-                result = await self._generate_local(prompt, http_client)
-            
-            duration = time.time() - start_time
-            self.usage_stats[model_type]["calls"] += 1
-            self.usage_stats[model_type]["total_time"] += duration
+                result = await self._call_backend(model_type, prompt, http_client, on_token, options, priority, kind)
+            # Токены контекста Ollama нужны только сессиям чата (generate_local)
+            result.pop("context", None)
+            return result
+        
+        try:
+            # Одинаковые одновременные запросы (тот же ключ кэша) ждут один вызов;
+            # присоединившийся получает текст целиком, как при попадании в кэш
+            result, coalesced = await singleflight.do(
+                "ollama" if model_type == "local" else "external", "generate", cache_key, call
+            )
+            if coalesced and on_token and result.get("success"):
+                on_token(result.get("content", ""))
             
-            # Кэшируем успешный результат
-            if result.get("success"):
-                self.cache[cache_key] = result
-                # Ограничиваем размер кэша
-                if len(self.cache) > 100:
-                    # Удаляем самый старый
-                    self.cache.pop(next(iter(self.cache)))
+            # Кэшируем успешный результат (один раз - его записал первый вызов)
+            # под моделью, которая ответила: малой каскада, 7B или внешней
+            if result.get("success") and not coalesced:
+                deterministic = bool((options or {}).get("temperature") == 0 or (context or {}).get("deterministic"))
+                self.response_cache.put(
+                    ResponseCache.make_key(result.get("model_name", model_name), options, prompt), result,
+                    ttl=self.persist_ttl if deterministic else None,
+                    persist=deterministic
+                )
             
             return result
             
+        except OllamaOverloadedError as e:
+            # Сброс нагрузки - не ошибка модели, в error rate не учитываем
+            logger.warning("generate_shed", backend=model_type, error=str(e))
+            return {
+                "success": False,
+                "error": str(e),
+                "model": model_type,
+                "shed": True
+            }
         except Exception as e:
-            self.usage_stats[model_type]["errors"] += 1
-            print(f"✗ {model_type} model error: {e}")
+            logger.error("generate_failed", backend=model_type, error=str(e))
             
             # Fallback на другую модель
             if use_external and self.local_ollama_url:
-                print("🔄 Falling back to local model")
-                return await self._generate_local(prompt, http_client)
+                logger.warning("generate_fallback", backend="local")
+                return await self._call_backend("local", prompt, http_client, on_token, options, priority, kind)
             
             return {
                 "success": False,
@@ -106,40 +199,202 @@ class ModelRouter:
                 "model": model_type
             }
     
-    async def _generate_local(self, prompt: str, http_client: httpx.AsyncClient) -> Dict:
-        """Генерация через локальную Ollama"""
-        if not http_client:
-            http_client = httpx.AsyncClient()
+    async def _call_backend(
+        self,
+        model_type: str,
+        prompt: str,
+        http_client: httpx.AsyncClient,
+        on_token: Optional[TokenCallback],
+        options: Optional[Dict],
+        priority: str,
+        kind: str = "text"
+    ) -> Dict:
+        """Один вызов бэкенда с учётом латентности и ошибок"""
+        start_time = time.time()
+        try:
+            if model_type == "external":
+                result = await self._generate_external(prompt, http_client)
+                if on_token and result.get("success"):
+                    on_token(result["content"])
+            elif self.cascade_enabled:
+                result = await self._generate_cascade(prompt, http_client, on_token, options, priority, kind)
+            else:
+                result = await self._generate_local(prompt, http_client, on_token, options, priority)
+        except (OllamaOverloadedError, asyncio.CancelledError):
+            # Сброс нагрузки и отменённый хедж - не характеристика бэкенда
+            raise
+        except Exception:
+            self.usage_stats[model_type]["errors"] += 1
+            self.backend_stats[model_type].record(len(prompt), (time.time() - start_time) * 1000, False)
+            raise
+        
+        duration = time.time() - start_time
+        self.usage_stats[model_type]["calls"] += 1
+        self.usage_stats[model_type]["total_time"] += duration
+        self.backend_stats[model_type].record(len(prompt), duration * 1000, bool(result.get("success")))
+        return result
+    
+    async def _generate_hedged(
+        self,
+        primary: str,
+        prompt: str,
+        http_client: httpx.AsyncClient,
+        options: Optional[Dict],
+        priority: str,
+        kind: str = "text"
+    ) -> Dict:
+        """Запрос в основной бэкенд; если он не ответил за свой p95 -
+        параллельно во второй, берём первый успешный ответ"""
+        secondary = "local" if primary == "external" else "external"
+        hedge_delay = self.backend_stats[primary].p95_ms() / 1000
         
-        response = await http_client.post(
-            f"{self.local_ollama_url}/api/generate",
-            json={
-                "model": "qwen2.5-coder:7b",
-                "prompt": prompt,
-                "stream": False
-            },
-            timeout=60.0
+        primary_task = asyncio.create_task(
+            self._call_backend(primary, prompt, http_client, None, options, priority, kind)
         )
+        done, _ = await asyncio.wait({primary_task}, timeout=hedge_delay)
+        if done:
+            return primary_task.result()
         
-        if response.status_code == 200:
-            data = response.json()
+        self.hedges += 1
+        logger.debug("generate_hedged", primary=primary, secondary=secondary, delay_s=round(hedge_delay, 2))
+        hedge_task = asyncio.create_task(
+            self._call_backend(secondary, prompt, http_client, None, options, priority, kind)
+        )
+        pending = {primary_task, hedge_task}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and task.result().get("success"):
+                        if task is hedge_task:
+                            self.hedge_wins += 1
+                        return task.result()
+            # Оба не справились - отдаём результат (или ошибку) основного
+            return primary_task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    async def generate_local(
+        self,
+        prompt: str,
+        on_token: Optional[TokenCallback] = None,
+        priority: str = "interactive",
+        kind: str = "chat",
+        kv: Optional[Dict] = None
+    ) -> Dict:
+        """Локальная генерация без выбора бэкенда (через каскад, если он включён)
+        
+        kv = {"model", "context"} - контекст прошлого хода сессии: генерация
+        продолжается той же моделью, prompt содержит только новый ход.
+        Результат несёт "context" для следующего хода.
+        """
+        if kv:
+            return await self._generate_local(
+                prompt, None, on_token, None, priority, model=kv["model"], context=kv["context"]
+            )
+        if self.cascade_enabled:
+            return await self._generate_cascade(prompt, None, on_token, None, priority, kind)
+        return await self._generate_local(prompt, None, on_token, None, priority)
+    
+    def _cascade_rejection(self, content: str, kind: str) -> Optional[str]:
+        """Причина отклонить ответ малой модели (None - ответ принят)"""
+        text = content.strip()
+        if len(text) < self.CASCADE_MIN_CHARS:
+            return "too_short"
+        if self.REFUSAL_PATTERN.search(text[:300]):
+            return "refusal"
+        if kind == "code":
+            blocks = self.CODE_BLOCK_PATTERN.findall(text)
+            code = blocks[0] if blocks else text
+            if not self.code_validator.validate_code(code, "python")["valid"]:
+                return "invalid_code"
+        return None
+    
+    async def _generate_cascade(
+        self,
+        prompt: str,
+        http_client: httpx.AsyncClient,
+        on_token: Optional[TokenCallback],
+        options: Optional[Dict],
+        priority: str,
+        kind: str
+    ) -> Dict:
+        """Малая модель, затем 7B, если ответ не прошёл эвристики
+        
+        Токены малой модели копятся и отдаются в on_token только после
+        проверки; при эскалации потоково идёт уже ответ 7B.
+        """
+        small, large = self.cascade_stats["small"], self.cascade_stats["large"]
+        
+        start_time = time.time()
+        result = await self._generate_local(prompt, http_client, None, options, priority, self.cascade_small_model)
+        small_time = time.time() - start_time
+        small["calls"] += 1
+        small["total_time"] += small_time
+        
+        reason = self._cascade_rejection(result["content"], kind) if result.get("success") else "error"
+        if reason is None:
+            small["accepted"] += 1
+            # Экономия: средняя латентность 7B минус фактическая малой модели
+            if large["calls"]:
+                self.cascade_stats["saved_time"] += max(large["total_time"] / large["calls"] - small_time, 0.0)
+            if on_token:
+                on_token(result["content"])
+            result["cascade_tier"] = "small"
+            return result
+        
+        small["rejections"][reason] = small["rejections"].get(reason, 0) + 1
+        logger.debug("cascade_escalated", small=self.cascade_small_model, large=self.LOCAL_MODEL, reason=reason)
+        
+        start_time = time.time()
+        result = await self._generate_local(prompt, http_client, on_token, options, priority)
+        large["calls"] += 1
+        large["total_time"] += time.time() - start_time
+        result["cascade_tier"] = "large"
+        return result
+    
+    async def _generate_local(
+        self,
+        prompt: str,
+        http_client: httpx.AsyncClient,
+        on_token: Optional[TokenCallback] = None,
+        options: Optional[Dict] = None,
+        priority: str = "codegen",
+        model: Optional[str] = None,
+        context: Optional[List[int]] = None
+    ) -> Dict:
+        """Генерация через локальную Ollama (потоковый ответ)"""
+        http_client = http_client or http_clients.get("ollama")
+        model = model or self.LOCAL_MODEL
+        
+        try:
+            # 60s - ожидание между фрагментами, а не на всю генерацию
+            data = await complete(
+                http_client, self.local_ollama_url, model, prompt,
+                on_token=on_token, options=options, timeout=60.0, priority=priority, context=context
+            )
+        except httpx.HTTPStatusError as e:
             return {
-                "success": True,
-                "content": data.get("response", ""),
-                "model": "local_ollama",
-                "model_name": "qwen2.5-coder:7b"
+                "success": False,
+                "error": f"Status {e.response.status_code}",
+                "model": "local_ollama"
             }
         
         return {
-            "success": False,
-            "error": f"Status {response.status_code}",
-            "model": "local_ollama"
+            "success": True,
+            "content": data.get("response", ""),
+            "model": "local_ollama",
+            "model_name": model,
+            "ttft_ms": data.get("ttft_ms"),
+            "tokens_per_s": data.get("tokens_per_s"),
+            "prompt_eval_ms": data.get("prompt_eval_ms"),
+            "context": data.get("context")
         }
     
     async def _generate_external(self, prompt: str, http_client: httpx.AsyncClient) -> Dict:
         """Генерация через внешний Qwen API"""
-        if not http_client:
-            http_client = httpx.AsyncClient()
+        http_client = http_client or http_clients.get("external")
         
         headers = {}
         if self.external_qwen_key:
@@ -148,7 +403,7 @@ class ModelRouter:
         response = await http_client.post(
             self.external_qwen_url,
             json={
-                "model": "qwen-coder-plus",
+                "model": self.EXTERNAL_MODEL,
                 "prompt": prompt,
                 "max_tokens": 2000
             },
@@ -162,7 +417,7 @@ class ModelRouter:
                 "success": True,
                 "content": data.get("response", data.get("content", "")),
                 "model": "external_qwen",
-                "model_name": "qwen-coder-plus"
+                "model_name": self.EXTERNAL_MODEL
             }
         
         return {
@@ -171,11 +426,6 @@ class ModelRouter:
             "model": "external_qwen"
         }
     
-    def _get_cache_key(self, prompt: str) -> str:
-        """Генерация ключа кэша"""
-        import hashlib
-        return hashlib.md5(prompt.encode()).hexdigest()
-    
     def get_stats(self) -> Dict:
         """Статистика использования моделей"""
         stats = {}
@@ -196,20 +446,41 @@ class ModelRouter:
                 "total_errors": data["errors"]
             }
         
-        stats["cache"] = {
-            "hits": self.cache_hits,
-            "misses": self.cache_misses,
-            "hit_rate": round(self.cache_hits / max(self.cache_hits + self.cache_misses, 1) * 100, 1),
-            "size": len(self.cache)
+        for model_type, backend in self.backend_stats.items():
+            stats[model_type]["window"] = backend.get_stats()
+        
+        stats["hedging"] = {
+            "enabled": self.hedging_enabled,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins
+        }
+        small, large = self.cascade_stats["small"], self.cascade_stats["large"]
+        stats["cascade"] = {
+            "enabled": self.cascade_enabled,
+            "tiers": {
+                "small": {
+                    "model": self.cascade_small_model,
+                    "calls": small["calls"],
+                    "accepted": small["accepted"],
+                    "hit_rate": round(small["accepted"] / small["calls"] * 100, 1) if small["calls"] else 0.0,
+                    "avg_time": round(small["total_time"] / small["calls"], 2) if small["calls"] else 0,
+                    "rejections": dict(small["rejections"])
+                },
+                "large": {
+                    "model": self.LOCAL_MODEL,
+                    "calls": large["calls"],
+                    "avg_time": round(large["total_time"] / large["calls"], 2) if large["calls"] else 0
+                }
+            },
+            "estimated_time_saved": round(self.cascade_stats["saved_time"], 2)
         }
+        stats["cache"] = self.response_cache.get_stats()
         
         return stats
     
     def clear_cache(self):
         """Очистить кэш"""
-        self.cache.clear()
-        self.cache_hits = 0
-        self.cache_misses = 0
+        self.response_cache.clear()
 
 # Global model router
 model_router = ModelRouter()
@@ -0,0 +1,195 @@
+"""
+Ollama Models - Warm pool, traffic-based keep_alive and memory-budget unloading
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+import httpx
+
+from app_logging import get_logger
+from ollama_scheduler import OllamaOverloadedError, ollama_scheduler
+
+logger = get_logger("ollama_models")
+
+
+class OllamaModelManager:
+    """
+    Lifecycle of the models resident in Ollama.
+
+    The configured warm models are preloaded at startup. Every generation
+    asks keep_alive_for() which keep_alive to send: models with recent
+    traffic are pinned for hot_keep_alive, the rest get idle_keep_alive so
+    Ollama drops them on its own. A periodic refresh() reads /api/ps and, if
+    the resident models exceed the memory budget, unloads the least recently
+    used ones that are not serving traffic. Preloads and unloads take an
+    ollama_scheduler slot at background priority, so they never run ahead
+    of queued generations.
+    """
+
+    COLD_LOAD_MS = 500       # load_duration above this counts as a cold load
+    BUSY_WINDOW = 30.0       # never unload a model used this recently (seconds)
+    EVENT_LOG = 50
+
+    def __init__(
+        self,
+        warm_models: List[str],
+        hot_keep_alive: str = "30m",
+        idle_keep_alive: str = "5m",
+        hot_window: float = 600.0,
+        hot_min_requests: int = 3,
+        memory_budget_mb: int = 7168,
+        check_interval: float = 60.0
+    ):
+        self.warm_models = warm_models
+        self.hot_keep_alive = hot_keep_alive
+        self.idle_keep_alive = idle_keep_alive
+        self.hot_window = hot_window
+        self.hot_min_requests = hot_min_requests
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.check_interval = check_interval
+
+        self._requests: Dict[str, deque] = {}   # model -> timestamps within hot_window
+        self.last_used: Dict[str, float] = {}
+        self.resident: Dict[str, int] = {}      # model -> bytes, as of the last /api/ps
+        self.events = deque(maxlen=self.EVENT_LOG)
+
+        self.preloads = 0
+        self.cold_loads = 0
+        self.warm_hits = 0
+        self.unloads = {"budget": 0, "expired": 0}
+        self._load_ms = deque(maxlen=self.EVENT_LOG)
+
+    def _event(self, event: str, model: str, **details):
+        self.events.append({"event": event, "model": model, "time": time.time(), **details})
+
+    def _recent(self, model: str, now: float) -> deque:
+        stamps = self._requests.setdefault(model, deque())
+        while stamps and now - stamps[0] > self.hot_window:
+            stamps.popleft()
+        return stamps
+
+    def is_hot(self, model: str) -> bool:
+        return len(self._recent(model, time.time())) >= self.hot_min_requests
+
+    def keep_alive_for(self, model: str) -> str:
+        """keep_alive to send with a generation for this model"""
+        return self.hot_keep_alive if self.is_hot(model) else self.idle_keep_alive
+
+    def record_request(self, model: str, load_ms: Optional[float] = None):
+        """Note a finished generation; load_ms is Ollama's load_duration"""
+        now = time.time()
+        self._recent(model, now).append(now)
+        self.last_used[model] = now
+        if load_ms is None:
+            return
+        if load_ms >= self.COLD_LOAD_MS:
+            self.cold_loads += 1
+            self._load_ms.append(load_ms)
+            self._event("load", model, load_ms=round(load_ms, 1), cause="request")
+        else:
+            self.warm_hits += 1
+
+    async def preload(self, client: httpx.AsyncClient, ollama_url: str):
+        """Load the warm models before the first request needs them"""
+        for model in self.warm_models:
+            try:
+                async with ollama_scheduler.slot("background"):
+                    started = time.perf_counter()
+                    # A generate request without a prompt only loads the model
+                    resp = await client.post(
+                        f"{ollama_url}/api/generate",
+                        json={"model": model, "keep_alive": self.hot_keep_alive},
+                        timeout=300.0
+                    )
+                    resp.raise_for_status()
+            except OllamaOverloadedError as e:
+                logger.warning("model_preload_shed", model=model, error=str(e))
+                continue
+            except Exception as e:
+                logger.error("model_preload_failed", model=model, error=str(e))
+                continue
+            load_ms = (time.perf_counter() - started) * 1000
+            self.preloads += 1
+            self._load_ms.append(load_ms)
+            self.last_used.setdefault(model, time.time())
+            self._event("load", model, load_ms=round(load_ms, 1), cause="preload")
+            logger.info("model_preloaded", model=model, load_ms=round(load_ms, 1))
+
+    async def unload(self, client: httpx.AsyncClient, ollama_url: str, model: str, reason: str):
+        async with ollama_scheduler.slot("background"):
+            resp = await client.post(f"{ollama_url}/api/generate", json={"model": model, "keep_alive": 0})
+            resp.raise_for_status()
+        self.resident.pop(model, None)
+        self.unloads[reason] += 1
+        self._event("unload", model, reason=reason)
+        logger.info("model_unloaded", model=model, reason=reason)
+
+    async def refresh(self, client: httpx.AsyncClient, ollama_url: str):
+        """Sync resident models from /api/ps and enforce the memory budget"""
+        resp = await client.get(f"{ollama_url}/api/ps", timeout=5.0)
+        resp.raise_for_status()
+        resident = {m["name"]: m.get("size", 0) for m in resp.json().get("models", [])}
+
+        # Models Ollama dropped on its own after keep_alive ran out
+        for model in self.resident.keys() - resident.keys():
+            self.unloads["expired"] += 1
+            self._event("unload", model, reason="expired")
+        self.resident = resident
+
+        now = time.time()
+        candidates = sorted(
+            (m for m in resident if now - self.last_used.get(m, 0) > self.BUSY_WINDOW),
+            key=lambda m: (self.is_hot(m), self.last_used.get(m, 0))
+        )
+        for model in candidates:
+            if sum(self.resident.values()) <= self.memory_budget:
+                break
+            await self.unload(client, ollama_url, model, "budget")
+
+    async def continuous_refresh_loop(self, client: httpx.AsyncClient, ollama_url: str):
+        """Preload, then keep the resident set within budget"""
+        await self.preload(client, ollama_url)
+        while True:
+            try:
+                await self.refresh(client, ollama_url)
+            except Exception as e:
+                logger.error("model_manager_refresh_failed", error=str(e))
+            await asyncio.sleep(self.check_interval)
+
+    def get_stats(self) -> Dict:
+        now = time.time()
+        resident_bytes = sum(self.resident.values())
+        return {
+            "warm_models": self.warm_models,
+            "resident": {
+                model: {
+                    "size_mb": round(size / 1024 / 1024),
+                    "hot": self.is_hot(model),
+                    "idle_s": round(now - self.last_used[model], 1) if model in self.last_used else None
+                }
+                for model, size in self.resident.items()
+            },
+            "resident_mb": round(resident_bytes / 1024 / 1024),
+            "memory_budget_mb": round(self.memory_budget / 1024 / 1024),
+            "preloads": self.preloads,
+            "cold_loads": self.cold_loads,
+            "warm_hits": self.warm_hits,
+            "unloads": dict(self.unloads),
+            "avg_load_ms": round(sum(self._load_ms) / len(self._load_ms), 1) if self._load_ms else 0.0,
+            "recent_events": list(self.events)[-10:]
+        }
+
+
+# Global model manager (loop started in main.py lifespan)
+ollama_models = OllamaModelManager(
+    warm_models=[m.strip() for m in os.getenv("OLLAMA_WARM_MODELS", "qwen2.5-coder:7b").split(",") if m.strip()],
+    hot_keep_alive=os.getenv("OLLAMA_HOT_KEEP_ALIVE", "30m"),
+    idle_keep_alive=os.getenv("OLLAMA_IDLE_KEEP_ALIVE", "5m"),
+    hot_window=float(os.getenv("OLLAMA_HOT_WINDOW", "600")),
+    hot_min_requests=int(os.getenv("OLLAMA_HOT_MIN_REQUESTS", "3")),
+    memory_budget_mb=int(os.getenv("OLLAMA_MEMORY_BUDGET_MB", "7168")),
+    check_interval=float(os.getenv("OLLAMA_MODEL_CHECK_INTERVAL", "60"))
+)
@@ -0,0 +1,145 @@
+"""
+Ollama Scheduler - Bounded in-flight generations with priority classes
+"""
+import asyncio
+import heapq
+import itertools
+import os
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, List, Tuple
+
+
+class OllamaOverloadedError(Exception):
+    """Request shed: no generation slot within the class's queue deadline"""
+    pass
+
+
+class OllamaScheduler:
+    """
+    Admission control in front of every Ollama generation.
+
+    At most ``max_in_flight`` generations run at once. Waiting requests are
+    served strictly by class (interactive > codegen > background), FIFO
+    within a class, and are shed with OllamaOverloadedError once they have
+    queued longer than their class deadline or the queue is full. A finished
+    generation hands its slot directly to the next waiter.
+    """
+
+    PRIORITIES = {"interactive": 0, "codegen": 1, "background": 2}
+    WAIT_WINDOW = 200
+
+    def __init__(self, max_in_flight: int = 1, max_queue: int = 32, deadlines: Dict[str, float] = None):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.deadlines = deadlines or {"interactive": 30.0, "codegen": 90.0, "background": 20.0}
+
+        self.in_flight = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+
+        self.admitted = {name: 0 for name in self.PRIORITIES}
+        self.shed = {name: 0 for name in self.PRIORITIES}
+        self._wait_ms = {name: deque(maxlen=self.WAIT_WINDOW) for name in self.PRIORITIES}
+
+    def _class(self, priority: str) -> str:
+        return priority if priority in self.PRIORITIES else "background"
+
+    async def acquire(self, priority: str = "interactive"):
+        """Wait for a generation slot or raise OllamaOverloadedError"""
+        cls = self._class(priority)
+        loop = asyncio.get_running_loop()
+        enqueued = loop.time()
+
+        if self.in_flight < self.max_in_flight and not self.queue_depth():
+            self.in_flight += 1
+            self._admit(cls, 0.0)
+            return
+
+        if self.queue_depth() >= self.max_queue:
+            self.shed[cls] += 1
+            raise OllamaOverloadedError(f"Ollama queue full ({self.max_queue} waiting)")
+
+        future = loop.create_future()
+        heapq.heappush(self._waiters, (self.PRIORITIES[cls], next(self._seq), future))
+        try:
+            await asyncio.wait_for(future, self.deadlines[cls])
+        except asyncio.TimeoutError:
+            self._discard_slot(future)
+            self.shed[cls] += 1
+            raise OllamaOverloadedError(
+                f"No Ollama slot within {self.deadlines[cls]:g}s ({cls} queue deadline)"
+            )
+        except asyncio.CancelledError:
+            self._discard_slot(future)
+            raise
+
+        self._admit(cls, (loop.time() - enqueued) * 1000)
+
+    def _discard_slot(self, future: asyncio.Future):
+        # The slot may have been handed over just as the waiter gave up
+        if future.done() and not future.cancelled():
+            self.release()
+
+    def _admit(self, cls: str, wait_ms: float):
+        self.admitted[cls] += 1
+        self._wait_ms[cls].append(wait_ms)
+
+    def release(self):
+        """Hand the slot to the best waiter, or free it"""
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: str = "interactive"):
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def queue_depth(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    def get_stats(self) -> Dict:
+        """Queue depth, wait times and shed counts per priority class"""
+        depth = {name: 0 for name in self.PRIORITIES}
+        names = {rank: name for name, rank in self.PRIORITIES.items()}
+        for rank, _, future in self._waiters:
+            if not future.done():
+                depth[names[rank]] += 1
+
+        classes = {}
+        for name in self.PRIORITIES:
+            waits = self._wait_ms[name]
+            classes[name] = {
+                "queued": depth[name],
+                "admitted": self.admitted[name],
+                "shed": self.shed[name],
+                "deadline_s": self.deadlines[name],
+                "avg_wait_ms": round(sum(waits) / len(waits), 1) if waits else 0.0,
+                "max_wait_ms": round(max(waits), 1) if waits else 0.0
+            }
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.in_flight,
+            "queue_depth": sum(depth.values()),
+            "max_queue": self.max_queue,
+            "classes": classes
+        }
+
+
+# Global scheduler shared by every Ollama caller
+ollama_scheduler = OllamaScheduler(
+    max_in_flight=int(os.getenv("OLLAMA_MAX_IN_FLIGHT", "1")),
+    max_queue=int(os.getenv("OLLAMA_MAX_QUEUE", "32")),
+    deadlines={
+        "interactive": float(os.getenv("OLLAMA_DEADLINE_INTERACTIVE", "30")),
+        "codegen": float(os.getenv("OLLAMA_DEADLINE_CODEGEN", "90")),
+        "background": float(os.getenv("OLLAMA_DEADLINE_BACKGROUND", "20"))
+    }
+)
@@ -0,0 +1,173 @@
+"""
+Prompt Builder - Token-budgeted prompt assembly for RAG context and history
+"""
+import os
+import re
+from collections import deque
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+# Word, digit, single punctuation mark or whitespace run - the same split
+# byte-level BPE tokenizers (Qwen included) apply before merging
+PIECE_PATTERN = re.compile(r"[^\W\d_]+|\d|[^\w\s]|_|\s+", re.UNICODE)
+
+
+@lru_cache(maxsize=8192)
+def _piece_tokens(piece: str) -> int:
+    if piece.isspace():
+        # Single spaces merge into the next word; longer runs and newlines do not
+        return 0 if piece == " " else 1
+    if len(piece) == 1:
+        return 1
+    if piece.isascii():
+        # Common English words are one token, long identifiers split every ~6 chars
+        return 1 + (len(piece) - 1) // 6
+    # Cyrillic and other non-Latin text merges less: ~3 chars per token
+    return 1 + (len(piece) - 1) // 3
+
+
+class TokenCounter:
+    """Local token estimate for qwen2.5-coder prompts (no model download)"""
+
+    def count(self, text: str) -> int:
+        return sum(_piece_tokens(piece) for piece in PIECE_PATTERN.findall(text))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Longest prefix of text within max_tokens"""
+        used = 0
+        for match in PIECE_PATTERN.finditer(text):
+            used += _piece_tokens(match.group())
+            if used > max_tokens:
+                return text[:match.start()].rstrip() + "..."
+        return text
+
+
+# Prompt budgets per endpoint, in tokens. "total" bounds the whole prompt,
+# "history" is the share reserved for conversation history; context gets
+# whatever the fixed text and history leave.
+PROMPT_BUDGETS = {
+    "ollama_generate": {"total": int(os.getenv("PROMPT_BUDGET_GENERATE", "1536")), "history": 0},
+    "autonomous": {"total": int(os.getenv("PROMPT_BUDGET_AUTONOMOUS", "1024")), "history": 256},
+    "chat": {"total": int(os.getenv("PROMPT_BUDGET_CHAT", "768")), "history": 192}
+}
+
+
+class PromptBuilder:
+    """
+    Fills a prompt template within an endpoint's token budget.
+
+    Templates are str.format strings with {context} and/or {history}
+    placeholders plus caller fields. The fixed text is counted first;
+    history keeps the newest messages that fit its share; RAG documents
+    are packed closest-first (lowest distance score) and the last one that
+    only partly fits is truncated.
+    """
+
+    MIN_DOC_TOKENS = 32  # A truncated document shorter than this is dropped
+
+    def __init__(self, counter: TokenCounter, budgets: Dict[str, Dict[str, int]]):
+        self.counter = counter
+        self.budgets = budgets
+        self._stats: Dict[str, Dict] = {}
+
+    def pack_history(self, messages: List[Dict], budget: int) -> Tuple[str, int]:
+        """Newest messages that fit in budget, oldest first"""
+        lines = []
+        used = 0
+        for msg in reversed(messages):
+            line = f"{msg['role']}: {msg['content']}\n"
+            tokens = self.counter.count(line)
+            if used + tokens > budget:
+                remaining = budget - used
+                if not lines and remaining >= self.MIN_DOC_TOKENS:
+                    lines.append(self.counter.truncate(line, remaining) + "\n")
+                    used = budget
+                break
+            lines.append(line)
+            used += tokens
+        return "".join(reversed(lines)), used
+
+    def pack_context(self, documents: List[Dict], budget: int, doc_format: str) -> Tuple[str, int, int]:
+        """Closest documents that fit in budget: (text, tokens, documents used)"""
+        ranked = sorted(
+            enumerate(documents),
+            key=lambda item: (item[1].get("score") is None, item[1].get("score") or 0.0, item[0])
+        )
+        parts = []
+        used = 0
+        for index, doc in ranked:
+            entry = doc_format.format(n=len(parts) + 1, content=doc.get("content", ""))
+            tokens = self.counter.count(entry)
+            if used + tokens > budget:
+                remaining = budget - used
+                if remaining >= self.MIN_DOC_TOKENS:
+                    parts.append(self.counter.truncate(entry, remaining))
+                    used = budget
+                break
+            parts.append(entry)
+            used += tokens
+        return "\n\n".join(parts), used, len(parts)
+
+    def build(
+        self,
+        endpoint: str,
+        template: str,
+        documents: Optional[List[Dict]] = None,
+        history: Optional[List[Dict]] = None,
+        doc_format: str = "[Context {n}]: {content}",
+        history_header: str = "History:\n",
+        **fields
+    ) -> Dict:
+        """Render template within the endpoint's budget
+
+        Returns {"prompt", "tokens", "context_docs", "history_tokens"}.
+        """
+        budget = self.budgets[endpoint]
+        fixed = self.counter.count(template.format(context="", history="", **fields))
+
+        history_text, history_tokens = "", 0
+        if history:
+            history_budget = min(budget["history"], max(budget["total"] - fixed, 0))
+            history_text, history_tokens = self.pack_history(history, history_budget)
+            if history_text:
+                history_text = f"{history_header}{history_text}\n"
+                history_tokens += self.counter.count(history_header) + 1
+
+        context_text, context_tokens, context_docs = "", 0, 0
+        if documents:
+            context_budget = max(budget["total"] - fixed - history_tokens, 0)
+            context_text, context_tokens, context_docs = self.pack_context(documents, context_budget, doc_format)
+
+        prompt = template.format(context=context_text, history=history_text, **fields)
+        tokens = fixed + history_tokens + context_tokens
+        self._record(endpoint, tokens, len(documents or []) - context_docs)
+        return {
+            "prompt": prompt,
+            "tokens": tokens,
+            "context_docs": context_docs,
+            "history_tokens": history_tokens
+        }
+
+    def _record(self, endpoint: str, tokens: int, dropped_docs: int):
+        stats = self._stats.setdefault(endpoint, {"builds": 0, "dropped_docs": 0, "tokens": deque(maxlen=200)})
+        stats["builds"] += 1
+        stats["dropped_docs"] += dropped_docs
+        stats["tokens"].append(tokens)
+
+    def get_stats(self) -> Dict:
+        result = {}
+        for endpoint, budget in self.budgets.items():
+            stats = self._stats.get(endpoint)
+            tokens = stats["tokens"] if stats else ()
+            result[endpoint] = {
+                "budget": budget,
+                "builds": stats["builds"] if stats else 0,
+                "dropped_docs": stats["dropped_docs"] if stats else 0,
+                "avg_tokens": round(sum(tokens) / len(tokens), 1) if tokens else 0.0,
+                "max_tokens": max(tokens) if tokens else 0
+            }
+        return result
+
+
+# Global prompt builder shared by main.py and ConversationManager
+prompt_builder = PromptBuilder(TokenCounter(), PROMPT_BUDGETS)
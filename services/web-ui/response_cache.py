@@ -0,0 +1,153 @@
+"""
+Response Cache - Size-bounded LRU+TTL cache for model responses
+with an optional sqlite tier for deterministic generations
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+class ResponseCache:
+    """
+    Model responses keyed by hash(model, options, prompt).
+
+    The memory tier is an LRU bounded by the serialized size of its entries
+    (max_bytes) with a TTL per entry. Entries stored with persist=True are
+    also written to sqlite, so they survive restarts; a memory miss falls
+    back to sqlite and promotes the row back into memory.
+    """
+
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024, default_ttl: float = 3600.0, db_path: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.db_path = db_path
+
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, size, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            self._open_db(db_path)
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def _open_db(self, db_path: str):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._db.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),))
+        self._db.commit()
+
+    @staticmethod
+    def make_key(model: str, options: Optional[Dict[str, Any]], prompt: str) -> str:
+        material = json.dumps([model, options or {}, prompt], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _insert(self, key: str, value: Dict[str, Any], payload: str, expires_at: float):
+        size = len(payload)
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1]
+        self._entries[key] = (expires_at, size, value)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    def _lookup(self, key: str, now: float) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] >= now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            del self._entries[key]
+            self._bytes -= entry[1]
+            self.expired += 1
+
+        if self._db is not None:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ? AND expires_at >= ?", (key, now)
+            ).fetchone()
+            if row is not None:
+                value = json.loads(row[0])
+                self._insert(key, value, row[0], row[1])
+                self.disk_hits += 1
+                return value
+        return None
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.get_any([key])
+
+    def get_any(self, keys: List[str]) -> Optional[Dict[str, Any]]:
+        """First cached value among keys; a full miss counts once"""
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                value = self._lookup(key, now)
+                if value is not None:
+                    return value
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: Dict[str, Any], ttl: Optional[float] = None, persist: bool = False):
+        """Cache a response; persist=True also writes it to the sqlite tier"""
+        payload = json.dumps(value, ensure_ascii=False)
+        expires_at = time.time() + (ttl if ttl is not None else self.default_ttl)
+        with self._lock:
+            self._insert(key, value, payload, expires_at)
+            if persist and self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, payload, expires_at)
+                )
+                self._db.commit()
+
+    def clear(self):
+        """Drop both tiers and reset statistics"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+            self.hits = self.disk_hits = self.misses = self.expired = self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.disk_hits + self.misses
+        stats = {
+            "size": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "default_ttl": self.default_ttl,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups * 100, 1) if lookups else 0.0,
+            "persistent": self._db is not None
+        }
+        if self._db is not None:
+            with self._lock:
+                stats["persisted_entries"] = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return stats
@@ -0,0 +1,209 @@
+"""
+Sandbox Pool - Pre-started Python workers for running generated code
+"""
+import json
+import os
+import queue
+import select
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+WORKER_SCRIPT = str(Path(__file__).with_name("sandbox_worker.py"))
+
+
+class _Worker:
+    def __init__(self):
+        # -I: ignore PYTHON* env vars and user site-packages
+        self.process = subprocess.Popen(
+            [sys.executable, "-I", WORKER_SCRIPT],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1
+        )
+        self.runs = 0
+
+    def request(self, job: Dict[str, Any], timeout: float) -> Optional[Dict[str, Any]]:
+        """Send a job and wait for its reply; None if the worker is unresponsive"""
+        try:
+            self.process.stdin.write(json.dumps(job) + "\n")
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError):
+            return None
+        ready, _, _ = select.select([self.process.stdout], [], [], timeout)
+        if not ready:
+            return None
+        line = self.process.stdout.readline()
+        return json.loads(line) if line else None
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=1)
+        except Exception:
+            self.process.kill()
+
+
+class SandboxPool:
+    """
+    Fixed set of pre-started sandbox workers (see sandbox_worker.py).
+
+    A run borrows an idle worker, which forks a child from its warm
+    interpreter with CPU, memory, file size and descriptor limits applied
+    and sockets disabled (by a seccomp filter where the kernel allows it,
+    otherwise best-effort inside the interpreter; see network_isolation in
+    get_stats). Workers are replaced after ``max_runs`` jobs or after any
+    timeout, so a wedged worker never serves a second request.
+    """
+
+    # Extra wait for a worker's reply beyond the job's own timeout
+    REPLY_GRACE = 2.0
+
+    def __init__(
+        self,
+        size: int = 2,
+        max_runs: int = 100,
+        timeout: float = 10.0,
+        memory_mb: int = 256,
+        max_output: int = 64 * 1024,
+        max_file_bytes: int = 10 * 1024 * 1024
+    ):
+        self.size = size
+        self.max_runs = max_runs
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self.max_output = max_output
+        self.max_file_bytes = max_file_bytes
+
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = True
+
+        self.runs = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.recycled = 0
+        self.spawned = 0
+        self.total_run_ms = 0.0
+        self.network_isolation: Optional[str] = None  # as reported by the workers
+
+    def _spawn(self) -> _Worker:
+        with self._lock:
+            self.spawned += 1
+        return _Worker()
+
+    def start(self):
+        """Start the workers"""
+        self._closed = False
+        for _ in range(self.size):
+            self._idle.put(self._spawn())
+
+    def shutdown(self):
+        """Stop idle workers; busy ones are closed when they are returned"""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def _release(self, worker: _Worker, recycle: bool):
+        if self._closed:
+            worker.close()
+            return
+        if recycle or worker.runs >= self.max_runs or worker.process.poll() is not None:
+            worker.close()
+            with self._lock:
+                self.recycled += 1
+            worker = self._spawn()
+        self._idle.put(worker)
+
+    def run(self, code: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Execute code in a sandbox worker
+
+        Returns the same shape as CodeGenerator.execute_code: success, stdout,
+        stderr and returncode, or success False with an error message.
+        """
+        if self._closed:
+            return {"success": False, "error": "Sandbox pool is not running"}
+
+        timeout = timeout or self.timeout
+        try:
+            worker = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            return {"success": False, "error": f"Sandbox pool busy ({self.size} workers)"}
+
+        job = {
+            "code": code,
+            "timeout": timeout,
+            "memory_mb": self.memory_mb,
+            "max_output": self.max_output,
+            "max_file_bytes": self.max_file_bytes
+        }
+        started = time.perf_counter()
+        reply = None
+        try:
+            reply = worker.request(job, timeout + self.REPLY_GRACE)
+        finally:
+            worker.runs += 1
+            timed_out = reply is None or reply.get("timed_out", False)
+            self._release(worker, recycle=timed_out)
+
+        duration_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.runs += 1
+            self.total_run_ms += duration_ms
+            if timed_out:
+                self.timeouts += 1
+
+        if timed_out:
+            return {"success": False, "error": f"Execution timeout ({timeout:g}s)"}
+        if "error" in reply:
+            with self._lock:
+                self.failures += 1
+            return {"success": False, "error": reply["error"]}
+
+        self.network_isolation = reply.get("network_isolation")
+        result = {
+            "success": reply["returncode"] == 0,
+            "stdout": reply["stdout"],
+            "stderr": reply["stderr"],
+            "returncode": reply["returncode"],
+            "duration_ms": reply["duration_ms"]
+        }
+        if reply["truncated"]:
+            result["truncated"] = True
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Pool statistics"""
+        return {
+            "size": self.size,
+            "idle": self._idle.qsize(),
+            "running": not self._closed,
+            "max_runs_per_worker": self.max_runs,
+            "runs": self.runs,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "workers_spawned": self.spawned,
+            "workers_recycled": self.recycled,
+            "network_isolation": self.network_isolation,
+            "avg_run_ms": round(self.total_run_ms / self.runs, 1) if self.runs else 0.0
+        }
+
+
+def create_sandbox_pool() -> Optional[SandboxPool]:
+    """Build the pool from SANDBOX_* env vars (None when disabled or unsupported)"""
+    if os.getenv("SANDBOX_POOL_ENABLED", "true").lower() != "true" or not hasattr(os, "fork"):
+        return None
+    return SandboxPool(
+        size=int(os.getenv("SANDBOX_WORKERS", "2")),
+        max_runs=int(os.getenv("SANDBOX_MAX_RUNS", "100")),
+        timeout=float(os.getenv("SANDBOX_TIMEOUT", "10")),
+        memory_mb=int(os.getenv("SANDBOX_MEMORY_MB", "256"))
+    )
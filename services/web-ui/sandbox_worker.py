@@ -0,0 +1,259 @@
+"""
+Sandbox Worker - Pre-started interpreter that runs code jobs for SandboxPool
+
+Reads one JSON job per line on stdin and answers with one JSON line on
+stdout. Each job runs in a forked child with rlimits applied, stdin closed,
+stdout/stderr captured through pipes and sockets disabled, so the child
+starts from this already-initialized interpreter instead of a fresh one.
+
+Network isolation is enforced by the kernel where possible: the child
+installs a seccomp filter that fails socket() and io_uring_setup() with
+EPERM. The filter cannot be removed and is inherited by anything the code
+starts (os.system, subprocess, ctypes calls). Where seccomp is unavailable
+(not Linux, unknown architecture, prctl refused) only the in-interpreter
+socket patch applies, which is best-effort and can be bypassed; the
+isolation level is reported with every reply.
+"""
+import ctypes
+import json
+import os
+import platform
+import resource
+import select
+import signal
+import socket
+import struct
+import sys
+import time
+import traceback
+
+READ_CHUNK = 65536
+
+# seccomp: (AUDIT_ARCH, syscalls denied) per machine
+_SECCOMP_ARCHES = {
+    "x86_64": (0xC000003E, {"socket": 41, "io_uring_setup": 425}),
+    "aarch64": (0xC00000B7, {"socket": 198, "io_uring_setup": 425}),
+}
+_PR_SET_NO_NEW_PRIVS = 38
+_PR_SET_SECCOMP = 22
+_SECCOMP_MODE_FILTER = 2
+_RET_ALLOW = 0x7FFF0000
+_RET_EPERM = 0x00050000 | 1
+_X32_SYSCALL_BIT = 0x40000000
+
+
+class _SockFprog(ctypes.Structure):
+    _fields_ = [("len", ctypes.c_ushort), ("filter", ctypes.c_void_p)]
+
+
+def _build_seccomp_filter():
+    """BPF program and prog struct (built in the worker, before any fork)"""
+    arch = _SECCOMP_ARCHES.get(platform.machine())
+    if arch is None or not sys.platform.startswith("linux"):
+        return None
+    audit_arch, denied = arch
+
+    def stmt(code, k):
+        return struct.pack("HBBI", code, 0, 0, k)
+
+    def jump(code, k, jt, jf):
+        return struct.pack("HBBI", code, jt, jf, k)
+
+    ld_abs, jeq, jge, ret = 0x20, 0x15, 0x35, 0x06
+    program = [
+        stmt(ld_abs, 4),                        # seccomp_data.arch
+        jump(jeq, audit_arch, 1, 0),
+        stmt(ret, _RET_EPERM),                  # other ABIs (i386 int 0x80): deny all
+        stmt(ld_abs, 0),                        # seccomp_data.nr
+        jump(jge, _X32_SYSCALL_BIT, 0, 1),
+        stmt(ret, _RET_EPERM),                  # x32 syscalls
+    ]
+    for nr in denied.values():
+        program += [jump(jeq, nr, 0, 1), stmt(ret, _RET_EPERM)]
+    program.append(stmt(ret, _RET_ALLOW))
+
+    buffer = ctypes.create_string_buffer(b"".join(program))
+    prog = _SockFprog(len(program), ctypes.cast(buffer, ctypes.c_void_p))
+    return buffer, prog
+
+
+_SECCOMP_FILTER = _build_seccomp_filter()
+_libc = ctypes.CDLL(None, use_errno=True) if _SECCOMP_FILTER else None
+
+
+def _install_seccomp() -> bool:
+    if _SECCOMP_FILTER is None:
+        return False
+    if _libc.prctl(_PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0) != 0:
+        return False
+    return _libc.prctl(_PR_SET_SECCOMP, _SECCOMP_MODE_FILTER, ctypes.byref(_SECCOMP_FILTER[1]), 0, 0) == 0
+
+
+def _probe_isolation() -> str:
+    """Isolation the children get: seccomp if a probe child is blocked, else python"""
+    if _SECCOMP_FILTER is None:
+        return "python"
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            if _install_seccomp():
+                try:
+                    socket.socket(socket.AF_INET, socket.SOCK_STREAM).close()
+                except PermissionError:
+                    code = 0
+        finally:
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    return "seccomp" if os.waitstatus_to_exitcode(status) == 0 else "python"
+
+
+NETWORK_ISOLATION = "python"  # set by main() after probing
+
+
+def _no_network(*args, **kwargs):
+    raise PermissionError("Network access is disabled in the sandbox")
+
+
+def _disable_network():
+    if NETWORK_ISOLATION == "seccomp" and not _install_seccomp():
+        os._exit(125)  # probed but failed now: never run the code unisolated
+    # Clear errors for well-behaved code; the only barrier without seccomp
+    import _socket
+    socket.socket = _no_network
+    socket.create_connection = _no_network
+    socket.getaddrinfo = _no_network
+    socket.socketpair = _no_network
+    _socket.socket = _no_network
+
+
+def _set_limits(job: dict):
+    cpu_seconds = int(job["timeout"]) + 1
+    memory = job["memory_mb"] * 1024 * 1024
+    limits = [
+        (resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds)),
+        (resource.RLIMIT_AS, (memory, memory)),
+        (resource.RLIMIT_FSIZE, (job["max_file_bytes"], job["max_file_bytes"])),
+        (resource.RLIMIT_NOFILE, (64, 64)),
+        (resource.RLIMIT_CORE, (0, 0)),
+    ]
+    for limit, value in limits:
+        try:
+            resource.setrlimit(limit, value)
+        except (ValueError, OSError):
+            pass
+
+
+def _run_child(job: dict, out_w: int, err_w: int):
+    """Runs in the forked child; never returns"""
+    exit_code = 1
+    try:
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        os.dup2(out_w, 1)
+        os.dup2(err_w, 2)
+        os.closerange(3, 1024)
+        sys.stdin = open(os.devnull)
+        sys.stdout = os.fdopen(1, "w", buffering=1, closefd=False)
+        sys.stderr = os.fdopen(2, "w", buffering=1, closefd=False)
+        sys.argv = ["<sandbox>"]
+
+        _set_limits(job)
+        _disable_network()
+
+        try:
+            exec(compile(job["code"], "<sandbox>", "exec"), {"__name__": "__main__"})
+            exit_code = 0
+        except SystemExit as e:
+            if e.code is None:
+                exit_code = 0
+            elif isinstance(e.code, int):
+                exit_code = e.code
+            else:
+                print(e.code, file=sys.stderr)
+                exit_code = 1
+        except BaseException:
+            traceback.print_exc()
+            exit_code = 1
+        sys.stdout.flush()
+        sys.stderr.flush()
+    finally:
+        os._exit(exit_code)
+
+
+def run_job(job: dict) -> dict:
+    out_r, out_w = os.pipe()
+    err_r, err_w = os.pipe()
+    started = time.monotonic()
+    pid = os.fork()
+    if pid == 0:
+        os.close(out_r)
+        os.close(err_r)
+        _run_child(job, out_w, err_w)
+    os.close(out_w)
+    os.close(err_w)
+
+    deadline = started + job["timeout"]
+    buffers = {out_r: bytearray(), err_r: bytearray()}
+    open_fds = [out_r, err_r]
+    timed_out = False
+    truncated = False
+
+    while open_fds:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            timed_out = True
+            break
+        ready, _, _ = select.select(open_fds, [], [], remaining)
+        for fd in ready:
+            data = os.read(fd, READ_CHUNK)
+            if not data:
+                open_fds.remove(fd)
+                continue
+            room = job["max_output"] - len(buffers[fd])
+            if room > 0:
+                buffers[fd] += data[:room]
+            if len(data) > room:
+                truncated = True
+
+    if timed_out:
+        os.kill(pid, signal.SIGKILL)
+    _, status = os.waitpid(pid, 0)
+    os.close(out_r)
+    os.close(err_r)
+
+    returncode = os.waitstatus_to_exitcode(status)
+    # RLIMIT_CPU can stop a busy loop with SIGXCPU before the wall-clock deadline
+    if returncode == -signal.SIGXCPU:
+        timed_out = True
+
+    return {
+        "stdout": buffers[out_r].decode("utf-8", "replace"),
+        "stderr": buffers[err_r].decode("utf-8", "replace"),
+        "returncode": returncode,
+        "timed_out": timed_out,
+        "truncated": truncated,
+        "duration_ms": round((time.monotonic() - started) * 1000, 1),
+        "network_isolation": NETWORK_ISOLATION
+    }
+
+
+def main():
+    global NETWORK_ISOLATION
+    NETWORK_ISOLATION = _probe_isolation()
+
+    # Keep the protocol channel away from fd 1 so stray writes cannot corrupt it
+    proto_out = os.fdopen(os.dup(1), "w", buffering=1)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+
+    for line in sys.stdin:
+        try:
+            response = run_job(json.loads(line))
+        except Exception as e:
+            response = {"error": f"{type(e).__name__}: {e}"}
+        proto_out.write(json.dumps(response) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Session Store - LRU+TTL memory tier for conversation sessions
+with a sqlite backing tier
+"""
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+
+class SessionStore:
+    """
+    Conversation sessions by id.
+
+    At most max_sessions are kept in memory (LRU); sessions idle longer
+    than idle_ttl are written back and dropped from memory by evict_idle().
+    With a db_path every session is saved to sqlite on save() and on
+    eviction, and loaded lazily on the next get(). Rows idle longer than
+    retention are deleted. Without a db_path evicted sessions are lost.
+
+    Sessions are serialized with their to_state() method and rebuilt with
+    the factory passed in (ConversationSession.from_state).
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[Dict[str, Any]], Any],
+        max_sessions: int = 500,
+        idle_ttl: float = 1800.0,
+        retention: float = 7 * 86400.0,
+        db_path: Optional[str] = None
+    ):
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.retention = retention
+        self.db_path = db_path
+
+        self._sessions: "OrderedDict[str, Any]" = OrderedDict()
+        self._touched: Dict[str, float] = {}
+        self._sizes: Dict[str, int] = {}  # serialized bytes as of the last save
+        self._lock = threading.RLock()
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            self._open_db(db_path)
+
+        self.hits = 0
+        self.disk_loads = 0
+        self.misses = 0
+        self.evictions = {"lru": 0, "idle": 0}
+
+    def _open_db(self, db_path: str):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, state TEXT NOT NULL, created_at TEXT NOT NULL, "
+            "message_count INTEGER NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated_at)")
+        self._db.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.retention,))
+        self._db.commit()
+
+    def get(self, session_id: str) -> Optional[Any]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+                self._touched[session_id] = time.time()
+                self.hits += 1
+                return session
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT state FROM sessions WHERE session_id = ?", (session_id,)
+                ).fetchone()
+                if row is not None:
+                    session = self.factory(json.loads(row[0]))
+                    self._sizes[session_id] = len(row[0])
+                    self._insert(session_id, session)
+                    self.disk_loads += 1
+                    return session
+
+            self.misses += 1
+            return None
+
+    def add(self, session_id: str, session: Any):
+        with self._lock:
+            self._insert(session_id, session)
+
+    def _insert(self, session_id: str, session: Any):
+        self._sessions[session_id] = session
+        self._sessions.move_to_end(session_id)
+        self._touched[session_id] = time.time()
+        while len(self._sessions) > self.max_sessions:
+            evicted_id, evicted = self._sessions.popitem(last=False)
+            self._write_back(evicted_id, evicted)
+            self.evictions["lru"] += 1
+
+    def save(self, session: Any):
+        """Write a session to sqlite (call after it changed)"""
+        with self._lock:
+            self._persist(session.session_id, session)
+
+    def _persist(self, session_id: str, session: Any):
+        state = json.dumps(session.to_state(), ensure_ascii=False, default=str)
+        self._sizes[session_id] = len(state)
+        if self._db is None:
+            return
+        self._db.execute(
+            "INSERT OR REPLACE INTO sessions (session_id, state, created_at, message_count, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (session_id, state, session.created_at, session.total_messages(), time.time())
+        )
+        self._db.commit()
+
+    def _write_back(self, session_id: str, session: Any):
+        self._touched.pop(session_id, None)
+        if self._db is not None:
+            self._persist(session_id, session)
+        self._sizes.pop(session_id, None)
+
+    def evict_idle(self) -> int:
+        """Write back and drop sessions idle longer than idle_ttl"""
+        cutoff = time.time() - self.idle_ttl
+        with self._lock:
+            idle = [sid for sid, touched in self._touched.items() if touched < cutoff]
+            for session_id in idle:
+                self._write_back(session_id, self._sessions.pop(session_id))
+            self.evictions["idle"] += len(idle)
+            if self._db is not None:
+                self._db.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.retention,))
+                self._db.commit()
+        return len(idle)
+
+    async def continuous_eviction_loop(self, interval: float = 60.0, after_sweep: Optional[Callable[[], Any]] = None):
+        """Periodically move idle sessions out of memory
+
+        after_sweep runs (in the same worker thread) once idle and expired
+        sessions are gone, e.g. to drop payloads only they referenced.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                evicted = await asyncio.to_thread(self.evict_idle)
+                if evicted:
+                    print(f"💤 Evicted {evicted} idle sessions from memory")
+                if after_sweep:
+                    await asyncio.to_thread(after_sweep)
+            except Exception as e:
+                print(f"✗ Session eviction error: {e}")
+
+    def iter_states(self) -> Iterator[Tuple[str, str]]:
+        """(session_id, serialized state) for every resident and stored session"""
+        with self._lock:
+            resident = list(self._sessions.items())
+        for session_id, session in resident:
+            yield session_id, json.dumps(session.to_state(), ensure_ascii=False, default=str)
+        if self._db is None:
+            return
+        resident_ids = {session_id for session_id, _ in resident}
+        with self._lock:
+            rows = self._db.execute("SELECT session_id, state FROM sessions").fetchall()
+        for session_id, state in rows:
+            if session_id not in resident_ids:
+                yield session_id, state
+
+    def flush(self):
+        """Save every resident session (shutdown)"""
+        with self._lock:
+            for session_id, session in self._sessions.items():
+                self._persist(session_id, session)
+
+    def resident(self) -> List[Any]:
+        """Sessions currently in memory"""
+        with self._lock:
+            return list(self._sessions.values())
+
+    def list_sessions(self, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        """Most recently active sessions; resident ones reflect unsaved changes"""
+        with self._lock:
+            listed: Dict[str, Dict[str, Any]] = {}
+            if self._db is not None:
+                rows = self._db.execute(
+                    "SELECT session_id, created_at, message_count, updated_at FROM sessions "
+                    "ORDER BY updated_at DESC LIMIT ? OFFSET ?",
+                    (limit, offset)
+                ).fetchall()
+                for session_id, created_at, message_count, updated_at in rows:
+                    session = self._sessions.get(session_id)
+                    listed[session_id] = {**session.to_dict(), "resident": True} if session is not None else {
+                        "session_id": session_id,
+                        "created_at": created_at,
+                        "message_count": message_count,
+                        "resident": False
+                    }
+            else:
+                for session in list(reversed(self._sessions.values()))[offset:offset + limit]:
+                    listed[session.session_id] = {**session.to_dict(), "resident": True}
+            return list(listed.values())
+
+    def count(self) -> int:
+        with self._lock:
+            if self._db is None:
+                return len(self._sessions)
+            stored = self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+            unsaved = sum(1 for sid in self._sessions if sid not in self._sizes)
+            return stored + unsaved
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.disk_loads + self.misses
+        with self._lock:
+            return {
+                "resident": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "total": self.count(),
+                "resident_bytes": sum(self._sizes.get(sid, 0) for sid in self._sessions),
+                "idle_ttl": self.idle_ttl,
+                "hits": self.hits,
+                "disk_loads": self.disk_loads,
+                "misses": self.misses,
+                "evictions": dict(self.evictions),
+                "hit_rate": round(self.hits / lookups * 100, 1) if lookups else 0.0,
+                "persistent": self._db is not None
+            }
@@ -0,0 +1,98 @@
+"""
+Singleflight - Coalescing of identical in-flight upstream calls
+"""
+import asyncio
+import json
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+
+class SingleFlight:
+    """
+    Concurrent identical calls share one in-flight upstream request.
+
+    Calls are keyed by (service, endpoint, normalized payload). The first
+    caller starts the request as a task; callers arriving while it runs
+    await the same task and get its result or exception. Nothing is kept
+    after completion (caching is the caller's business).
+
+    The task belongs to no single caller: it survives the cancellation of
+    the caller that started it, and is cancelled only when every caller
+    waiting on it has gone away.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Tuple[str, str, str], asyncio.Task] = {}
+        self._waiters: Dict[Tuple[str, str, str], int] = defaultdict(int)
+        self.stats: Dict[str, Dict[str, int]] = defaultdict(lambda: {"calls": 0, "coalesced": 0, "abandoned": 0})
+
+    @staticmethod
+    def make_key(service: str, endpoint: str, payload: Any = None) -> Tuple[str, str, str]:
+        """Payload normalized so that key order and whitespace don't matter"""
+        normalized = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+        return service, endpoint, normalized
+
+    async def do(
+        self,
+        service: str,
+        endpoint: str,
+        payload: Any,
+        func: Callable[[], Awaitable[Any]]
+    ) -> Tuple[Any, bool]:
+        """Result of func(), or of the identical call already in flight
+
+        Returns (result, coalesced); coalesced is True when this caller
+        joined a call started by someone else.
+        """
+        key = self.make_key(service, endpoint, payload)
+        flight = self._flights.get(key)
+        coalesced = flight is not None
+        if coalesced:
+            self.stats[service]["coalesced"] += 1
+        else:
+            self.stats[service]["calls"] += 1
+            flight = asyncio.ensure_future(func())
+            self._flights[key] = flight
+            flight.add_done_callback(lambda done: self._finish(key, done))
+
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(flight), coalesced
+        except asyncio.CancelledError:
+            if not flight.done() and self._waiters[key] == 1:
+                # Last interested caller left: stop the upstream request
+                self.stats[service]["abandoned"] += 1
+                flight.cancel()
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            raise
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+
+    def _finish(self, key: Tuple[str, str, str], flight: asyncio.Task):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        # Retrieve the exception so an unawaited failure is not reported as lost
+        if not flight.cancelled():
+            flight.exception()
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-service upstream calls made, calls saved by coalescing, and in-flight count"""
+        in_flight = defaultdict(int)
+        for service, _, _ in self._flights:
+            in_flight[service] += 1
+        return {
+            service: {
+                **counts,
+                "in_flight": in_flight[service],
+                "coalesced_rate": round(counts["coalesced"] / (counts["calls"] + counts["coalesced"]) * 100, 1)
+                if counts["calls"] + counts["coalesced"] else 0.0
+            }
+            for service, counts in self.stats.items()
+        }
+
+
+# Global singleflight shared by the rag-api, health and Ollama callers
+singleflight = SingleFlight()
@@ -0,0 +1,243 @@
+"""
+Step Registry - Table-driven dispatch of plan steps to handlers
+"""
+import copy
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple, Union
+
+# A keyword group matches if any of its words occurs in the step text
+KeywordGroup = Union[str, Sequence[str]]
+
+
+def compile_matcher(all_of: Iterable[KeywordGroup] = (), none_of: Iterable[str] = ()) -> "re.Pattern":
+    """Compile keyword groups into one anchored lookahead regex
+
+    compile_matcher(["create", ("folder", "directory")]) matches steps that
+    contain "create" and either "folder" or "directory" (substring match,
+    like the `"x" in step_lower` checks it replaces).
+    """
+    parts = []
+    for group in all_of:
+        words = (group,) if isinstance(group, str) else tuple(group)
+        parts.append("(?=.*(?:" + "|".join(re.escape(w) for w in words) + "))")
+    for word in none_of:
+        parts.append("(?!.*" + re.escape(word) + ")")
+    return re.compile("^" + "".join(parts), re.S)
+
+
+@dataclass
+class StepHandler:
+    name: str
+    matcher: "re.Pattern"
+    func: Callable[..., Awaitable[bool]]
+    reads: FrozenSet[str] = frozenset()
+    writes: FrozenSet[str] = frozenset()
+    # Terminal handlers always produce a result, so later handlers never run
+    terminal: bool = True
+    # Idempotent handlers have their successful results memoized for memo_ttl
+    # seconds, keyed on the step text plus the memo_context values
+    idempotent: bool = False
+    memo_ttl: float = 0.0
+    memo_context: Tuple[str, ...] = ()
+    # Per-attempt time limit (None: ExecutionEngine.STEP_TIMEOUT); only
+    # handlers that are safe to run twice are retried
+    timeout: Optional[float] = None
+    retry: bool = True
+    calls: int = 0
+    failures: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+
+
+@dataclass
+class _Resolution:
+    candidates: Tuple[StepHandler, ...]
+    reads: FrozenSet[str] = field(default=frozenset())
+    writes: FrozenSet[str] = field(default=frozenset())
+    timeout: Optional[float] = None
+    retryable: bool = True
+
+
+class StepRegistry:
+    """
+    Ordered handler table with a per-step resolution cache.
+
+    Handlers are tried in registration order. Non-terminal handlers may
+    decline a step (return False) when the context lacks what they need, in
+    which case the next matching handler runs. The list of candidates for a
+    step text is resolved once and cached, so known plan steps dispatch with
+    a single dict lookup.
+    """
+
+    MAX_CACHED_STEPS = 1024
+
+    def __init__(self):
+        self.handlers: List[StepHandler] = []
+        self._cache: Dict[str, _Resolution] = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def register(
+        self,
+        name: str,
+        func: Callable[..., Awaitable[bool]],
+        all_of: Iterable[KeywordGroup] = (),
+        none_of: Iterable[str] = (),
+        reads: Iterable[str] = (),
+        writes: Iterable[str] = (),
+        terminal: bool = True,
+        memo_ttl: float = 0.0,
+        memo_context: Iterable[str] = (),
+        timeout: Optional[float] = None,
+        retry: bool = True
+    ) -> StepHandler:
+        handler = StepHandler(
+            name=name,
+            matcher=compile_matcher(all_of, none_of),
+            func=func,
+            reads=frozenset(reads),
+            writes=frozenset(writes),
+            terminal=terminal,
+            idempotent=memo_ttl > 0,
+            memo_ttl=memo_ttl,
+            memo_context=tuple(memo_context),
+            timeout=timeout,
+            retry=retry
+        )
+        self.handlers.append(handler)
+        self._cache.clear()
+        return handler
+
+    def scan(self, step_lower: str) -> _Resolution:
+        """Resolve candidates by testing every matcher (uncached)"""
+        candidates = []
+        for handler in self.handlers:
+            if handler.matcher.match(step_lower):
+                candidates.append(handler)
+                if handler.terminal:
+                    break
+        reads = frozenset().union(*(h.reads for h in candidates))
+        writes = frozenset().union(*(h.writes for h in candidates))
+        timeouts = [h.timeout for h in candidates if h.timeout is not None]
+        return _Resolution(
+            tuple(candidates), reads, writes,
+            timeout=max(timeouts) if timeouts else None,
+            retryable=all(h.retry for h in candidates)
+        )
+
+    def resolve(self, step_lower: str) -> _Resolution:
+        resolution = self._cache.get(step_lower)
+        if resolution is not None:
+            self.cache_hits += 1
+            return resolution
+
+        self.cache_misses += 1
+        resolution = self.scan(step_lower)
+        if len(self._cache) >= self.MAX_CACHED_STEPS:
+            self._cache.clear()
+        self._cache[step_lower] = resolution
+        return resolution
+
+    def warm(self, steps: Iterable[str]):
+        """Pre-resolve known step texts (e.g. plan templates)"""
+        for step in steps:
+            step_lower = step.lower()
+            if step_lower not in self._cache:
+                self._cache[step_lower] = self.scan(step_lower)
+
+    def record(self, handler: StepHandler, duration_ms: float, failed: bool):
+        handler.calls += 1
+        handler.total_ms += duration_ms
+        handler.max_ms = max(handler.max_ms, duration_ms)
+        if failed:
+            handler.failures += 1
+
+    def get_stats(self) -> Dict:
+        """Dispatch cache and per-handler latency statistics"""
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "handlers": len(self.handlers),
+            "cached_steps": len(self._cache),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "cache_hit_rate": round(self.cache_hits / lookups * 100, 1) if lookups else 0.0,
+            "by_step_type": {
+                h.name: {
+                    "calls": h.calls,
+                    "failures": h.failures,
+                    "avg_ms": round(h.total_ms / h.calls, 2) if h.calls else 0.0,
+                    "max_ms": round(h.max_ms, 2)
+                }
+                for h in self.handlers if h.calls
+            }
+        }
+
+
+class StepMemo:
+    """
+    Short-lived results of idempotent steps, shared across tasks.
+
+    Entries remember which context keys their handler reads, so a step that
+    writes one of them (e.g. "Apply changes" writing system_state) drops the
+    results that could now be stale.
+    """
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._entries: Dict[tuple, Tuple[float, FrozenSet[str], Dict]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.hits_by_type: Dict[str, int] = {}
+
+    @staticmethod
+    def key(handler: StepHandler, step_lower: str, context: Optional[Dict] = None) -> tuple:
+        context = context or {}
+        return (handler.name, step_lower) + tuple(str(context.get(k)) for k in handler.memo_context)
+
+    def get(self, handler: StepHandler, key: tuple) -> Optional[Dict]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.hits_by_type[handler.name] = self.hits_by_type.get(handler.name, 0) + 1
+        return copy.deepcopy(entry[2])
+
+    def put(self, handler: StepHandler, key: tuple, result: Dict):
+        if len(self._entries) >= self.max_entries:
+            now = time.monotonic()
+            self._entries = {k: e for k, e in self._entries.items() if e[0] >= now}
+            if len(self._entries) >= self.max_entries:
+                # Still full: drop the entry closest to expiry
+                del self._entries[min(self._entries, key=lambda k: self._entries[k][0])]
+        self._entries[key] = (time.monotonic() + handler.memo_ttl, handler.reads, copy.deepcopy(result))
+
+    def invalidate(self, keys: Iterable[str]):
+        """Drop results whose handler reads any of the given context keys"""
+        keys = frozenset(keys)
+        if not keys:
+            return
+        stale = [k for k, (_, reads, _) in self._entries.items() if reads & keys]
+        for k in stale:
+            del self._entries[k]
+        self.invalidations += len(stale)
+
+    def clear(self):
+        self._entries.clear()
+
+    def get_stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / lookups * 100, 1) if lookups else 0.0,
+            "hits_by_step_type": dict(self.hits_by_type)
+        }
@@ -1,14 +1,113 @@
 """
 Task Execution Engine - Autonomous Task Execution with Loop Protection
 """
-from typing import Dict, List
+from typing import Dict, List, Any, Awaitable, Callable, Optional
 from datetime import datetime
+import asyncio
+import itertools
+import os
+import time
 import uuid
 
+from message_classifier import message_classifier
+
+# Step plans produced by TaskExecutor.decompose_task; ExecutionEngine
+# pre-resolves handlers for every step listed here
+STEP_TEMPLATES: Dict[str, List[str]] = {
+    "code_creation": [
+        "Analyze requirements",
+        "Design code structure",
+        "Generate code using AI",
+        "Validate code safety",
+        "Create file in safe zone",
+        "Verify file creation"
+    ],
+    "health": [
+        "Check RAG service health",
+        "Check Architecture Engine health",
+        "Check Ollama service health",
+        "Aggregate health metrics",
+        "Generate health report"
+    ],
+    "optimize_latency": [
+        "Measure current latencies",
+        "Identify slow services",
+        "Analyze bottlenecks",
+        "Generate optimization plan",
+        "Apply optimizations",
+        "Verify improvements"
+    ],
+    "optimize_generic": [
+        "Analyze current metrics",
+        "Identify improvement areas",
+        "Generate action plan",
+        "Execute improvements",
+        "Validate results"
+    ],
+    "add_service": [
+        "Parse service requirements",
+        "Check dependencies",
+        "Generate docker-compose config",
+        "Validate safety checks",
+        "Create backup point",
+        "Apply configuration",
+        "Verify service startup"
+    ],
+    "add_cache": [
+        "Analyze caching needs",
+        "Design cache strategy",
+        "Generate Redis configuration",
+        "Validate integration points",
+        "Apply changes",
+        "Test cache functionality"
+    ],
+    "add_generic": [
+        "Parse requirements",
+        "Design solution",
+        "Generate configuration",
+        "Validate safety",
+        "Apply changes",
+        "Verify functionality"
+    ],
+    "debug": [
+        "Identify problem symptoms",
+        "Analyze error logs",
+        "Determine root cause",
+        "Generate fix strategy",
+        "Apply fix",
+        "Verify resolution"
+    ],
+    "analysis": [
+        "Gather relevant data",
+        "Analyze patterns",
+        "Identify insights",
+        "Generate recommendations"
+    ],
+    "deploy": [
+        "Pre-deployment checks",
+        "Create backup",
+        "Deploy changes",
+        "Health check",
+        "Rollback if needed"
+    ],
+    "generic": [
+        "Understand request context",
+        "Gather required information",
+        "Plan execution strategy",
+        "Execute primary action",
+        "Verify results",
+        "Generate summary"
+    ]
+}
+
 class Task:
     # Anti-loop protection
     MAX_STEPS = 50
-    MAX_EXECUTION_TIME = 300  # 5 minutes max per task
+    # Worker limit per task; ExecutionEngine derives its step budget from it
+    MAX_EXECUTION_TIME = float(os.getenv("TASK_MAX_EXECUTION_TIME", "600"))
+    FINALIZE_MARGIN = 30.0  # Kept after the steps for summary and knowledge store writes
+    MAX_EVENTS = 500  # Progress events kept for late subscribers
+    TERMINAL_EVENTS = ("completed", "failed", "cancelled")
     
     def __init__(self, task_id: str, description: str):
         self.task_id = task_id
@@ -20,7 +119,51 @@ class Task:
         self.created_at = datetime.now().isoformat()
         self.started_at = None
         self.completed_at = None
-        self.execution_start_time = None  # For timeout detection
+        self.execution_start_time = None  # time.monotonic() when a worker picked it up
+        self.priority = "normal"
+        self.events: List[Dict] = []
+        self.job_result = None
+        self._event_seq = itertools.count()
+        self._subscribers: List[asyncio.Queue] = []
+        self._done: Optional[asyncio.Future] = None
+    
+    def step_budget(self) -> float:
+        """Seconds the steps may still use before the worker timeout, minus FINALIZE_MARGIN"""
+        elapsed = time.monotonic() - self.execution_start_time if self.execution_start_time else 0.0
+        return max(self.MAX_EXECUTION_TIME - self.FINALIZE_MARGIN - elapsed, 0.0)
+    
+    def emit(self, event: str, data: Dict = None):
+        """Record a progress event and push it to live subscribers"""
+        entry = {
+            "id": next(self._event_seq),
+            "event": event,
+            "data": data or {},
+            "timestamp": datetime.now().isoformat()
+        }
+        self.events.append(entry)
+        if len(self.events) > self.MAX_EVENTS:
+            self.events = self.events[-self.MAX_EVENTS:]
+        for queue in self._subscribers:
+            queue.put_nowait(entry)
+    
+    def on_step_progress(self, event: str, data: Dict):
+        """Progress callback for ExecutionEngine.execute_task"""
+        if event == "step_started":
+            self.current_step = data["index"] + 1
+        self.emit(event, data)
+    
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue()
+        self._subscribers.append(queue)
+        return queue
+    
+    def unsubscribe(self, queue: asyncio.Queue):
+        if queue in self._subscribers:
+            self._subscribers.remove(queue)
+    
+    @property
+    def finished(self) -> bool:
+        return bool(self.events) and self.events[-1]["event"] in self.TERMINAL_EVENTS
     
     def to_dict(self) -> Dict:
         return {
@@ -33,12 +176,24 @@ class Task:
             "result": self.result,
             "created_at": self.created_at,
             "started_at": self.started_at,
-            "completed_at": self.completed_at
+            "completed_at": self.completed_at,
+            "priority": self.priority
         }
 
 class TaskExecutor:
+    PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+    
     def __init__(self):
         self.tasks: Dict[str, Task] = {}
+        
+        # Background worker pool
+        self.max_workers = int(os.getenv("TASK_WORKERS", "2"))
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._workers: List[asyncio.Task] = []
+        self._sequence = itertools.count()  # FIFO within a priority class
+        self._running = 0
+        self.jobs_completed = 0
+        self.jobs_failed = 0
     
     def create_task(self, description: str) -> Task:
         task_id = str(uuid.uuid4())[:8]
@@ -48,119 +203,100 @@ class TaskExecutor:
     
     def decompose_task(self, description: str) -> List[str]:
         """Break task into steps with intelligent analysis"""
-        desc_lower = description.lower()
-        
-        # CODE/GAME CREATION - NEW!
-        if any(word in desc_lower for word in ['create', 'generate', 'write', 'build']) and \
-           any(word in desc_lower for word in ['code', 'program', 'script', 'game', 'calculator', 'app', 'tic-tac-toe']):
-            return [
-                "Analyze requirements",
-                "Design code structure",
-                "Generate code using AI",
-                "Validate code safety",
-                "Create file in safe zone",
-                "Verify file creation"
-            ]
-        
-        # Advanced pattern matching with context
-        if "health" in desc_lower or "status" in desc_lower:
-            return [
-                "Check RAG service health",
-                "Check Architecture Engine health",
-                "Check Ollama service health",
-                "Aggregate health metrics",
-                "Generate health report"
-            ]
-        
-        elif "optimize" in desc_lower or "improve" in desc_lower:
-            if "latency" in desc_lower or "performance" in desc_lower:
-                return [
-                    "Measure current latencies",
-                    "Identify slow services",
-                    "Analyze bottlenecks",
-                    "Generate optimization plan",
-                    "Apply optimizations",
-                    "Verify improvements"
-                ]
-            else:
-                return [
-                    "Analyze current metrics",
-                    "Identify improvement areas",
-                    "Generate action plan",
-                    "Execute improvements",
-                    "Validate results"
-                ]
-        
-        elif "add" in desc_lower or "create" in desc_lower:
-            if "service" in desc_lower:
-                return [
-                    "Parse service requirements",
-                    "Check dependencies",
-                    "Generate docker-compose config",
-                    "Validate safety checks",
-                    "Create backup point",
-                    "Apply configuration",
-                    "Verify service startup"
-                ]
-            elif "redis" in desc_lower or "cache" in desc_lower:
-                return [
-                    "Analyze caching needs",
-                    "Design cache strategy",
-                    "Generate Redis configuration",
-                    "Validate integration points",
-                    "Apply changes",
-                    "Test cache functionality"
-                ]
-            else:
-                return [
-                    "Parse requirements",
-                    "Design solution",
-                    "Generate configuration",
-                    "Validate safety",
-                    "Apply changes",
-                    "Verify functionality"
-                ]
-        
-        elif "fix" in desc_lower or "debug" in desc_lower:
-            return [
-                "Identify problem symptoms",
-                "Analyze error logs",
-                "Determine root cause",
-                "Generate fix strategy",
-                "Apply fix",
-                "Verify resolution"
-            ]
-        
-        elif "analyze" in desc_lower or "investigate" in desc_lower:
-            return [
-                "Gather relevant data",
-                "Analyze patterns",
-                "Identify insights",
-                "Generate recommendations"
-            ]
-        
-        elif "deploy" in desc_lower or "rollout" in desc_lower:
-            return [
-                "Pre-deployment checks",
-                "Create backup",
-                "Deploy changes",
-                "Health check",
-                "Rollback if needed"
-            ]
-        
-        else:
-            # Generic intelligent decomposition
-            return [
-                "Understand request context",
-                "Gather required information",
-                "Plan execution strategy",
-                "Execute primary action",
-                "Verify results",
-                "Generate summary"
-            ]
+        # Code/game creation, health, optimize, add, debug, analysis, deploy
+        # or generic - chosen by the shared keyword classifier
+        return list(STEP_TEMPLATES[message_classifier.step_template(description)])
     
     def get_task(self, task_id: str) -> Task:
         return self.tasks.get(task_id)
+    
+    def start_workers(self):
+        """Start the worker pool on the running event loop"""
+        if self._workers:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._workers = [
+            asyncio.create_task(self._worker(i))
+            for i in range(self.max_workers)
+        ]
+    
+    async def stop_workers(self):
+        """Cancel workers; queued tasks are left pending"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+    
+    def submit(self, task: Task, job: Callable[[Task], Awaitable[Any]], priority: str = "normal") -> Task:
+        """Queue a job for background execution; returns immediately"""
+        if not self._workers:
+            raise RuntimeError("Task workers are not running")
+        
+        priority = priority if priority in self.PRIORITIES else "normal"
+        task.priority = priority
+        task.status = "queued"
+        task._done = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((self.PRIORITIES[priority], next(self._sequence), task.task_id, job))
+        task.emit("queued", {"priority": priority, "queue_position": self._queue.qsize()})
+        return task
+    
+    async def wait(self, task_id: str) -> Optional[Task]:
+        """Wait until a submitted task finishes"""
+        task = self.tasks.get(task_id)
+        if task and task._done is not None:
+            await asyncio.shield(task._done)
+        return task
+    
+    async def _worker(self, worker_id: int):
+        while True:
+            _, _, task_id, job = await self._queue.get()
+            task = self.tasks.get(task_id)
+            if task is None:
+                continue
+            
+            self._running += 1
+            task.status = "running"
+            task.started_at = datetime.now().isoformat()
+            task.execution_start_time = time.monotonic()
+            task.emit("started", {"worker": worker_id})
+            try:
+                job_result = await asyncio.wait_for(job(task), timeout=Task.MAX_EXECUTION_TIME)
+                if task.status in ("queued", "running"):
+                    task.status = "completed"
+                task.job_result = job_result
+                self.jobs_completed += 1
+                task.emit("completed", {
+                    "status": task.status,
+                    "task_result": job_result if job_result is not None else task.to_dict()
+                })
+            except asyncio.CancelledError:
+                task.status = "cancelled"
+                task.emit("cancelled", {})
+                raise
+            except asyncio.TimeoutError:
+                task.status = "failed"
+                self.jobs_failed += 1
+                task.emit("failed", {"error": f"Task exceeded {Task.MAX_EXECUTION_TIME:g}s"})
+            except Exception as e:
+                task.status = "failed"
+                self.jobs_failed += 1
+                task.emit("failed", {"error": str(e)})
+            finally:
+                self._running -= 1
+                task.completed_at = task.completed_at or datetime.now().isoformat()
+                if task._done is not None and not task._done.done():
+                    task._done.set_result(task.status)
+    
+    def get_queue_stats(self) -> Dict:
+        """Worker pool statistics"""
+        return {
+            "workers": len(self._workers),
+            "max_workers": self.max_workers,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "running": self._running,
+            "jobs_completed": self.jobs_completed,
+            "jobs_failed": self.jobs_failed
+        }
 
 # Global task executor
 task_executor = TaskExecutor()